@@ -25,6 +25,7 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("--archive-url", default=ARCHIVE_URL)
     parser.add_argument("--version", default=DEFAULT_VERSION)
     parser.add_argument("--num-records", type=int, default=None)
+    parser.add_argument("--parallel-ranges", type=int, default=1)
     return parser
 
 
@@ -40,7 +41,7 @@ def main() -> None:
 
     archive_path = dataset_dir / "smellycode_dataset.zip"
     try:
-        download_http_resource(args.archive_url, archive_path)
+        download_http_resource(args.archive_url, archive_path, parallel_ranges=args.parallel_ranges)
         extract_archive(archive_path, content_dir)
     except DownloadError as exc:
         raise SystemExit(str(exc)) from exc
@@ -0,0 +1,163 @@
+"""Microbenchmark the JSON codec on representative trajectory record sizes.
+
+Compares the stdlib ``json`` calls the hot paths used to make against
+``src.data.codec`` (and its fast backend, when installed) for three record
+shapes: a sandbox log event, a typical trajectory step and a step carrying a
+large diff/stdout payload.
+
+    python -m scripts.bench_json_codec [--seconds 0.5]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.data import codec
+
+
+def _log_event() -> Dict[str, Any]:
+    return {
+        "event": "apply_action",
+        "cmd": ["/usr/bin/ast-grep", "run", "-p", "print($A)", "-r", "log($A)"],
+        "exit_code": 0,
+        "duration_sec": 0.01234,
+        "error": None,
+        "changed_files": ["src/main.py"],
+        "diff_len": 812,
+        "timestamp": 1760000000.123456,
+        "task_id": "commitpackft-000123",
+    }
+
+
+def _trajectory_step(payload_chars: int) -> Dict[str, Any]:
+    state = {
+        "goals": ["Replace print calls with logging"],
+        "constraints": ["Keep public API stable"],
+        "decisions": ["Use ast-grep rewrite"],
+        "hypotheses": [],
+        "history": ["listed files", "ran tests", "rewrote print"],
+        "open_issues": [],
+        "next_focus": "Run the test suite",
+    }
+    diff_line = "-    print(value)\n+    logger.info(value)\n"
+    diff = (diff_line * (payload_chars // len(diff_line) + 1))[:payload_chars]
+    return {
+        "task_id": "commitpackft-000123",
+        "step": 4,
+        "prompt": "You are an expert ast-grep refactoring teacher.\n" * 20,
+        "state_before": state,
+        "state_after": state,
+        "model_output": {
+            "raw": "<think>...</think><action>{...}</action>",
+            "think": "The print calls should become logger calls. " * 8,
+            "action": {"command": ["ast-grep", "run", "-p", "print($A)", "-r", "logger.info($A)"]},
+            "state_update": {"history": ["rewrote print"]},
+            "parse_error": None,
+        },
+        "sandbox_result": {
+            "cmd": ["/usr/bin/ast-grep", "run"],
+            "exit_code": 0,
+            "stdout": "ok\n",
+            "stderr": "",
+            "duration_sec": 0.0421,
+            "error": None,
+            "diff": diff,
+            "changed_files": ["src/main.py"],
+        },
+        "reward": 1.0,
+        "teacher": {"model": "qwen2-14b-instruct"},
+        "metrics": {"teacher_latency_sec": 1.8312, "sandbox_failed": False},
+    }
+
+
+def _records() -> List[Tuple[str, Dict[str, Any]]]:
+    return [
+        ("log_event", _log_event()),
+        ("step_4k", _trajectory_step(1024)),
+        ("step_64k", _trajectory_step(64 * 1024)),
+    ]
+
+
+def _rate(fn: Callable[[], Any], seconds: float) -> float:
+    """Return calls per second, timed over at least ``seconds``."""
+    batch = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return batch / elapsed
+        batch *= 2
+
+
+def run(seconds: float = 0.5) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    for name, record in _records():
+        encoded = json.dumps(record, ensure_ascii=False)
+        size = len(encoded.encode("utf-8"))
+        cases: List[Tuple[str, Callable[[], Any], Callable[[], Any]]] = [
+            (
+                "stdlib",
+                lambda r=record: json.dumps(r, ensure_ascii=False) + "\n",
+                lambda e=encoded: json.loads(e),
+            ),
+            (
+                f"codec[{codec.backend_name()}]",
+                lambda r=record: codec.dumpb(r) + b"\n",
+                lambda e=encoded.encode("utf-8"): codec.loads(e),
+            ),
+        ]
+        for label, encode, decode in cases:
+            enc_rate = _rate(encode, seconds)
+            dec_rate = _rate(decode, seconds)
+            results.append(
+                {
+                    "record": name,
+                    "bytes": size,
+                    "impl": label,
+                    "encode_per_sec": enc_rate,
+                    "decode_per_sec": dec_rate,
+                    "encode_mb_per_sec": enc_rate * size / 1e6,
+                    "decode_mb_per_sec": dec_rate * size / 1e6,
+                }
+            )
+    return results
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m scripts.bench_json_codec",
+        description="Microbenchmark the JSON codec on representative record sizes.",
+    )
+    parser.add_argument(
+        "--seconds",
+        type=float,
+        default=0.5,
+        help="Minimum timing window per case (default: 0.5).",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print raw results as JSON instead of a table.",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(args.seconds)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'record':<10} {'bytes':>7} {'impl':<15} {'enc/s':>10} {'dec/s':>10} {'enc MB/s':>9} {'dec MB/s':>9}")
+    for row in results:
+        print(
+            f"{row['record']:<10} {row['bytes']:>7} {row['impl']:<15} "
+            f"{row['encode_per_sec']:>10.0f} {row['decode_per_sec']:>10.0f} "
+            f"{row['encode_mb_per_sec']:>9.1f} {row['decode_mb_per_sec']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Benchmark model-output parsing over a large batch of completions.
+
+Compares the previous three-``str.find``-pass extraction with
+``src.actors.output_parser`` on whole completions, and measures the parser
+fed in small streaming chunks. Completions come from recorded trajectories
+(``model_output.raw``) when ``--traj-root`` has any, otherwise a synthetic
+batch of typical and long-think outputs is used.
+
+    python -m scripts.bench_output_parser [--traj-root trajectories/raw] [--count 20000]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from src.actors.output_parser import TagParser, parse_model_output
+from src.data import codec
+
+
+def _legacy_extract_block(text: str, tag: str) -> Optional[str]:
+    start_tag = f"<{tag}>"
+    end_tag = f"</{tag}>"
+    start = text.find(start_tag)
+    if start == -1:
+        return None
+    start += len(start_tag)
+    end = text.find(end_tag, start)
+    if end == -1:
+        return None
+    return text[start:end].strip()
+
+
+def _legacy_parse(raw: str) -> Dict[str, Any]:
+    think = _legacy_extract_block(raw, "think")
+    action_raw = _legacy_extract_block(raw, "action")
+    state_update_raw = _legacy_extract_block(raw, "state_update")
+    result: Dict[str, Any] = {"raw": raw, "think": think, "action": None, "state_update": None, "parse_error": None}
+    for key, block in (("action", action_raw), ("state_update", state_update_raw)):
+        if block:
+            try:
+                candidate = json.loads(block)
+                if isinstance(candidate, dict):
+                    result[key] = candidate
+            except json.JSONDecodeError:
+                result["parse_error"] = result["parse_error"] or f"invalid_{key}_json"
+    return result
+
+
+def _recorded(root: Path, limit: int) -> List[str]:
+    out: List[str] = []
+    for path in sorted(root.glob("*.jsonl")) if root.exists() else []:
+        with path.open("rb") as fh:
+            for line in fh:
+                try:
+                    raw = (codec.loads(line).get("model_output") or {}).get("raw")
+                except ValueError:
+                    continue
+                if isinstance(raw, str):
+                    out.append(raw)
+                    if len(out) >= limit:
+                        return out
+    return out
+
+
+def _synthetic(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    outputs = []
+    for i in range(count):
+        think = "Consider which call sites use print and why. " * rng.choice([2, 8, 40])
+        action = json.dumps({"command": ["ast-grep", "run", "-p", f"print($A{i})", "-r", "log($A)"]})
+        update = json.dumps({"history": [f"rewrote call {i}"], "next_focus": "run tests"})
+        outputs.append(f"<think>\n{think}\n</think>\n<action>\n{action}\n</action>\n<state_update>\n{update}\n</state_update>")
+    return outputs
+
+
+def _streamed(raw: str, chunk: int = 16) -> None:
+    parser = TagParser()
+    for i in range(0, len(raw), chunk):
+        parser.feed(raw[i : i + chunk])
+    parser.finish()
+
+
+def _time(fn: Callable[[str], Any], outputs: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for raw in outputs:
+            fn(raw)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(outputs: List[str], repeat: int = 3) -> List[Dict[str, Any]]:
+    total_bytes = sum(len(o.encode("utf-8")) for o in outputs)
+    results = []
+    for name, fn in (
+        ("legacy_find_x3", _legacy_parse),
+        ("tag_parser", parse_model_output),
+        ("tag_parser_stream16", _streamed),
+    ):
+        elapsed = _time(fn, outputs, repeat)
+        results.append(
+            {
+                "impl": name,
+                "outputs": len(outputs),
+                "seconds": elapsed,
+                "outputs_per_sec": len(outputs) / elapsed if elapsed else 0.0,
+                "mb_per_sec": total_bytes / elapsed / 1e6 if elapsed else 0.0,
+            }
+        )
+    return results
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m scripts.bench_output_parser",
+        description="Benchmark tag parsing of model outputs on a large batch.",
+    )
+    parser.add_argument(
+        "--traj-root",
+        type=Path,
+        default=None,
+        help="Read recorded completions from trajectory JSONL files in this directory.",
+    )
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=20000,
+        help="Number of completions to parse (default: 20000).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Timing repetitions; the best is reported (default: 3).",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print raw results as JSON instead of a table.",
+    )
+    args = parser.parse_args(argv)
+
+    outputs = _recorded(args.traj_root, args.count) if args.traj_root else []
+    source = f"recorded ({args.traj_root})"
+    if not outputs:
+        outputs = _synthetic(args.count)
+        source = "synthetic"
+
+    results = run(outputs, args.repeat)
+    if args.json:
+        print(json.dumps({"source": source, "results": results}, indent=2))
+        return
+
+    print(f"{len(outputs)} {source} completions")
+    print(f"{'impl':<22} {'seconds':>9} {'outputs/s':>11} {'MB/s':>8}")
+    for row in results:
+        print(f"{row['impl']:<22} {row['seconds']:>9.3f} {row['outputs_per_sec']:>11.0f} {row['mb_per_sec']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
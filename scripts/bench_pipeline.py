@@ -0,0 +1,310 @@
+"""End-to-end throughput benchmark of the actor and teacher step pipelines.
+
+Starts a stub vLLM server on localhost whose ``/generate`` replays canned
+completions after a sampled delay, points the vLLM client at it, and drives
+``actor_loop.run_single_step`` and ``srl_teacher.run_teacher_step`` over
+synthetic tasks whose workspaces hold 1, 20 and 200 files (``--files``).
+Everything the steps write (state DB, sandbox workspaces and logs,
+trajectories) goes to a temporary directory.
+
+For every pipeline and workspace size it reports steps/sec, p50/p99 step
+latency, and the mean time per step of each tracing span (``metrics.spans``
+of the written records, see ``src.data.tracing``). ``--output`` stores the
+results with the current git commit so runs can be diffed.
+
+Latency specs (milliseconds): ``fixed:50``, ``uniform:20,80``,
+``exp:50`` (mean) or ``lognormal:50,0.6`` (median, sigma).
+
+    python -m scripts.bench_pipeline [--steps 40] [--workers 4] [--latency lognormal:50,0.6] [--output bench.json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from src.actors import actor_loop, flow_control, health, vllm_client
+from src.data import codec, tracing
+from src.data.schemas import repo_root
+from src.sandbox import runner as sandbox_runner
+from src.state import manager as state_manager
+from src.teachers import srl_teacher
+
+
+_EDIT_ACTION = {
+    "command": [
+        "python",
+        "-c",
+        "import pathlib; p = pathlib.Path('mod_0.py'); p.write_text(p.read_text().replace('print(', 'log('))",
+    ]
+}
+# Canned completions: a successful edit (most common), an action whose JSON
+# does not parse, and a state update without an action.
+_COMPLETIONS = [
+    "<think>\nReplace print calls with log in the first module.\n</think>\n"
+    f"<action>\n{json.dumps(_EDIT_ACTION)}\n</action>\n"
+    '<state_update>\n{"history": ["rewrote print calls in mod_0"], "next_focus": "run tests"}\n</state_update>',
+    "<think>\nTry a rewrite.\n</think>\n<action>\n{\"command\": [\"python\", </action>\n"
+    '<state_update>\n{"history": ["malformed action"]}\n</state_update>',
+    "<think>\nNothing to run yet.\n</think>\n"
+    '<state_update>\n{"hypotheses": ["print calls are only in mod_0"], "next_focus": "inspect"}\n</state_update>',
+]
+_COMPLETION_WEIGHTS = [0.7, 0.1, 0.2]
+
+
+def parse_latency(spec: str, rng: random.Random) -> Callable[[], float]:
+    """Return a sampler of delays in seconds for a spec like ``lognormal:50,0.6``."""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda: rng.uniform(values[0], values[1]) / 1000
+    if kind == "exp" and len(values) == 1 and values[0] > 0:
+        return lambda: rng.expovariate(1000 / values[0])
+    if kind == "lognormal" and len(values) == 2:
+        return lambda: values[0] / 1000 * rng.lognormvariate(0, values[1])
+    raise ValueError(f"Unknown latency spec {spec!r}; use fixed:MS, uniform:LO,HI, exp:MEAN or lognormal:MEDIAN,SIGMA")
+
+
+class StubServer:
+    """Threaded HTTP server answering ``/generate`` and ``/health`` like vLLM."""
+
+    def __init__(self, latency: Callable[[], float], *, seed: int = 0):
+        rng = random.Random(seed)
+        lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, payload: Dict[str, Any]) -> None:
+                body = codec.dumpb(payload)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:  # noqa: N802 - http.server API
+                self._reply({"status": "ok"})
+
+            def do_POST(self) -> None:  # noqa: N802 - http.server API
+                request = codec.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                n = int(request.get("n", 1))
+                with lock:
+                    delay = latency()
+                    texts = rng.choices(_COMPLETIONS, _COMPLETION_WEIGHTS, k=n)
+                time.sleep(delay)
+                self._reply({"text": texts})
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _workspace(files: int) -> Dict[str, str]:
+    body = "".join(f"def f{i}(x):\n    print(x + {i})\n    return x\n\n" for i in range(40))  # ~1.5 KB
+    return {f"mod_{i}.py": body for i in range(files)}
+
+
+def _isolate(root: Path, server_url: str, workers: int) -> None:
+    """Send every write of the pipeline under ``root`` and the client to the stub."""
+    cfg_path = root / "vllm_actors.yaml"
+    cfg_path.write_text(
+        "actors:\n"
+        "  - name: stub\n"
+        f"    base_url: {server_url}\n"
+        "    model: stub\n"
+        f"initial_concurrency: {max(1, workers)}\n"
+    )
+    sandbox_cfg = sandbox_runner._load_config()
+    sandbox_cfg.work_root = root / ".sandbox"
+    sandbox_cfg.logs_dir = root / "logs"
+    vllm_client._config_path = lambda: cfg_path  # type: ignore[assignment]
+    sandbox_runner._load_config = lambda: sandbox_cfg  # type: ignore[assignment]
+    state_manager._db_path = lambda: root / "state.sqlite3"  # type: ignore[assignment]
+    traj_root = root / "trajectories"
+    traj_root.mkdir(parents=True, exist_ok=True)
+    actor_loop._trajectories_root = lambda: traj_root  # type: ignore[assignment]
+    srl_teacher._trajectories_root = lambda: traj_root  # type: ignore[assignment]
+    flow_control.reset_limits()
+    health.reset_breakers()
+    state_manager.invalidate()
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _span_split(traj_root: Path, steps: int) -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    for path in traj_root.glob("*.jsonl"):
+        with path.open("rb") as fh:
+            for line in fh:
+                for name, seconds in ((codec.loads(line).get("metrics") or {}).get("spans") or {}).items():
+                    totals[name] = totals.get(name, 0.0) + seconds
+    return {name: totals[name] / steps * 1000 for name in sorted(totals, key=totals.get, reverse=True)}
+
+
+def run_scenario(pipeline: str, files: int, *, steps: int, workers: int, server_url: str) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="bench-pipeline-") as tmp:
+        root = Path(tmp)
+        _isolate(root, server_url, workers)
+        client = vllm_client.VLLMClient()
+        step_fn = actor_loop.run_single_step if pipeline == "actor" else srl_teacher.run_teacher_step
+        workspace = _workspace(files)
+        tasks = [{"task_id": f"{pipeline}-{files}-{i}", "prompt": "Replace print with log.", "workspace_files": workspace} for i in range(steps)]
+        latencies: List[float] = []
+        lock = threading.Lock()
+
+        def _step(task: Dict[str, Any]) -> None:
+            start = time.perf_counter()
+            step_fn(task, client=client)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+        tracing.enable()
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                list(pool.map(_step, tasks))
+            elapsed = time.perf_counter() - start
+        finally:
+            tracing.disable()
+            state_manager.close_connections()
+        return {
+            "pipeline": pipeline,
+            "workspace_files": files,
+            "steps": steps,
+            "workers": workers,
+            "seconds": elapsed,
+            "steps_per_sec": steps / elapsed if elapsed else 0.0,
+            "p50_ms": _percentile(latencies, 0.5) * 1000,
+            "p99_ms": _percentile(latencies, 0.99) * 1000,
+            "mean_ms": statistics.fmean(latencies) * 1000,
+            "stage_ms_per_step": _span_split(root / "trajectories", steps),
+        }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=repo_root(), capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m scripts.bench_pipeline",
+        description="Benchmark actor and teacher steps end to end against a stub vLLM server.",
+    )
+    parser.add_argument(
+        "--pipelines",
+        nargs="+",
+        choices=["actor", "teacher"],
+        default=["actor", "teacher"],
+        help="Step pipelines to run (default: both).",
+    )
+    parser.add_argument(
+        "--files",
+        type=int,
+        nargs="+",
+        default=[1, 20, 200],
+        help="Workspace sizes in files of ~1.5 KB (default: 1 20 200).",
+    )
+    parser.add_argument(
+        "--steps",
+        type=int,
+        default=40,
+        help="Steps per pipeline and workspace size (default: 40).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Steps run concurrently (default: 4).",
+    )
+    parser.add_argument(
+        "--latency",
+        default="lognormal:50,0.6",
+        help="Stub generation latency in ms (default: lognormal:50,0.6).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed for stub latencies and completions (default: 0).",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Write the results (with the git commit) to this JSON file.",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print raw results as JSON instead of a table.",
+    )
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    results = []
+    with StubServer(parse_latency(args.latency, rng), seed=args.seed) as server:
+        for pipeline in args.pipelines:
+            for files in args.files:
+                results.append(
+                    run_scenario(pipeline, files, steps=args.steps, workers=args.workers, server_url=server.url)
+                )
+
+    report = {
+        "commit": _git_commit(),
+        "created": time.time(),
+        "config": {"steps": args.steps, "workers": args.workers, "latency": args.latency, "seed": args.seed},
+        "results": results,
+    }
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'pipeline':<8} {'files':>5} {'steps/s':>8} {'p50 ms':>8} {'p99 ms':>8}  top stages (ms/step)")
+    for row in results:
+        top = ", ".join(f"{name} {ms:.1f}" for name, ms in list(row["stage_ms_per_step"].items())[:4])
+        print(
+            f"{row['pipeline']:<8} {row['workspace_files']:>5} {row['steps_per_sec']:>8.1f} "
+            f"{row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f}  {top}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark group reward scoring throughput.
+
+Builds synthetic groups of G sampled actions/state updates around a teacher
+step and reports samples scored per second for the vectorized path and the
+pure-Python fallback.
+
+    python -m scripts.bench_rewards [--groups 2000] [--group-size 8]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from src.teachers import rewards
+
+
+def _groups(count: int, size: int, seed: int = 0) -> List[rewards.Group]:
+    rng = random.Random(seed)
+    out = []
+    for i in range(count):
+        pattern = f"print($A{i % 7})"
+        ref_action = {"command": ["ast-grep", "run", "-p", pattern, "-r", "logger.info($A)"]}
+        ref_update = {"history": [f"rewrote call {i}"], "next_focus": "run tests"}
+        actions: List[Optional[Dict[str, Any]]] = []
+        updates: List[Optional[Dict[str, Any]]] = []
+        for _ in range(size):
+            if rng.random() < 0.1:
+                actions.append(None)
+                updates.append(None)
+                continue
+            command = list(ref_action["command"])
+            if rng.random() < 0.5:
+                command[-1] = rng.choice(["log($A)", "logging.debug($A)", "logger.info($A)"])
+            actions.append({"command": command})
+            updates.append({"history": [f"rewrote call {i}" if rng.random() < 0.7 else "other"]})
+        out.append(rewards.Group(ref_action, ref_update, actions, updates))
+    return out
+
+
+def run(groups: int, group_size: int, repeat: int = 3) -> List[Dict[str, Any]]:
+    batch = _groups(groups, group_size)
+    samples = groups * group_size
+    results = []
+    backends = [("numpy", rewards.np)] if rewards.np is not None else []
+    backends.append(("python", None))
+    saved = rewards.np
+    try:
+        for name, module in backends:
+            rewards.np = module
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                rewards.score_groups(batch)
+                best = min(best, time.perf_counter() - start)
+            results.append({"backend": name, "samples": samples, "seconds": best, "samples_per_sec": samples / best})
+    finally:
+        rewards.np = saved
+    return results
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m scripts.bench_rewards",
+        description="Benchmark group reward scoring throughput.",
+    )
+    parser.add_argument("--groups", type=int, default=2000, help="Number of prompts (default: 2000).")
+    parser.add_argument("--group-size", type=int, default=8, help="Samples per prompt, G (default: 8).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repetitions; best is reported (default: 3).")
+    parser.add_argument("--json", action="store_true", help="Print raw results as JSON instead of a table.")
+    args = parser.parse_args(argv)
+
+    results = run(args.groups, args.group_size, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'backend':<8} {'samples':>8} {'seconds':>8} {'samples/s':>10}")
+    for row in results:
+        print(f"{row['backend']:<8} {row['samples']:>8} {row['seconds']:>8.3f} {row['samples_per_sec']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Multi-process contention benchmark for the state manager.
+
+Spawns 1, 8 and 32 writer processes (configurable) that each run the actor's
+per-step pattern, ``load(task_id)`` followed by ``save(task_id, merged)``,
+against a fresh database for a fixed duration, and reports aggregate
+operations per second. ``--mode legacy`` reproduces the previous
+connect-per-call, rollback-journal behaviour for comparison and
+``--mode write-behind`` measures group-committed saves (including the final
+``flush``).
+
+    python -m scripts.bench_state_contention [--writers 1 8 32] [--seconds 3]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import sqlite3
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.data import codec
+from src.state import manager as state_manager
+
+
+def _legacy_load(db_path: Path, task_id: str) -> state_manager.State:
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS state (task_id TEXT PRIMARY KEY, blob TEXT NOT NULL)")
+        row = conn.execute("SELECT blob FROM state WHERE task_id = ?", (task_id,)).fetchone()
+    if row is None:
+        return state_manager.State()
+    return state_manager.State(**codec.loads(row[0]))
+
+
+def _legacy_save(db_path: Path, task_id: str, state: state_manager.State) -> None:
+    blob = codec.dumps(asdict(state_manager._apply_caps(state)))
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS state (task_id TEXT PRIMARY KEY, blob TEXT NOT NULL)")
+        conn.execute(
+            "INSERT INTO state(task_id, blob) VALUES (?, ?)"
+            " ON CONFLICT(task_id) DO UPDATE SET blob=excluded.blob",
+            (task_id, blob),
+        )
+        conn.commit()
+
+
+def _worker(db_path: str, mode: str, worker: int, tasks: int, seconds: float, start_at: float, out) -> None:
+    path = Path(db_path)
+    state_manager._db_path = lambda: path  # type: ignore[assignment]
+    if mode == "write-behind":
+        state_manager.enable_write_behind()
+    while time.time() < start_at:
+        time.sleep(0.001)
+    deadline = start_at + seconds
+    ops = 0
+    errors = 0
+    i = 0
+    update = state_manager.State(history=[f"worker {worker} step"], next_focus="continue")
+    while time.time() < deadline:
+        task_id = f"task-{(worker * 7919 + i) % tasks}"
+        i += 1
+        try:
+            if mode == "legacy":
+                state = _legacy_load(path, task_id)
+                _legacy_save(path, task_id, state_manager.merge(state, update))
+            else:
+                state = state_manager.load(task_id)
+                state_manager.save(task_id, state_manager.merge(state, update))
+            ops += 2
+        except sqlite3.OperationalError:
+            errors += 1
+    state_manager.disable_write_behind()
+    out.put((ops, errors, time.time() - start_at))
+
+
+def run(writers: int, *, mode: str, seconds: float, tasks: int) -> Dict[str, Any]:
+    ctx = multiprocessing.get_context()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "state.sqlite3"
+        queue = ctx.Queue()
+        start_at = time.time() + 0.5 + 0.02 * writers
+        procs = [
+            ctx.Process(target=_worker, args=(str(db_path), mode, w, tasks, seconds, start_at, queue))
+            for w in range(writers)
+        ]
+        for proc in procs:
+            proc.start()
+        results = [queue.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+    ops = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    elapsed = max(r[2] for r in results)
+    return {
+        "mode": mode,
+        "writers": writers,
+        "seconds": elapsed,
+        "ops": ops,
+        "ops_per_sec": ops / elapsed,
+        "locked_errors": errors,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m scripts.bench_state_contention",
+        description="Measure state load/save throughput under multi-process contention.",
+    )
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--tasks", type=int, default=1000, help="Number of distinct task_ids.")
+    parser.add_argument("--mode", choices=["pooled", "legacy", "write-behind", "all"], default="all")
+    parser.add_argument("--json", action="store_true", help="Print raw results as JSON.")
+    args = parser.parse_args(argv)
+
+    modes = ["legacy", "pooled", "write-behind"] if args.mode == "all" else [args.mode]
+    results: List[Dict[str, Any]] = []
+    for mode in modes:
+        for writers in args.writers:
+            results.append(run(writers, mode=mode, seconds=args.seconds, tasks=args.tasks))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<12} {'writers':>7} {'ops/s':>10} {'locked':>7}")
+    for row in results:
+        print(f"{row['mode']:<12} {row['writers']:>7} {row['ops_per_sec']:>10.0f} {row['locked_errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,47 @@
 
 This script scans JSONL files under ``trajectories/raw/`` and writes a small
 Markdown report to ``reports/teacher/metrics.md`` (paths are derived from
-``repo_root()`` by default).
+``repo_root()`` by default). With ``--use-index`` the per-model aggregates are
+read from the trajectory index (``src.trajectories.index``) instead, which
+only parses records appended since the index was last updated.
+
+Without the index, files are split into byte ranges and scanned by a process
+pool; the per-file aggregates are cached in ``data/teacher_metrics_cache.json``
+keyed by path, size and mtime, so reruns only parse new or appended bytes. A
+changed file is treated as appended to only if its inode and a hash of its
+first block match the cache entry; otherwise it is rescanned.
+
+Per model, ``metrics.actor_latency_sec``, ``metrics.teacher_latency_sec`` and
+``sandbox_result.duration_sec`` are summarized with constant-memory quantile
+sketches and log-bucketed histograms (``src.data.sketches``) that merge across
+workers and cache entries.
+
+``--follow`` keeps the aggregates in memory and tails the trajectory files,
+printing a rolling summary (steps/sec, reward rate, latency quantiles) every
+``--interval`` seconds; the Markdown report is written when it stops.
 """
 from __future__ import annotations
 
 import argparse
 import json
-from dataclasses import dataclass
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
+from src.data import codec
 from src.data.schemas import repo_root
+from src.data.sketches import LatencyStats
+from src.trajectories.index import HEAD_BYTES, TrajectoryIndex, head_digest
+from src.trajectories.tail import TrajectoryTailer
+
+
+# Latency metrics tracked per model, in report order.
+LATENCY_METRICS = ("actor_latency_sec", "teacher_latency_sec", "sandbox_duration_sec")
+_QUANTILES = (0.5, 0.9, 0.99)
 
 
 @dataclass
@@ -21,6 +51,62 @@ class ModelStats:
     reward_sum: float = 0.0
     reward_count: int = 0
     verified: int = 0
+    latency: Dict[str, LatencyStats] = field(default_factory=dict)
+
+    def add_latency(self, metric: str, value: Any) -> None:
+        if value is None or isinstance(value, bool):
+            return
+        try:
+            sample = float(value)
+        except (TypeError, ValueError):
+            return
+        stats = self.latency.get(metric)
+        if stats is None:
+            stats = LatencyStats()
+            self.latency[metric] = stats
+        stats.add(sample)
+
+    def merge(self, other: "ModelStats") -> "ModelStats":
+        """Fold another partial aggregate into this one and return self."""
+        self.steps += other.steps
+        self.reward_sum += other.reward_sum
+        self.reward_count += other.reward_count
+        self.verified += other.verified
+        for metric, stats in other.latency.items():
+            existing = self.latency.get(metric)
+            if existing is None:
+                existing = LatencyStats()
+                self.latency[metric] = existing
+            existing.merge(stats)
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "steps": self.steps,
+            "reward_sum": self.reward_sum,
+            "reward_count": self.reward_count,
+            "verified": self.verified,
+            "latency": {metric: stats.to_dict() for metric, stats in self.latency.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "ModelStats":
+        return cls(
+            steps=int(data.get("steps", 0)),
+            reward_sum=float(data.get("reward_sum", 0.0)),
+            reward_count=int(data.get("reward_count", 0)),
+            verified=int(data.get("verified", 0)),
+            latency={
+                metric: LatencyStats.from_dict(raw)
+                for metric, raw in (data.get("latency") or {}).items()
+            },
+        )
+
+
+# Files larger than this are split into several byte ranges so a single huge
+# shard still spreads across workers.
+_CHUNK_BYTES = 64 * 1024 * 1024
+_CACHE_VERSION = 3
 
 
 def _trajectories_root(override: Optional[str] = None) -> Path:
@@ -39,58 +125,289 @@ def _output_path(override: Optional[str] = None) -> Path:
     return root / "reports" / "teacher" / "metrics.md"
 
 
-def _scan_trajectories(root: Path) -> Dict[str, ModelStats]:
+def _cache_path(override: Optional[str] = None) -> Path:
+    if override:
+        return Path(override)
+    return repo_root() / "data" / "teacher_metrics_cache.json"
+
+
+def _merge_into(target: Dict[str, ModelStats], partial: Mapping[str, ModelStats]) -> None:
+    for model_name, model_stats in partial.items():
+        existing = target.get(model_name)
+        if existing is None:
+            existing = ModelStats()
+            target[model_name] = existing
+        existing.merge(model_stats)
+
+
+def _accumulate(stats: Dict[str, ModelStats], line: bytes) -> None:
+    line = line.strip()
+    if not line:
+        return
+    try:
+        record = codec.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return
+    if not isinstance(record, dict):
+        return
+
+    teacher = record.get("teacher") or {}
+    model_name = teacher.get("model") or "unknown"
+    model_stats = stats.get(model_name)
+    if model_stats is None:
+        model_stats = ModelStats()
+        stats[model_name] = model_stats
+
+    # Latencies are tracked for every step, rewarded or not.
+    metrics = record.get("metrics") or {}
+    if isinstance(metrics, dict):
+        model_stats.add_latency("actor_latency_sec", metrics.get("actor_latency_sec"))
+        model_stats.add_latency("teacher_latency_sec", metrics.get("teacher_latency_sec"))
+    sandbox = record.get("sandbox_result") or {}
+    if isinstance(sandbox, dict):
+        model_stats.add_latency("sandbox_duration_sec", sandbox.get("duration_sec"))
+
+    reward = record.get("reward")
+    # Only count steps with an explicit numeric reward.
+    if reward is None:
+        return
+    try:
+        reward_val = float(reward)
+    except (TypeError, ValueError):
+        return
+
+    model_stats.steps += 1
+    model_stats.reward_sum += reward_val
+    model_stats.reward_count += 1
+    if reward_val > 0:
+        model_stats.verified += 1
+
+
+def _scan_range(
+    path: str, start: int, stop: int, size: int
+) -> Tuple[str, Dict[str, ModelStats], Dict[str, ModelStats], int]:
+    """Scan the lines of ``path`` that start within ``[start, stop)``.
+
+    Returns ``(path, complete, tail, end)`` where ``complete`` aggregates
+    newline-terminated lines, ``tail`` aggregates a final unterminated line
+    (possibly still being written) and ``end`` is the offset just past the
+    last complete line. Bytes past ``size`` are ignored so a concurrent
+    appender cannot race the scan.
+    """
+    complete: Dict[str, ModelStats] = {}
+    tail: Dict[str, ModelStats] = {}
+    end = start
+    with open(path, "rb") as fh:
+        if start > 0:
+            fh.seek(start - 1)
+            if fh.read(1) != b"\n":
+                # The line straddling ``start`` belongs to the previous range.
+                fh.readline()
+        pos = fh.tell()
+        while pos < stop:
+            line = fh.readline()
+            if not line:
+                break
+            if pos + len(line) > size:
+                line = line[: size - pos]
+            pos += len(line)
+            if line.endswith(b"\n"):
+                _accumulate(complete, line)
+                end = pos
+            else:
+                _accumulate(tail, line)
+                break
+    return path, complete, tail, end
+
+
+def _load_cache(path: Optional[Path]) -> Dict[str, Dict[str, Any]]:
+    if path is None or not path.exists():
+        return {}
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != _CACHE_VERSION:
+        return {}
+    files = data.get("files")
+    return files if isinstance(files, dict) else {}
+
+
+def _store_cache(path: Optional[Path], files: Mapping[str, Any]) -> None:
+    if path is None:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps({"version": _CACHE_VERSION, "files": files}), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _scan_trajectories(
+    root: Path,
+    *,
+    jobs: Optional[int] = None,
+    cache_path: Optional[Path] = None,
+) -> Dict[str, ModelStats]:
+    """Aggregate per-model stats over ``root/*.jsonl``.
+
+    ``jobs`` controls the process pool size (default: CPU count; ``1`` scans
+    inline). When ``cache_path`` is given, per-file aggregates are reused for
+    files whose inode, size and mtime are unchanged, and appended files (same
+    inode and first block) are only scanned from the previously cached offset.
+    """
     stats: Dict[str, ModelStats] = {}
     if not root.exists():
         return stats
 
+    cache = _load_cache(cache_path)
+    new_cache: Dict[str, Any] = {}
+    per_file: Dict[str, Dict[str, ModelStats]] = {}
+    ends: Dict[str, int] = {}
+    sizes: Dict[str, Tuple[int, float, int]] = {}
+    work: List[Tuple[str, int, int, int]] = []
+
     for path in sorted(root.glob("*.jsonl")):
-        with path.open("r", encoding="utf-8") as fh:
-            for line in fh:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    record = json.loads(line)
-                except json.JSONDecodeError:
-                    continue
+        key = str(path)
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        sizes[key] = (st.st_size, st.st_mtime, st.st_ino)
+        entry = cache.get(key)
+        start = 0
+        base: Dict[str, ModelStats] = {}
+        if isinstance(entry, dict):
+            cached_offset = int(entry.get("offset", 0))
+            cached_models = {
+                name: ModelStats.from_dict(raw) for name, raw in (entry.get("models") or {}).items()
+            }
+            same_file = entry.get("inode") == st.st_ino
+            unchanged = entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime
+            if same_file and unchanged and cached_offset == st.st_size:
+                _merge_into(stats, cached_models)
+                new_cache[key] = entry
+                continue
+            if (
+                same_file
+                and cached_offset <= st.st_size
+                and int(entry.get("size", 0)) <= st.st_size
+                and head_digest(path, int(entry.get("head_len", 0))) == entry.get("head")
+            ):
+                start = cached_offset
+                base = cached_models
+        per_file[key] = base
+        ends[key] = start
+        for chunk_start in range(start, max(st.st_size, start + 1), _CHUNK_BYTES):
+            chunk_stop = min(chunk_start + _CHUNK_BYTES, st.st_size)
+            work.append((key, chunk_start, chunk_stop, st.st_size))
 
-                teacher = record.get("teacher") or {}
-                model_name = teacher.get("model") or "unknown"
-                reward = record.get("reward")
-                # Only count steps with an explicit numeric reward.
-                if reward is None:
-                    continue
-                try:
-                    reward_val = float(reward)
-                except (TypeError, ValueError):
-                    continue
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    tails: Dict[str, ModelStats] = {}
+    if jobs > 1 and len(work) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(work))) as pool:
+            results = list(pool.map(_scan_range, *zip(*work)))
+    else:
+        results = [_scan_range(*unit) for unit in work]
+
+    for key, complete, tail, end in results:
+        _merge_into(per_file[key], complete)
+        _merge_into(tails, tail)
+        ends[key] = max(ends[key], end)
 
-                model_stats = stats.get(model_name)
-                if model_stats is None:
-                    model_stats = ModelStats()
-                    stats[model_name] = model_stats
+    for key, file_stats in per_file.items():
+        _merge_into(stats, file_stats)
+        size, mtime, inode = sizes[key]
+        head_len = min(size, HEAD_BYTES)
+        new_cache[key] = {
+            "size": size,
+            "mtime": mtime,
+            "inode": inode,
+            "head_len": head_len,
+            "head": head_digest(Path(key), head_len),
+            "offset": ends[key],
+            "models": {name: m.to_dict() for name, m in file_stats.items()},
+        }
+    # Unterminated trailing lines are counted but never cached, so they are
+    # re-read on the next run once the writer has finished them.
+    _merge_into(stats, tails)
+    _store_cache(cache_path, new_cache)
+    return stats
 
-                model_stats.steps += 1
-                model_stats.reward_sum += reward_val
-                model_stats.reward_count += 1
-                if reward_val > 0:
-                    model_stats.verified += 1
 
+def _scan_with_index(root: Path, db_path: Optional[Path] = None) -> Dict[str, ModelStats]:
+    stats: Dict[str, ModelStats] = {}
+    with TrajectoryIndex(db_path) as index:
+        index.update(root)
+        for model_name, (steps, reward_sum, verified) in index.model_aggregates().items():
+            stats[model_name] = ModelStats(
+                steps=steps,
+                reward_sum=reward_sum,
+                reward_count=steps,
+                verified=verified,
+            )
+        for model_name, actor, teacher, sandbox in index.iter_latencies():
+            model_stats = stats.get(model_name)
+            if model_stats is None:
+                model_stats = ModelStats()
+                stats[model_name] = model_stats
+            model_stats.add_latency("actor_latency_sec", actor)
+            model_stats.add_latency("teacher_latency_sec", teacher)
+            model_stats.add_latency("sandbox_duration_sec", sandbox)
     return stats
 
 
+def _format_seconds(value: Optional[float]) -> str:
+    if value is None:
+        return "-"
+    if value < 1.0:
+        return f"{value * 1000:.1f}ms"
+    return f"{value:.2f}s"
+
+
+def _latency_lines(stats: Dict[str, ModelStats]) -> list[str]:
+    rows = [
+        (model_name, metric, stats[model_name].latency[metric])
+        for model_name in sorted(stats.keys())
+        for metric in LATENCY_METRICS
+        if metric in stats[model_name].latency and stats[model_name].latency[metric].count
+    ]
+    if not rows:
+        return []
+
+    lines = ["", "## Latency", ""]
+    lines.append("| Model | Metric | Count | p50 | p90 | p99 | Max |")
+    lines.append("|-------|--------|-------|-----|-----|-----|-----|")
+    for model_name, metric, latency in rows:
+        quantiles = " | ".join(_format_seconds(latency.sketch.quantile(q)) for q in _QUANTILES)
+        lines.append(
+            f"| {model_name} | {metric} | {latency.count} | {quantiles} | "
+            f"{_format_seconds(latency.sketch.max)} |"
+        )
+
+    lines.extend(["", "## Latency histograms"])
+    for model_name, metric, latency in rows:
+        lines.extend(["", f"### {model_name} / {metric}", ""])
+        lines.append("| Bucket | Count |")
+        lines.append("|--------|-------|")
+        for low, high, count in latency.histogram.buckets():
+            lines.append(f"| [{_format_seconds(low)}, {_format_seconds(high)}) | {count} |")
+    return lines
+
+
 def _write_markdown(path: Path, stats: Dict[str, ModelStats]) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     lines = ["# Teacher Metrics", ""]
 
-    if not stats:
+    rewarded = {name: m for name, m in stats.items() if m.steps > 0}
+    if not rewarded:
         lines.append("No teacher-labeled trajectories with rewards were found.")
+        lines.extend(_latency_lines(stats))
         path.write_text("\n".join(lines), encoding="utf-8")
         return
 
-    total_steps = sum(m.steps for m in stats.values())
-    total_verified = sum(m.verified for m in stats.values())
+    total_steps = sum(m.steps for m in rewarded.values())
+    total_verified = sum(m.verified for m in rewarded.values())
 
     lines.append(f"Total teacher-labeled steps: **{total_steps}**")
     lines.append(f"Total verified steps (reward > 0): **{total_verified}**")
@@ -100,8 +417,8 @@ def _write_markdown(path: Path, stats: Dict[str, ModelStats]) -> None:
     lines.append("| Model | Steps | Verified | Precision | Avg reward |")
     lines.append("|-------|-------|----------|-----------|------------|")
 
-    for model_name in sorted(stats.keys()):
-        m = stats[model_name]
+    for model_name in sorted(rewarded.keys()):
+        m = rewarded[model_name]
         if m.reward_count > 0:
             precision = m.verified / m.reward_count
             avg_reward = m.reward_sum / m.reward_count
@@ -113,9 +430,88 @@ def _write_markdown(path: Path, stats: Dict[str, ModelStats]) -> None:
             f"{precision:.3f} | {avg_reward:.3f} |"
         )
 
+    lines.extend(_latency_lines(stats))
     path.write_text("\n".join(lines), encoding="utf-8")
 
 
+def _follow_summary(
+    stats: Dict[str, ModelStats],
+    new_steps: int,
+    new_verified: int,
+    elapsed: float,
+) -> str:
+    total_steps = sum(m.steps for m in stats.values())
+    total_verified = sum(m.verified for m in stats.values())
+    rate = new_steps / elapsed if elapsed > 0 else 0.0
+    parts = [f"steps={total_steps} (+{new_steps}, {rate:.2f}/s)"]
+    if total_steps:
+        parts.append(f"reward_rate={total_verified / total_steps:.3f}")
+    if new_steps:
+        parts.append(f"window_reward_rate={new_verified / new_steps:.3f}")
+    for metric in LATENCY_METRICS:
+        combined = LatencyStats()
+        for m in stats.values():
+            if metric in m.latency:
+                combined.merge(m.latency[metric])
+        if combined.count:
+            quantiles = "/".join(_format_seconds(combined.sketch.quantile(q)) for q in _QUANTILES)
+            parts.append(f"{metric} p50/p90/p99={quantiles}")
+    return " ".join(parts)
+
+
+def _follow(
+    root: Path,
+    *,
+    interval: float,
+    from_end: bool = False,
+    max_polls: Optional[int] = None,
+) -> Dict[str, ModelStats]:
+    """Tail ``root`` and print a rolling summary every ``interval`` seconds.
+
+    Aggregates are kept per file, so a file that is truncated or replaced
+    drops its old contribution before it is counted again from the start,
+    and a deleted file drops it for good.
+    """
+    stats: Dict[str, ModelStats] = {}
+    per_file: Dict[str, Dict[str, ModelStats]] = {}
+    tailer = TrajectoryTailer(root, from_end=from_end)
+    polls = 0
+    last = time.monotonic()
+    try:
+        while max_polls is None or polls < max_polls:
+            if polls:
+                time.sleep(interval)
+            polls += 1
+            window: Dict[str, ModelStats] = {}
+            rebuild = False
+            for path, lines, reset in tailer.poll_files():
+                if reset:
+                    per_file.pop(path, None)
+                    rebuild = True
+                if not lines:
+                    continue
+                delta: Dict[str, ModelStats] = {}
+                for line in lines:
+                    _accumulate(delta, line)
+                _merge_into(per_file.setdefault(path, {}), delta)
+                _merge_into(window, delta)
+            if rebuild:
+                stats = {}
+                for file_stats in per_file.values():
+                    _merge_into(stats, file_stats)
+            else:
+                _merge_into(stats, window)
+            now = time.monotonic()
+            new_steps = sum(m.steps for m in window.values())
+            new_verified = sum(m.verified for m in window.values())
+            print(f"[follow] {_follow_summary(stats, new_steps, new_verified, now - last)}")
+            sys.stdout.flush()
+            last = now
+    except KeyboardInterrupt:
+        pass
+    return stats
+
+
 def main(argv: Optional[list[str]] = None) -> None:
     parser = argparse.ArgumentParser(
         prog="python -m scripts.report_teacher_metrics",
@@ -131,12 +527,60 @@ def main(argv: Optional[list[str]] = None) -> None:
         default=None,
         help="Override output path for metrics markdown (default: reports/teacher/metrics.md).",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of worker processes for the scan (default: CPU count).",
+    )
+    parser.add_argument(
+        "--cache",
+        default=None,
+        help="Override path to the per-file aggregate cache (default: data/teacher_metrics_cache.json).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Rescan every file from the start and do not update the cache.",
+    )
+    parser.add_argument(
+        "--use-index",
+        action="store_true",
+        help="Aggregate from the incrementally updated trajectory index instead of rescanning.",
+    )
+    parser.add_argument(
+        "--index-db",
+        default=None,
+        help="Override path to the trajectory index database (default: data/trajectory_index.sqlite3).",
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="Tail trajectory files and print a rolling summary until interrupted.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=10.0,
+        help="Seconds between summaries in --follow mode (default: 10).",
+    )
+    parser.add_argument(
+        "--from-end",
+        action="store_true",
+        help="In --follow mode, ignore records that already exist when starting.",
+    )
     args = parser.parse_args(argv)
 
     traj_root = _trajectories_root(args.traj_root)
     output_path = _output_path(args.output)
 
-    stats = _scan_trajectories(traj_root)
+    if args.follow:
+        stats = _follow(traj_root, interval=args.interval, from_end=args.from_end)
+    elif args.use_index:
+        stats = _scan_with_index(traj_root, Path(args.index_db) if args.index_db else None)
+    else:
+        cache_path = None if args.no_cache else _cache_path(args.cache)
+        stats = _scan_trajectories(traj_root, jobs=args.jobs, cache_path=cache_path)
     _write_markdown(output_path, stats)
 
 
@@ -1,16 +1,19 @@
 from __future__ import annotations
 
 import argparse
-import json
 import time
 from dataclasses import asdict
 from pathlib import Path
-from typing import Any, Dict, Mapping, Optional
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
 
-from src.actors.vllm_client import VLLMClient
+from src.actors.output_parser import parse_model_output
+from src.actors.vllm_client import MultiActorClient, VLLMClient
+from src.data import codec, tracing
+from src.data.manifest import TaskManifest, parse_shard
 from src.data.schemas import repo_root
 from src.sandbox import runner as sandbox_runner
 from src.state import manager as state_manager
+from src.state.work_queue import WorkQueue
 
 
 def _trajectories_root() -> Path:
@@ -26,54 +29,8 @@ def _trajectory_path(task_id: str) -> Path:
 
 def _append_trajectory_step(task_id: str, record: Mapping[str, Any]) -> None:
     path = _trajectory_path(task_id)
-    with path.open("a", encoding="utf-8") as fh:
-        fh.write(json.dumps(record, ensure_ascii=False) + "\n")
-
-
-def _extract_block(text: str, tag: str) -> Optional[str]:
-    start_tag = f"<{tag}>"
-    end_tag = f"</{tag}>"
-    start = text.find(start_tag)
-    if start == -1:
-        return None
-    start += len(start_tag)
-    end = text.find(end_tag, start)
-    if end == -1:
-        return None
-    return text[start:end].strip()
-
-
-def _parse_model_output(raw: str) -> Dict[str, Any]:
-    think = _extract_block(raw, "think")
-    action_raw = _extract_block(raw, "action")
-    state_update_raw = _extract_block(raw, "state_update")
-
-    action_obj: Optional[Dict[str, Any]] = None
-    state_update_obj: Optional[Dict[str, Any]] = None
-    parse_error: Optional[str] = None
-
-    if action_raw:
-        try:
-            candidate = json.loads(action_raw)
-            if isinstance(candidate, dict):
-                action_obj = candidate
-        except json.JSONDecodeError:
-            parse_error = parse_error or "invalid_action_json"
-    if state_update_raw:
-        try:
-            candidate = json.loads(state_update_raw)
-            if isinstance(candidate, dict):
-                state_update_obj = candidate
-        except json.JSONDecodeError:
-            parse_error = parse_error or "invalid_state_update_json"
-
-    return {
-        "raw": raw,
-        "think": think,
-        "action": action_obj,
-        "state_update": state_update_obj,
-        "parse_error": parse_error,
-    }
+    with path.open("ab") as fh:
+        fh.write(codec.dumpb(record) + b"\n")
 
 
 def _to_str_list(value: Any) -> list[str]:
@@ -109,38 +66,60 @@ def _next_step_index(task_id: str) -> int:
     return count + 1
 
 
-def run_single_step(task: Mapping[str, Any], *, client: Optional[VLLMClient] = None) -> None:
+def run_single_step(
+    task: Mapping[str, Any],
+    *,
+    client: Optional[VLLMClient] = None,
+    state_refs: bool = False,
+) -> None:
     """Run a single actor step for a task and append a trajectory record.
 
     The task mapping should contain:
       - task_id: unique identifier
       - prompt: base user prompt string
       - workspace_files: optional mapping of relative path -> file content
+
+    With tracing enabled (``src.data.tracing``), the step's span breakdown
+    is stored in ``metrics["spans"]``.
     """
+    with tracing.step_spans() as spans:
+        _run_single_step(task, client=client, state_refs=state_refs, spans=spans)
+
+
+def _run_single_step(
+    task: Mapping[str, Any],
+    *,
+    client: Optional[VLLMClient],
+    state_refs: bool,
+    spans: Optional[Dict[str, float]],
+) -> None:
     task_id = str(task["task_id"])
     base_prompt = str(task["prompt"])
 
     state_before = state_manager.load(task_id)
-    state_text = state_manager.render(state_before)
-    if state_text:
-        prompt = f"{base_prompt}\n\n<state>\n{state_text}\n</state>"
-    else:
-        prompt = base_prompt
+    with tracing.span("prompt.build"):
+        state_text = state_manager.render(state_before)
+        if state_text:
+            prompt = f"{base_prompt}\n\n<state>\n{state_text}\n</state>"
+        else:
+            prompt = base_prompt
 
     if client is None:
         client = VLLMClient()
 
     actor_start = time.time()
-    model_text = client.generate(
-        prompt,
-        stop=task.get("stop"),
-        temperature=float(task.get("temperature", 0.1)),
-        seed=task.get("seed"),
-        max_tokens=task.get("max_tokens"),
-    )
+    with tracing.span("generate"):
+        model_text = client.generate(
+            prompt,
+            stop=task.get("stop"),
+            temperature=float(task.get("temperature", 0.1)),
+            seed=task.get("seed"),
+            max_tokens=task.get("max_tokens"),
+        )
     actor_latency = time.time() - actor_start
 
-    parsed = _parse_model_output(model_text)
+    with tracing.span("parse"):
+        parsed = parse_model_output(model_text)
 
     workspace_files = task.get("workspace_files") or {}
     sandbox_result = None
@@ -156,8 +135,7 @@ def run_single_step(task: Mapping[str, Any], *, client: Optional[VLLMClient] = N
     state_update_obj = parsed.get("state_update")
     if isinstance(state_update_obj, dict):
         update_state = _state_from_update(state_update_obj)
-        state_after = state_manager.merge(state_before, update_state)
-        state_manager.save(task_id, state_after)
+        state_after = state_manager.merge_update(task_id, update_state)
 
     sandbox_result_dict: Optional[Dict[str, Any]] = None
     if sandbox_result is not None:
@@ -172,12 +150,21 @@ def run_single_step(task: Mapping[str, Any], *, client: Optional[VLLMClient] = N
             "changed_files": sandbox_result.changed_files,
         }
 
+    step = _next_step_index(task_id)
+    state_fields: Dict[str, Any]
+    if state_refs:
+        # The state history keeps a delta per step; the record only points at
+        # it (state_before is the version recorded for step - 1).
+        state_manager.record_step(task_id, step, state_after)
+        state_fields = {"state_ref": {"step": step}}
+    else:
+        state_fields = {"state_before": asdict(state_before), "state_after": asdict(state_after)}
+
     record: Dict[str, Any] = {
         "task_id": task_id,
-        "step": _next_step_index(task_id),
+        "step": step,
         "prompt": prompt,
-        "state_before": asdict(state_before),
-        "state_after": asdict(state_after),
+        **state_fields,
         "model_output": parsed,
         "sandbox_result": sandbox_result_dict,
         "reward": None,
@@ -186,35 +173,174 @@ def run_single_step(task: Mapping[str, Any], *, client: Optional[VLLMClient] = N
             "sandbox_failed": sandbox_result_dict is None or (sandbox_result and sandbox_result.exit_code != 0),
         },
     }
-    _append_trajectory_step(task_id, record)
+    if spans is not None:
+        record["metrics"]["spans"] = dict(spans)
+    with tracing.span("trajectory.append"):
+        _append_trajectory_step(task_id, record)
+
+
+_PREFETCH_WINDOW = 64
+
+
+def _iter_task_windows(
+    path: Path,
+    size: int,
+    *,
+    shard: Tuple[int, int] = (0, 1),
+    start: int = 0,
+    seed: Optional[int] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    window: List[Dict[str, Any]] = []
+    with TaskManifest(path) as manifest:
+        for task in manifest.iter_tasks(shard=shard, start=start, seed=seed):
+            window.append(task)
+            if len(window) >= max(1, size):
+                yield window
+                window = []
+    if window:
+        yield window
 
 
 def main(argv: Optional[list[str]] = None) -> None:
     parser = argparse.ArgumentParser(prog="python -m src.actors.actor_loop")
     parser.add_argument(
         "tasks_path",
+        nargs="?",
         help="Path to a JSONL file containing queued tasks.",
     )
     parser.add_argument(
         "--actor-name",
         dest="actor_name",
         default=None,
-        help="Name of the actor from configs/vllm_actors.yaml to use.",
+        help="Name of the actor from configs/vllm_actors.yaml to use (default: all, with failover).",
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="Spread requests over all configured actors and re-send slow ones to a second actor.",
+    )
+    parser.add_argument(
+        "--state-write-behind",
+        action="store_true",
+        help="Group-commit state saves in the background instead of once per step.",
+    )
+    parser.add_argument(
+        "--state-server",
+        default=None,
+        help="Use a shared state server (unix:/path or host:port, see src.state.service) instead of the local DB.",
+    )
+    parser.add_argument(
+        "--state-refs",
+        action="store_true",
+        help="Store per-step state in the delta-encoded state history and reference it from records.",
+    )
+    parser.add_argument(
+        "--prefetch-window",
+        type=int,
+        default=_PREFETCH_WINDOW,
+        help=f"Number of tasks whose state is loaded in one batch (default: {_PREFETCH_WINDOW}).",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=(0, 1),
+        metavar="I/N",
+        help="Only run tasks whose task_id hashes to shard I of N (default: 0/1, every task).",
+    )
+    parser.add_argument(
+        "--start-index",
+        type=int,
+        default=0,
+        help="Skip the first K tasks of this shard, e.g. to resume a stopped run (default: 0).",
+    )
+    parser.add_argument(
+        "--shuffle-seed",
+        type=int,
+        default=None,
+        help="Visit tasks in a shuffled order fixed by this seed (default: file order).",
+    )
+    parser.add_argument(
+        "--queue",
+        type=Path,
+        default=None,
+        help="Lease tasks from this shared work queue (see src.state.work_queue); tasks_path, if given, is enqueued first.",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Record a per-step span breakdown in each trajectory record's metrics.spans.",
+    )
+    parser.add_argument(
+        "--trace-out",
+        type=Path,
+        default=None,
+        help="Also write Chrome trace-event JSON to this file (implies --trace).",
     )
     args = parser.parse_args(argv)
 
-    client = VLLMClient(actor_name=args.actor_name) if args.actor_name else VLLMClient()
-    path = Path(args.tasks_path)
-    if not path.exists():
+    if args.hedge and args.actor_name:
+        parser.error("--hedge uses every configured actor; drop --actor-name")
+    # Even a single actor goes through MultiActorClient for its background
+    # health probe; without --actor-name requests fail over between actors.
+    client = MultiActorClient([args.actor_name] if args.actor_name else None, hedge=args.hedge)
+    path = Path(args.tasks_path) if args.tasks_path else None
+    if path is None and args.queue is None:
+        parser.error("tasks_path is required unless --queue is given")
+    if path is not None and not path.exists():
         raise SystemExit(f"Tasks file not found: {path}")
 
-    with path.open("r", encoding="utf-8") as fh:
-        for line in fh:
-            line = line.strip()
-            if not line:
-                continue
-            task = json.loads(line)
-            run_single_step(task, client=client)
+    def _run(task: Dict[str, Any]) -> None:
+        run_single_step(task, client=client, state_refs=args.state_refs)
+
+    # The state cache only sees this process's writes, so it is used only when
+    # no other process runs these tasks: not with a queue (steps of one task
+    # may be leased by different workers) or a state server. A shard owns all
+    # lines of its task_ids, so sharded runs keep the cache.
+    use_cache = args.queue is None and not args.state_server
+
+    def _prefetch(window: List[Dict[str, Any]]) -> None:
+        # One query warms the local state cache for the whole window.
+        if use_cache:
+            state_manager.load_many(str(task["task_id"]) for task in window)
+
+    if args.trace or args.trace_out:
+        tracing.enable(chrome_trace=args.trace_out)
+    if args.state_server:
+        state_manager.use_server(args.state_server)
+    elif args.state_write_behind:
+        state_manager.enable_write_behind()
+    if use_cache:
+        state_manager.configure_cache()
+    try:
+        if args.queue is not None:
+            queue = WorkQueue(args.queue)
+            if path is not None:
+                with TaskManifest(path) as manifest:
+                    queue.enqueue(manifest.iter_tasks())
+            queue.drain(_run, batch_size=args.prefetch_window, on_batch=_prefetch)
+        else:
+            for window in _iter_task_windows(
+                path,
+                args.prefetch_window,
+                shard=args.shard,
+                start=args.start_index,
+                seed=args.shuffle_seed,
+            ):
+                _prefetch(window)
+                for task in window:
+                    _run(task)
+    finally:
+        state_manager.disable_write_behind()
+        state_manager.configure_cache(max_entries=0)
+        state_manager.use_server(None)
+        tracing.disable()
+        client.close()
+        if args.hedge:
+            stats = client.hedge_stats()
+            print(
+                f"requests={stats['requests']} hedge_rate={stats['hedge_rate']:.3f} "
+                f"hedge_wins={stats['hedge_wins']} latency_saved={stats['latency_saved_sec']:.1f}s"
+            )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,243 @@
+"""Client-side backpressure for vLLM actors.
+
+Each actor endpoint gets one ``ActorLimits`` per process, shared by every
+``VLLMClient`` and thread that talks to it:
+
+- ``AdaptiveLimiter`` caps in-flight requests with AIMD. The limit grows by
+  about one per window of successful requests and is multiplied by
+  ``backoff`` when a request fails (connection error, timeout, 429 or 5xx)
+  or its latency exceeds ``tolerance`` times the best latency seen recently.
+  Latency is normalized per output token, so long completions are not taken
+  for congestion. Only requests started after the last decrease can
+  trigger another one, so a burst of failures from one overloaded window
+  shrinks the limit once.
+- ``TokenBucket`` caps requests/sec and tokens/sec. A request is charged its
+  prompt plus ``max_tokens`` up front; the unused part of the estimate is
+  refunded once the completion is known.
+
+The limiter keeps concurrency near the knee of the server's latency curve:
+past it, vLLM queues requests and latency rises, which shrinks the limit.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Sequence
+
+
+# Per-token latency of tiny completions is dominated by prefill; count every
+# response as at least this many tokens when normalizing.
+_MIN_LATENCY_TOKENS = 16
+
+
+def approx_tokens(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+
+class TokenBucket:
+    """Blocking token bucket; ``rate`` tokens/sec, holding at most ``burst``."""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = float(burst) if burst is not None else float(rate)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._stamp = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def acquire(self, cost: float = 1.0) -> float:
+        """Take ``cost`` tokens, sleeping until they are available; return the wait.
+
+        The tokens are reserved immediately, so concurrent callers queue in
+        arrival order. A cost above ``burst`` waits for a full bucket and
+        leaves it in debt, so oversized requests are slowed rather than
+        refused.
+        """
+        with self._lock:
+            self._refill()
+            wait = max(0.0, (min(cost, self.burst) - self._tokens) / self.rate)
+            self._tokens -= cost
+        if wait:
+            self._sleep(wait)
+        return wait
+
+    def refund(self, amount: float) -> None:
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.burst, self._tokens + amount)
+
+
+class AdaptiveLimiter:
+    """AIMD limit on concurrent requests; see the module docstring."""
+
+    def __init__(
+        self,
+        initial: float = 4,
+        *,
+        min_limit: float = 1,
+        max_limit: float = 64,
+        backoff: float = 0.7,
+        tolerance: float = 2.0,
+        baseline_drift: float = 0.01,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, float(initial)))
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self._drift = baseline_drift
+        self.clock = clock
+        self.in_flight = 0
+        self.baseline: Optional[float] = None
+        self.successes = 0
+        self.failures = 0
+        self.decreases = 0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    def acquire(self) -> float:
+        """Block until a slot is free; return the start time to pass to ``release``."""
+        with self._cond:
+            while self.in_flight >= max(1, int(self.limit)):
+                self._cond.wait()
+            self.in_flight += 1
+            return self.clock()
+
+    def release(self, started: float, *, ok: bool, latency: Optional[float] = None) -> None:
+        """Record the outcome of a request admitted at ``started``.
+
+        ``latency`` is any per-request measure where larger means more
+        congested (the client passes seconds per output token).
+        """
+        with self._cond:
+            self.in_flight -= 1
+            congested = not ok
+            if ok:
+                self.successes += 1
+                if latency is not None:
+                    # The baseline tracks the best recent latency but drifts
+                    # up slowly, so it recovers if the server gets slower.
+                    if self.baseline is None:
+                        self.baseline = latency
+                    else:
+                        self.baseline = min(self.baseline * (1 + self._drift), latency)
+                        congested = latency > self.tolerance * self.baseline
+            else:
+                self.failures += 1
+            if congested:
+                if started > self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = self.clock()
+                    self.decreases += 1
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "baseline": self.baseline or 0.0,
+                "successes": self.successes,
+                "failures": self.failures,
+                "decreases": self.decreases,
+            }
+
+
+@dataclass
+class Admission:
+    started: float
+    charged_tokens: int
+
+
+class ActorLimits:
+    """Concurrency limiter plus optional request and token buckets for one actor."""
+
+    def __init__(
+        self,
+        limiter: AdaptiveLimiter,
+        *,
+        requests: Optional[TokenBucket] = None,
+        tokens: Optional[TokenBucket] = None,
+    ):
+        self.limiter = limiter
+        self.requests = requests
+        self.tokens = tokens
+        self.throttled_sec = 0.0
+        self._lock = threading.Lock()
+
+    def admit(self, prompt: str, max_new_tokens: int) -> Admission:
+        waited = 0.0
+        charged = approx_tokens(prompt) + max_new_tokens
+        if self.requests is not None:
+            waited += self.requests.acquire(1)
+        if self.tokens is not None:
+            waited += self.tokens.acquire(charged)
+        if waited:
+            with self._lock:
+                self.throttled_sec += waited
+        return Admission(self.limiter.acquire(), charged)
+
+    def done(self, admission: Admission, *, ok: bool, prompt: str = "", completions: Sequence[str] = ()) -> None:
+        latency = None
+        if ok and completions:
+            out_tokens = sum(approx_tokens(text) for text in completions)
+            latency = (self.limiter.clock() - admission.started) / max(_MIN_LATENCY_TOKENS, out_tokens)
+            if self.tokens is not None:
+                used = approx_tokens(prompt) + out_tokens
+                self.tokens.refund(max(0, admission.charged_tokens - used))
+        self.limiter.release(admission.started, ok=ok, latency=latency)
+
+    def snapshot(self) -> Dict[str, float]:
+        stats = self.limiter.snapshot()
+        stats["throttled_sec"] = self.throttled_sec
+        return stats
+
+
+_registry: Dict[str, ActorLimits] = {}
+_registry_lock = threading.Lock()
+
+
+def limits_for(key: str, factory: Callable[[], ActorLimits]) -> ActorLimits:
+    """Return the process-wide ``ActorLimits`` for ``key``, creating it once."""
+    with _registry_lock:
+        limits = _registry.get(key)
+        if limits is None:
+            limits = _registry[key] = factory()
+        return limits
+
+
+def reset_limits() -> None:
+    """Forget all per-actor limits (they are recreated from config on next use)."""
+    with _registry_lock:
+        _registry.clear()
+
+
+__all__ = [
+    "ActorLimits",
+    "AdaptiveLimiter",
+    "Admission",
+    "TokenBucket",
+    "approx_tokens",
+    "limits_for",
+    "reset_limits",
+]
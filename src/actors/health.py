@@ -0,0 +1,191 @@
+"""Per-actor circuit breakers and a background health monitor.
+
+``CircuitBreaker`` follows the usual three states:
+
+- ``closed``: requests flow; ``failure_threshold`` consecutive failed
+  requests, or ``probe_threshold`` consecutive failed health probes, open
+  the breaker (one slow probe under load does not).
+- ``open``: requests are refused immediately, so a dead actor costs nothing
+  instead of a full request timeout. After ``reset_timeout_sec`` (or as soon
+  as a health probe succeeds) the breaker becomes half-open.
+- ``half_open``: a single trial request is let through; its success closes
+  the breaker, its failure opens it again.
+
+``HealthMonitor`` probes every actor's ``/health`` on a daemon thread with a
+short timeout and feeds the results to the breakers, so an actor that dies
+between requests is skipped before anyone waits on it.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        reset_timeout_sec: float = 10.0,
+        *,
+        probe_threshold: int = 2,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout_sec = reset_timeout_sec
+        self.probe_threshold = max(1, probe_threshold)
+        self._clock = clock
+        self._state = CLOSED
+        self._failures = 0
+        self._probe_failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self.trips = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _current(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout_sec:
+            self._state = HALF_OPEN
+            self._trial = False
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current()
+
+    def available(self) -> bool:
+        """Whether a request would currently be let through (does not claim the trial)."""
+        with self._lock:
+            state = self._current()
+            return state == CLOSED or (state == HALF_OPEN and not self._trial)
+
+    def allow(self) -> bool:
+        """Claim permission for one request; False means fail fast."""
+        with self._lock:
+            state = self._current()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            self.rejected += 1
+            return False
+
+    def _open(self) -> None:
+        if self._state != OPEN:
+            self.trips += 1
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._trial = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._current() == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._open()
+
+    def record_probe(self, healthy: bool) -> None:
+        """Apply a health probe result.
+
+        ``probe_threshold`` consecutive failures open the breaker; a success
+        ends the open period early.
+        """
+        with self._lock:
+            if not healthy:
+                self._probe_failures += 1
+                if self._probe_failures >= self.probe_threshold:
+                    self._open()
+                return
+            self._probe_failures = 0
+            if self._current() == OPEN:
+                self._state = HALF_OPEN
+                self._trial = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current(),
+                "consecutive_failures": self._failures,
+                "consecutive_probe_failures": self._probe_failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+class HealthMonitor:
+    """Probe ``clients`` every ``interval_sec`` on a daemon thread.
+
+    Each client needs ``health() -> bool`` and a ``breaker`` attribute.
+    """
+
+    def __init__(self, clients: Sequence[Any], *, interval_sec: float = 5.0):
+        self._clients = list(clients)
+        self.interval_sec = interval_sec
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def probe_once(self) -> Dict[str, bool]:
+        results = {}
+        for client in self._clients:
+            healthy = bool(client.health())
+            client.breaker.record_probe(healthy)
+            results[client.base_url] = healthy
+        return results
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_sec):
+            self.probe_once()
+
+    def start(self) -> "HealthMonitor":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="vllm-health", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_sec + 1)
+            self._thread = None
+
+
+_registry: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def breaker_for(key: str, factory: Callable[[], CircuitBreaker]) -> CircuitBreaker:
+    """Return the process-wide breaker for ``key``, creating it once."""
+    with _registry_lock:
+        breaker = _registry.get(key)
+        if breaker is None:
+            breaker = _registry[key] = factory()
+        return breaker
+
+
+def reset_breakers() -> None:
+    with _registry_lock:
+        _registry.clear()
+
+
+__all__ = [
+    "CLOSED",
+    "CircuitBreaker",
+    "HALF_OPEN",
+    "HealthMonitor",
+    "OPEN",
+    "breaker_for",
+    "reset_breakers",
+]
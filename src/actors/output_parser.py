@@ -0,0 +1,187 @@
+"""Incremental parser for ``<think>``/``<action>``/``<state_update>`` model output.
+
+``TagParser`` is a small state machine that scans each character of the
+output once. Text can be fed in arbitrary chunks (for example as tokens
+stream in) and every block is reported as soon as its closing tag arrives,
+together with the character span of its content in the full output.
+
+The parser also checks the block layout: blocks are expected in the order
+think, action, state_update, each at most once. Deviations are collected in
+``errors`` (``out_of_order_<tag>``, ``duplicate_<tag>``, ``unclosed_<tag>``);
+as before, the first complete block of each tag wins. A block that is never
+closed swallows the rest of the output while streaming, so ``finish()``
+rescans its content for the blocks that follow (``<think>plan <action>..``
+still yields the action), as the old per-tag search did.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from src.data import codec
+
+
+TAGS = ("think", "action", "state_update")
+_RANK = {tag: i for i, tag in enumerate(TAGS)}
+_OPEN = tuple(f"<{tag}>" for tag in TAGS)
+_OPEN_RE = re.compile("<(" + "|".join(TAGS) + ")>")
+_LONGEST_OPEN = max(len(t) for t in _OPEN)
+
+
+@dataclass(slots=True)
+class TagBlock:
+    """One closed block; ``start``/``end`` delimit its raw content in the output."""
+
+    tag: str
+    text: str
+    start: int
+    end: int
+
+
+class TagParser:
+    """Single-pass, chunk-at-a-time tag extractor."""
+
+    def __init__(self) -> None:
+        # Only the text that may still matter is buffered: the content of an
+        # open block, or a possible tag prefix split across chunks. Offsets
+        # into the full output are ``_base`` plus a buffer index.
+        self._buf = ""
+        self._base = 0
+        self._pos = 0  # next unscanned buffer index
+        self._open: Optional[str] = None  # tag whose close we are looking for
+        self._content_start = 0
+        self._max_rank = -1
+        self.blocks: Dict[str, TagBlock] = {}
+        self.errors: List[str] = []
+
+    def feed(self, chunk: str) -> List[TagBlock]:
+        """Consume ``chunk`` and return the blocks it closed, in order."""
+        buf = self._buf + chunk
+        self._buf = buf
+        closed: List[TagBlock] = []
+        while True:
+            if self._open is None:
+                match = _OPEN_RE.search(buf, self._pos)
+                if match is None:
+                    # Hold back a trailing "<..." that may be a tag split
+                    # across chunks; everything before it is skipped for good.
+                    lt = buf.find("<", max(self._pos, len(buf) - _LONGEST_OPEN + 1))
+                    while lt != -1 and not any(t.startswith(buf[lt:]) for t in _OPEN):
+                        lt = buf.find("<", lt + 1)
+                    self._pos = lt if lt != -1 else len(buf)
+                    break
+                self._pos = match.end()
+                self._opened(match.group(1))
+            else:
+                close_tag = f"</{self._open}>"
+                end = buf.find(close_tag, self._pos)
+                if end == -1:
+                    # Rescan only the suffix that could still begin the close tag.
+                    self._pos = max(self._pos, len(buf) - len(close_tag) + 1)
+                    break
+                block = self._closed(end)
+                self._pos = end + len(close_tag)
+                if block is not None:
+                    closed.append(block)
+
+        keep = self._content_start if self._open is not None else self._pos
+        if keep:
+            self._buf = buf[keep:]
+            self._base += keep
+            self._pos -= keep
+            self._content_start -= keep
+        return closed
+
+    def _opened(self, tag: str) -> None:
+        rank = _RANK[tag]
+        if rank < self._max_rank:
+            self.errors.append(f"out_of_order_{tag}")
+        elif tag in self.blocks:
+            self.errors.append(f"duplicate_{tag}")
+        self._max_rank = max(self._max_rank, rank)
+        self._open = tag
+        self._content_start = self._pos
+
+    def _closed(self, end: int) -> Optional[TagBlock]:
+        tag = self._open
+        assert tag is not None
+        self._open = None
+        if tag in self.blocks:
+            return None
+        block = TagBlock(
+            tag=tag,
+            text=self._buf[self._content_start : end].strip(),
+            start=self._base + self._content_start,
+            end=self._base + end,
+        )
+        self.blocks[tag] = block
+        return block
+
+    def finish(self) -> List[str]:
+        """Mark the end of output and return the layout errors.
+
+        Blocks recovered from inside an unclosed block are added to
+        ``blocks`` here rather than returned by ``feed``.
+        """
+        while self._open is not None:
+            self.errors.append(f"unclosed_{self._open}")
+            # The buffer still holds everything after the unclosed open tag.
+            self._open = None
+            self._pos = self._content_start
+            self.feed("")
+        return self.errors
+
+
+def _json_object(raw: Optional[str]) -> Any:
+    if not raw:
+        return None
+    candidate = codec.loads(raw)
+    return candidate if isinstance(candidate, dict) else None
+
+
+def parse_model_output(raw: str) -> Dict[str, Any]:
+    """Extract the three blocks from ``raw`` and decode the JSON ones.
+
+    ``parse_error`` names the first block whose JSON failed to decode;
+    ``spans`` maps each found tag to its ``[start, end)`` content span and
+    ``tag_errors`` lists layout problems reported by ``TagParser``.
+    """
+    parser = TagParser()
+    parser.feed(raw)
+    tag_errors = parser.finish()
+    blocks = parser.blocks
+
+    def _text(tag: str) -> Optional[str]:
+        block = blocks.get(tag)
+        return block.text if block is not None else None
+
+    action_obj: Optional[Dict[str, Any]] = None
+    state_update_obj: Optional[Dict[str, Any]] = None
+    parse_error: Optional[str] = None
+    try:
+        action_obj = _json_object(_text("action"))
+    except ValueError:
+        parse_error = "invalid_action_json"
+    try:
+        state_update_obj = _json_object(_text("state_update"))
+    except ValueError:
+        parse_error = parse_error or "invalid_state_update_json"
+
+    return {
+        "raw": raw,
+        "think": _text("think"),
+        "action": action_obj,
+        "state_update": state_update_obj,
+        "parse_error": parse_error,
+        "spans": {tag: [block.start, block.end] for tag, block in blocks.items()},
+        "tag_errors": tag_errors,
+    }
+
+
+__all__ = [
+    "TAGS",
+    "TagBlock",
+    "TagParser",
+    "parse_model_output",
+]
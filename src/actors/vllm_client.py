@@ -1,9 +1,13 @@
 from __future__ import annotations
 
+import itertools
 import json
-from dataclasses import dataclass
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence
 
 import requests
 
@@ -12,7 +16,10 @@ try:
 except Exception:  # pragma: no cover - optional dependency
     yaml = None  # type: ignore
 
+from src.actors.flow_control import ActorLimits, AdaptiveLimiter, TokenBucket, limits_for
+from src.actors.health import CircuitBreaker, HealthMonitor, breaker_for
 from src.data.schemas import repo_root
+from src.data.sketches import QuantileSketch
 
 
 @dataclass
@@ -22,6 +29,11 @@ class ActorConfig:
     model: str
     tensor_parallel_size: int = 1
     gpu_id: int = 0
+    # Client-side flow control (see src.actors.flow_control); the rate caps
+    # are off unless set.
+    max_concurrency: int = 64
+    requests_per_sec: Optional[float] = None
+    tokens_per_sec: Optional[float] = None
 
 
 @dataclass
@@ -29,6 +41,15 @@ class VLLMConfig:
     actors: List[ActorConfig]
     timeout_sec: int = 60
     max_tokens: int = 512
+    initial_concurrency: int = 4
+    latency_tolerance: float = 2.0
+    hedge_quantile: float = 0.95
+    hedge_budget: float = 0.05
+    health_timeout_sec: float = 2.0
+    health_interval_sec: float = 5.0
+    breaker_failures: int = 3
+    breaker_probe_failures: int = 2
+    breaker_reset_sec: float = 10.0
 
 
 def _config_path() -> Path:
@@ -64,6 +85,9 @@ def _load_config() -> VLLMConfig:
                 model=str(raw.get("model")),
                 tensor_parallel_size=int(raw.get("tensor_parallel_size", 1)),
                 gpu_id=int(raw.get("gpu_id", 0)),
+                max_concurrency=int(raw.get("max_concurrency", 64)),
+                requests_per_sec=_optional_float(raw.get("requests_per_sec")),
+                tokens_per_sec=_optional_float(raw.get("tokens_per_sec")),
             )
         )
     if not actors:
@@ -74,7 +98,68 @@ def _load_config() -> VLLMConfig:
                 model="qwen2-14b-instruct",
             )
         )
-    return VLLMConfig(actors=actors, timeout_sec=timeout_sec, max_tokens=max_tokens)
+    return VLLMConfig(
+        actors=actors,
+        timeout_sec=timeout_sec,
+        max_tokens=max_tokens,
+        initial_concurrency=int(data.get("initial_concurrency", 4)),
+        latency_tolerance=float(data.get("latency_tolerance", 2.0)),
+        hedge_quantile=float(data.get("hedge_quantile", 0.95)),
+        hedge_budget=float(data.get("hedge_budget", 0.05)),
+        health_timeout_sec=float(data.get("health_timeout_sec", 2.0)),
+        health_interval_sec=float(data.get("health_interval_sec", 5.0)),
+        breaker_failures=int(data.get("breaker_failures", 3)),
+        breaker_probe_failures=int(data.get("breaker_probe_failures", 2)),
+        breaker_reset_sec=float(data.get("breaker_reset_sec", 10.0)),
+    )
+
+
+def _optional_float(value: Any) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+def _build_limits(actor: ActorConfig, cfg: VLLMConfig) -> ActorLimits:
+    return ActorLimits(
+        AdaptiveLimiter(
+            cfg.initial_concurrency,
+            max_limit=actor.max_concurrency,
+            tolerance=cfg.latency_tolerance,
+        ),
+        requests=TokenBucket(actor.requests_per_sec) if actor.requests_per_sec else None,
+        tokens=TokenBucket(actor.tokens_per_sec) if actor.tokens_per_sec else None,
+    )
+
+
+class ActorUnavailable(RuntimeError):
+    """Raised without contacting an actor whose circuit breaker is open."""
+
+
+def _response_texts(data: Any) -> List[str]:
+    # Be tolerant of different response shapes.
+    if isinstance(data, dict):
+        if "text" in data:
+            text = data["text"]
+            if isinstance(text, list):
+                return [str(t) for t in text]
+            return [str(text)]
+        if "choices" in data:
+            choices = data["choices"]
+            texts: List[str] = []
+            if isinstance(choices, list):
+                for choice in choices:
+                    if not isinstance(choice, dict):
+                        continue
+                    if "text" in choice:
+                        texts.append(str(choice["text"]))
+                        continue
+                    message = choice.get("message")
+                    # Chat-style response shape.
+                    if isinstance(message, dict) and "content" in message:
+                        texts.append(str(message["content"]))
+            if texts:
+                return texts
+
+    raise RuntimeError("Unexpected vLLM response format")
 
 
 class VLLMClient:
@@ -95,6 +180,14 @@ class VLLMClient:
             actor = matches[0]
         self._cfg = cfg
         self._actor = actor
+        # Shared by every client of this endpoint in the process.
+        self._limits = limits_for(actor.base_url, lambda: _build_limits(actor, cfg))
+        self.breaker = breaker_for(
+            actor.base_url,
+            lambda: CircuitBreaker(
+                cfg.breaker_failures, cfg.breaker_reset_sec, probe_threshold=cfg.breaker_probe_failures
+            ),
+        )
 
     @property
     def base_url(self) -> str:
@@ -104,11 +197,23 @@ class VLLMClient:
     def model(self) -> str:
         return self._actor.model
 
+    def limits(self) -> Dict[str, float]:
+        """Current concurrency limit, in-flight count and throttling totals for this actor."""
+        return self._limits.snapshot()
+
+    def load(self) -> float:
+        """In-flight requests as a fraction of the actor's current limit."""
+        limiter = self._limits.limiter
+        return limiter.in_flight / max(1.0, limiter.limit)
+
     def health(self) -> bool:
-        """Return True if the actor responds successfully to a health check."""
+        """Return True if the actor responds successfully to a health check.
+
+        Probes use the short ``health_timeout_sec``, not the generation timeout.
+        """
         url = f"{self.base_url}/health"
         try:
-            resp = requests.get(url, timeout=self._cfg.timeout_sec)
+            resp = requests.get(url, timeout=self._cfg.health_timeout_sec)
         except Exception:
             return False
         if resp.status_code != 200:
@@ -120,18 +225,16 @@ class VLLMClient:
         status = payload.get("status")
         return status in (None, "ok", "healthy")
 
-    def generate(
+    def _post_generate(
         self,
         prompt: str,
-        stop: Optional[List[str]] = None,
-        temperature: float = 0.1,
-        seed: Optional[int] = None,
-        max_tokens: Optional[int] = None,
-    ) -> str:
-        """Call the vLLM server and return the generated text.
-
-        This uses the /generate endpoint with a simple text prompt.
-        """
+        *,
+        stop: Optional[List[str]],
+        temperature: float,
+        seed: Optional[int],
+        max_tokens: Optional[int],
+        n: int = 1,
+    ) -> List[str]:
         url = f"{self.base_url}/generate"
         payload: Dict[str, Any] = {
             "prompt": prompt,
@@ -143,35 +246,291 @@ class VLLMClient:
             payload["stop"] = stop
         if seed is not None:
             payload["seed"] = int(seed)
+        if n != 1:
+            payload["n"] = int(n)
+
+        if not self.breaker.allow():
+            raise ActorUnavailable(f"{self._actor.name} ({self.base_url}) circuit is {self.breaker.state}")
+        admission = self._limits.admit(prompt, payload["max_tokens"] * max(1, n))
+        texts: List[str] = []
+        ok = False
+        try:
+            resp = requests.post(url, json=payload, timeout=self._cfg.timeout_sec)
+            # Connection errors, timeouts, 429 and 5xx mean the server is
+            # overloaded (or gone) and shrink the limit; other errors do not.
+            ok = not (resp.status_code == 429 or resp.status_code >= 500)
+            resp.raise_for_status()
+            texts = _response_texts(resp.json())
+        finally:
+            self._limits.done(admission, ok=ok, prompt=prompt, completions=texts)
+            (self.breaker.record_success if ok else self.breaker.record_failure)()
+        return texts
+
+    def generate(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        temperature: float = 0.1,
+        seed: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """Call the vLLM server and return the generated text.
+
+        This uses the /generate endpoint with a simple text prompt.
+        """
+        texts = self._post_generate(prompt, stop=stop, temperature=temperature, seed=seed, max_tokens=max_tokens)
+        return texts[0]
+
+    def generate_many(
+        self,
+        prompt: str,
+        n: int,
+        stop: Optional[List[str]] = None,
+        temperature: float = 0.1,
+        seed: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+    ) -> List[str]:
+        """Return ``n`` sampled completions of one prompt.
+
+        All samples are requested in a single ``/generate`` call (``"n"`` in
+        the body) so the server shares the prompt prefill; if it returns
+        fewer, the rest are requested one by one.
+        """
+        texts = self._post_generate(
+            prompt, stop=stop, temperature=temperature, seed=seed, max_tokens=max_tokens, n=n
+        )[:n]
+        while len(texts) < n:
+            texts.append(
+                self.generate(
+                    prompt,
+                    stop=stop,
+                    temperature=temperature,
+                    seed=None if seed is None else seed + len(texts),
+                    max_tokens=max_tokens,
+                )
+            )
+        return texts
+
+
+@dataclass
+class HedgeStats:
+    requests: int = 0
+    hedged: int = 0
+    hedge_wins: int = 0
+    latency_saved_sec: float = 0.0
+
+    @property
+    def hedge_rate(self) -> float:
+        return self.hedged / self.requests if self.requests else 0.0
+
+    def to_dict(self) -> Dict[str, float]:
+        return {**asdict(self), "hedge_rate": self.hedge_rate}
+
+
+class MultiActorClient:
+    """Send each request to the least loaded of several actors, optionally hedged.
+
+    Load is each actor's in-flight requests relative to its adaptive limit
+    (``VLLMClient.load``); ties rotate. With ``hedge=True``, a request still
+    running after the ``hedge_quantile`` of recent request latencies is
+    duplicated on the next actor, and whichever answers first wins. At most
+    ``hedge_budget`` of all requests are hedged, and nothing is hedged until
+    ``min_samples`` latencies have been seen.
+
+    The loser is cancelled if it has not started; an HTTP call already in
+    flight cannot be interrupted, so its result is discarded when it lands.
+    ``hedge_stats()`` reports the hedge rate, how often the hedge won, and
+    the latency saved (loser's finish minus winner's, when the hedge won).
+    Hedges reuse the same seed and sampling parameters.
+
+    Actors whose circuit breaker is open are skipped, and a request that
+    fails with a transport error or ``ActorUnavailable`` moves on to the next
+    actor. A ``HealthMonitor`` probes all actors every
+    ``health_interval_sec`` (``0`` disables it; ``close()`` stops it).
+
+    ``model`` is the model of the actor that answered the calling thread's
+    last request (before any request: the first actor's model).
+    """
+
+    def __init__(
+        self,
+        actor_names: Optional[Sequence[str]] = None,
+        *,
+        hedge: bool = False,
+        hedge_quantile: Optional[float] = None,
+        hedge_budget: Optional[float] = None,
+        min_samples: int = 20,
+        max_workers: int = 64,
+        health_interval_sec: Optional[float] = None,
+    ):
+        cfg = _load_config()
+        names = list(actor_names) if actor_names else [a.name for a in cfg.actors]
+        self._clients = [VLLMClient(actor_name=name) for name in names]
+        self.hedge = hedge
+        self.hedge_quantile = cfg.hedge_quantile if hedge_quantile is None else hedge_quantile
+        self.hedge_budget = cfg.hedge_budget if hedge_budget is None else hedge_budget
+        self.min_samples = min_samples
+        self._latency = QuantileSketch()
+        self._stats = HedgeStats()
+        self._lock = threading.Lock()
+        self._rotation = itertools.count()
+        self._served = threading.local()
+        self._pool = (
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vllm-hedge") if hedge else None
+        )
+        interval = cfg.health_interval_sec if health_interval_sec is None else health_interval_sec
+        self._monitor = HealthMonitor(self._clients, interval_sec=interval).start() if interval > 0 else None
+
+    @property
+    def clients(self) -> List[VLLMClient]:
+        return list(self._clients)
+
+    @property
+    def model(self) -> str:
+        return getattr(self._served, "model", None) or self._clients[0].model
+
+    def _ranked(self) -> List[VLLMClient]:
+        start = next(self._rotation) % len(self._clients)
+        rotated = self._clients[start:] + self._clients[:start]
+        available = [client for client in rotated if client.breaker.available()]
+        return sorted(available, key=lambda client: client.load())
+
+    def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Run ``method`` on the best actor, failing over to the next on transport errors."""
+        ranked = self._ranked()
+        if not ranked:
+            raise ActorUnavailable("every actor's circuit breaker is open")
+        while True:
+            try:
+                return self._attempt(ranked, method, *args, **kwargs)
+            except (requests.RequestException, ActorUnavailable):
+                ranked = [client for client in ranked[1:] if client.breaker.available()]
+                if not ranked:
+                    raise
+
+    def _observe(self, seconds: float) -> None:
+        with self._lock:
+            self._latency.add(seconds)
+
+    def _hedge_delay(self) -> Optional[float]:
+        with self._lock:
+            self._stats.requests += 1
+            if self._latency.count < self.min_samples:
+                return None
+            return self._latency.quantile(self.hedge_quantile)
+
+    def _take_hedge(self) -> bool:
+        with self._lock:
+            if self._stats.hedged + 1 > self.hedge_budget * self._stats.requests:
+                return False
+            self._stats.hedged += 1
+            return True
+
+    def _attempt(self, ranked: List[VLLMClient], method: str, *args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        if self._pool is None or len(ranked) < 2:
+            result = getattr(ranked[0], method)(*args, **kwargs)
+            self._observe(time.perf_counter() - start)
+            self._served.model = ranked[0].model
+            return result
+
+        delay = self._hedge_delay()
+        primary = self._pool.submit(getattr(ranked[0], method), *args, **kwargs)
+
+        def _primary_done(future: Future) -> None:
+            # Latencies come from primaries only, hedged or not, so the
+            # threshold tracks what an unhedged request would take.
+            if not future.cancelled() and future.exception() is None:
+                self._observe(time.perf_counter() - start)
+
+        primary.add_done_callback(_primary_done)
+        hedged = False
+        if delay is not None:
+            done, _ = wait([primary], timeout=delay)
+            hedged = not done and self._take_hedge()
+        if not hedged:
+            result = primary.result()
+            self._served.model = ranked[0].model
+            return result
+
+        hedge = self._pool.submit(getattr(ranked[1], method), *args, **kwargs)
+        pending = {primary, hedge}
+        errors: List[BaseException] = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winners = [f for f in done if f.exception() is None]
+            if winners:
+                break
+            errors.extend(f.exception() for f in done)  # type: ignore[misc]
+        else:
+            raise errors[0]
+
+        winner = primary if primary in winners else winners[0]
+        won_at = time.perf_counter()
+        if winner is hedge:
+            with self._lock:
+                self._stats.hedge_wins += 1
+
+            def _saved(future: Future) -> None:
+                if not future.cancelled() and future.exception() is None:
+                    with self._lock:
+                        self._stats.latency_saved_sec += time.perf_counter() - won_at
+
+            primary.add_done_callback(_saved)
+        for loser in pending:
+            loser.cancel()
+        self._served.model = (ranked[1] if winner is hedge else ranked[0]).model
+        return winner.result()
+
+    def hedge_stats(self) -> Dict[str, float]:
+        with self._lock:
+            return self._stats.to_dict()
+
+    def health(self) -> bool:
+        """Return True if any actor is healthy."""
+        return any(client.health() for client in self._clients)
+
+    def breakers(self) -> Dict[str, Dict[str, Any]]:
+        """Circuit breaker state per actor base URL."""
+        return {client.base_url: client.breaker.snapshot() for client in self._clients}
+
+    def generate(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        temperature: float = 0.1,
+        seed: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        return self._call(
+            "generate", prompt, stop=stop, temperature=temperature, seed=seed, max_tokens=max_tokens
+        )
+
+    def generate_many(
+        self,
+        prompt: str,
+        n: int,
+        stop: Optional[List[str]] = None,
+        temperature: float = 0.1,
+        seed: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+    ) -> List[str]:
+        return self._call(
+            "generate_many", prompt, n, stop=stop, temperature=temperature, seed=seed, max_tokens=max_tokens
+        )
 
-        resp = requests.post(url, json=payload, timeout=self._cfg.timeout_sec)
-        resp.raise_for_status()
-        data = resp.json()
-
-        # Be tolerant of different response shapes.
-        if isinstance(data, dict):
-            if "text" in data:
-                text = data["text"]
-                if isinstance(text, list):
-                    return str(text[0])
-                return str(text)
-            if "choices" in data:
-                choices = data["choices"]
-                if isinstance(choices, list) and choices:
-                    first = choices[0]
-                    if isinstance(first, dict):
-                        if "text" in first:
-                            return str(first["text"])
-                        message = first.get("message")
-                            # Chat-style response shape.
-                        if isinstance(message, dict) and "content" in message:
-                            return str(message["content"])
-
-        raise RuntimeError("Unexpected vLLM response format")
+    def close(self) -> None:
+        if self._monitor is not None:
+            self._monitor.stop()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
 
 
 __all__ = [
     "ActorConfig",
+    "ActorUnavailable",
+    "HedgeStats",
+    "MultiActorClient",
     "VLLMConfig",
     "VLLMClient",
 ]
@@ -0,0 +1,134 @@
+"""JSON codec used on the per-record hot paths (trajectories, logs, state).
+
+``dumps``/``dumpb``/``loads`` use ``orjson`` when it is installed and fall
+back to the stdlib ``json`` module otherwise. Output and accepted inputs
+match the stdlib path: UTF-8 text without ASCII escaping, ``","``/``":"``
+separators and keys in insertion order. Where orjson would differ the
+stdlib handles the call instead:
+
+- floats the stdlib spells with an exponent (``1e-05``, ``1e+16``) or as
+  ``NaN``/``Infinity`` (orjson writes ``1e-5``, ``0.00001``, ``null``);
+- objects the stdlib does not encode (dataclasses, datetimes) or encodes
+  differently (``str``/``int`` subclasses such as ``IntEnum``), plus non-string
+  keys and integers beyond 64 bits, which orjson rejects;
+- documents orjson rejects (``NaN`` literals) or that hold integers of 19+
+  digits, which orjson decodes as floats once they leave the 64-bit range.
+
+``uuid.UUID`` and plain ``enum.Enum`` values are still encoded by orjson
+where the stdlib raises ``TypeError``.
+
+Set ``AST_EDIT_JSON_BACKEND=stdlib`` to force the fallback.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+from typing import Any, Optional, Union
+
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore
+
+if os.environ.get("AST_EDIT_JSON_BACKEND", "").lower() == "stdlib":
+    orjson = None  # type: ignore
+
+
+_SEPARATORS = (",", ":")
+
+
+def backend_name() -> str:
+    return "orjson" if orjson is not None else "json"
+
+
+def _std_dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=_SEPARATORS)
+
+
+if orjson is not None:
+    _OPTIONS = (
+        orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_SUBCLASS
+    )
+
+# Cheap pre-checks on orjson's output and input. Every float that orjson
+# spells differently shows up as an exponent, a "0.0000" prefix or "null"
+# (as does any None, which is why a hit is confirmed by walking the object);
+# integer literals of 19+ digits may not fit in 64 bits.
+_EXPONENT = re.compile(rb"e[-0-9]")
+_LONG_INT = re.compile(rb"[0-9]{19}")
+_LONG_INT_STR = re.compile(r"[0-9]{19}")
+
+
+def _unsupported(obj: Any) -> Any:
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _has_stdlib_only_float(obj: Any) -> bool:
+    """True if ``obj`` holds a float the stdlib spells with an exponent or as NaN/Infinity."""
+    kind = type(obj)
+    if kind is float:
+        text = float.__repr__(obj)
+        return "e" in text or "n" in text
+    if kind is dict:
+        obj = obj.values()
+    elif kind is not list and kind is not tuple:
+        return False
+    for item in obj:
+        kind = type(item)
+        if kind is str or kind is int or kind is bool or item is None:
+            continue
+        if _has_stdlib_only_float(item):
+            return True
+    return False
+
+
+def _orjson_dumpb(obj: Any) -> Optional[bytes]:
+    try:
+        data = orjson.dumps(obj, default=_unsupported, option=_OPTIONS)
+    except TypeError:
+        return None
+    suspect = b"null" in data or b"0.0000" in data or _EXPONENT.search(data) is not None
+    if suspect and _has_stdlib_only_float(obj):
+        return None
+    return data
+
+
+def dumps(obj: Any) -> str:
+    """Serialize ``obj`` to a compact JSON string."""
+    if orjson is not None:
+        data = _orjson_dumpb(obj)
+        if data is not None:
+            return data.decode("utf-8")
+    return _std_dumps(obj)
+
+
+def dumpb(obj: Any) -> bytes:
+    """Serialize ``obj`` to compact UTF-8 JSON bytes (no trailing newline)."""
+    if orjson is not None:
+        data = _orjson_dumpb(obj)
+        if data is not None:
+            return data
+    return _std_dumps(obj).encode("utf-8")
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """Deserialize a JSON document; raises ``json.JSONDecodeError`` on bad input."""
+    if orjson is not None and not (_LONG_INT_STR if isinstance(data, str) else _LONG_INT).search(data):
+        try:
+            return orjson.loads(data)
+        except ValueError:
+            # Retry with the stdlib so lenient inputs (NaN/Infinity) still
+            # decode and malformed ones raise the usual stdlib error.
+            pass
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+__all__ = [
+    "backend_name",
+    "dumpb",
+    "dumps",
+    "loads",
+]
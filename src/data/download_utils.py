@@ -2,15 +2,19 @@
 from __future__ import annotations
 
 import hashlib
+import http.client
 import ipaddress
 import json
 import os
+import re
 import shutil
 import tarfile
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, TypeVar
 from urllib import error, parse, request
 from uuid import uuid4
 
@@ -28,9 +32,20 @@ class DownloadError(RuntimeError):
     """Raised when a dataset could not be downloaded."""
 
 
+class _RemoteChanged(DownloadError):
+    """The resource no longer matches the validator a partial download was started with."""
+
+
+T = TypeVar("T")
+
 CHUNK_SIZE = 1024 * 1024
 SAFE_URL_SCHEMES = {"http", "https"}
 MAX_ARCHIVE_BYTES = 50 * 1024 * 1024 * 1024  # 50GB safety ceiling
+USER_AGENT = "ast-edit-downloader/0.1"
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+MAX_BACKOFF_SEC = 60.0
+# Below this size a single stream is as fast as parallel ranges.
+MIN_PARALLEL_BYTES = 64 * CHUNK_SIZE
 
 
 def ensure_dir(path: Path) -> Path:
@@ -157,30 +172,255 @@ def _validate_url(url: str) -> parse.ParseResult:
     return parsed
 
 
+def _part_paths(target: Path) -> Tuple[Path, Path]:
+    return target.with_name(target.name + ".part"), target.with_name(target.name + ".part.json")
+
+
+def _segment_path(part: Path, index: int) -> Path:
+    return part.with_name(f"{part.name}.{index}")
+
+
+def _header(response: Any, name: str) -> Optional[str]:
+    headers = getattr(response, "headers", None)
+    return headers.get(name) if headers is not None else None
+
+
+def _status(response: Any) -> int:
+    return getattr(response, "status", None) or getattr(response, "code", None) or 200
+
+
+def _content_range_start(response: Any) -> Optional[int]:
+    match = re.match(r"bytes (\d+)-\d+/(\d+|\*)", (_header(response, "Content-Range") or "").strip())
+    return int(match.group(1)) if match else None
+
+
+def _response_state(url: str, response: Any) -> Dict[str, Any]:
+    """Validators and size of a full (200) response, as stored next to the ``.part`` file."""
+    etag = _header(response, "ETag")
+    length = _header(response, "Content-Length")
+    return {
+        "url": url,
+        # Weak ETags cannot be used with If-Range.
+        "etag": etag if etag and not etag.startswith("W/") else None,
+        "last_modified": _header(response, "Last-Modified"),
+        "size": int(length) if length and length.isdigit() else None,
+    }
+
+
+def _if_range(state: Dict[str, Any]) -> Optional[str]:
+    return state.get("etag") or state.get("last_modified")
+
+
+def _load_part_state(state_path: Path, url: str) -> Dict[str, Any]:
+    try:
+        state = json.loads(state_path.read_text())
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) and state.get("url") == url else {}
+
+
+def _save_part_state(state_path: Path, state: Dict[str, Any]) -> None:
+    tmp = state_path.with_name(state_path.name + ".tmp")
+    tmp.write_text(json.dumps(state, sort_keys=True))
+    os.replace(tmp, state_path)
+
+
+def _discard_partial(part: Path, state_path: Path, state: Dict[str, Any]) -> None:
+    for index in range(int(state.get("segments") or 0)):
+        _segment_path(part, index).unlink(missing_ok=True)
+    part.unlink(missing_ok=True)
+    state_path.unlink(missing_ok=True)
+    state.clear()
+
+
+def _with_retries(fn: Callable[[], T], *, url: str, retries: int, backoff_sec: float) -> T:
+    """Call ``fn``, retrying transport errors and retryable statuses with exponential backoff."""
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except error.HTTPError as exc:
+            if exc.code not in RETRY_STATUS or attempt >= retries:
+                raise DownloadError(f"Failed to download {url}: HTTP {exc.code}") from exc
+            retry_after = exc.headers.get("Retry-After") if exc.headers is not None else None
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else None
+        except (error.URLError, OSError, http.client.HTTPException) as exc:
+            if attempt >= retries:
+                raise DownloadError(f"Failed to download {url}: {exc}") from exc
+            delay = None
+        if delay is None:
+            delay = backoff_sec * 2**attempt
+        time.sleep(min(MAX_BACKOFF_SEC, delay))
+        attempt += 1
+
+
+def _stream_to_part(url: str, part: Path, state_path: Path, state: Dict[str, Any], *, timeout: int) -> None:
+    """Fetch the rest of ``url`` into ``part``, resuming with ``Range`` when it is safe."""
+    have = part.stat().st_size if part.exists() else 0
+    validator = _if_range(state)
+    if have and state.get("size") == have:
+        return
+    headers = {"User-Agent": USER_AGENT}
+    if have and validator:
+        # If-Range makes the server send the whole resource instead of a
+        # range when it changed since the partial download began.
+        headers["Range"] = f"bytes={have}-"
+        headers["If-Range"] = validator
+    try:
+        response_cm = request.urlopen(request.Request(url, headers=headers), timeout=timeout)
+    except error.HTTPError as exc:
+        if exc.code != 416 or "Range" not in headers:
+            raise
+        _discard_partial(part, state_path, state)
+        return _stream_to_part(url, part, state_path, state, timeout=timeout)
+    with response_cm as response:
+        if "Range" in headers and _status(response) == 206:
+            if _content_range_start(response) != have:
+                _discard_partial(part, state_path, state)
+                raise DownloadError(f"Server returned an unexpected range for {url}")
+            mode = "ab"
+        else:
+            state.clear()
+            state.update(_response_state(url, response))
+            _save_part_state(state_path, state)
+            mode = "wb"
+        with part.open(mode) as fh:
+            shutil.copyfileobj(response, fh, CHUNK_SIZE)
+    size = state.get("size")
+    if size is not None and part.stat().st_size < size:
+        raise ConnectionError(f"Connection closed after {part.stat().st_size} of {size} bytes")
+
+
+def _fetch_segment(url: str, path: Path, begin: int, end: int, validator: str, *, timeout: int) -> None:
+    """Fetch bytes ``begin..end`` (inclusive) of ``url`` into ``path``, resuming what it holds."""
+    have = path.stat().st_size if path.exists() else 0
+    if begin + have > end:
+        return
+    headers = {"User-Agent": USER_AGENT, "Range": f"bytes={begin + have}-{end}", "If-Range": validator}
+    with request.urlopen(request.Request(url, headers=headers), timeout=timeout) as response:
+        if _status(response) != 206 or _content_range_start(response) != begin + have:
+            raise _RemoteChanged(f"{url} changed during a ranged download")
+        with path.open("ab") as fh:
+            shutil.copyfileobj(response, fh, CHUNK_SIZE)
+    if path.stat().st_size < end - begin + 1:
+        raise ConnectionError(f"Connection closed during range {begin}-{end}")
+
+
+def _probe_ranges(url: str, *, timeout: int) -> Optional[Dict[str, Any]]:
+    """HEAD ``url``; return its state when it can be fetched in byte ranges."""
+    head = request.Request(url, headers={"User-Agent": USER_AGENT}, method="HEAD")
+    with request.urlopen(head, timeout=timeout) as response:
+        state = _response_state(url, response)
+        accepts = (_header(response, "Accept-Ranges") or "").lower() == "bytes"
+    if not accepts or not _if_range(state) or (state["size"] or 0) < MIN_PARALLEL_BYTES:
+        return None
+    return state
+
+
+def _download_ranges(
+    url: str,
+    part: Path,
+    state_path: Path,
+    state: Dict[str, Any],
+    *,
+    segments: int,
+    timeout: int,
+    retry: Callable[[Callable[[], Any]], Any],
+) -> None:
+    """Fetch ``url`` as ``segments`` parallel byte ranges into ``part``.
+
+    Leaves ``state`` empty when the server does not support ranges (or the
+    resource changed mid-way), so the caller falls back to a single stream.
+    """
+    if not state.get("segments"):
+        probed = retry(lambda: _probe_ranges(url, timeout=timeout))
+        if probed is None:
+            return
+        state.clear()
+        state.update(probed, segments=segments)
+        _save_part_state(state_path, state)
+    size, count, validator = state["size"], state["segments"], _if_range(state)
+    bounds = [(i * size // count, (i + 1) * size // count - 1) for i in range(count)]
+    paths = [_segment_path(part, i) for i in range(count)]
+    try:
+        with ThreadPoolExecutor(max_workers=count) as pool:
+            futures = [
+                pool.submit(retry, lambda p=path, b=b: _fetch_segment(url, p, b[0], b[1], validator, timeout=timeout))
+                for path, b in zip(paths, bounds)
+            ]
+            for future in futures:
+                future.result()
+    except _RemoteChanged:
+        _discard_partial(part, state_path, state)
+        return
+    with part.open("wb") as out:
+        for path in paths:
+            with path.open("rb") as fh:
+                shutil.copyfileobj(fh, out, CHUNK_SIZE)
+    del state["segments"]
+    _save_part_state(state_path, state)
+    for path in paths:
+        path.unlink()
+
+
 def download_http_resource(
     url: str,
     target: Path,
     *,
     timeout: int = 300,
     expected_sha256: Optional[str] = None,
+    retries: int = 5,
+    backoff_sec: float = 1.0,
+    parallel_ranges: int = 1,
 ) -> Path:
-    """Download an HTTP resource to ``target`` with basic validation."""
+    """Download an HTTP resource to ``target`` with basic validation.
+
+    Bytes go to ``<target>.part``, with the resource's ETag/Last-Modified and
+    size kept in ``<target>.part.json``. A dropped connection is retried
+    ``retries`` times with exponential backoff, and each retry (or a later
+    call) resumes with a ``Range`` request guarded by ``If-Range``, so a
+    resource that changed in between is fetched again from the start. The
+    finished file is checked and renamed onto ``target`` atomically.
+
+    With ``parallel_ranges > 1``, servers that advertise byte ranges are
+    fetched as that many concurrent ranges (for files of at least 64 MB).
+    """
 
     _validate_url(url)
     ensure_dir(target.parent)
-    request_obj = request.Request(url, headers={"User-Agent": "ast-edit-downloader/0.1"})
-    try:
-        with request.urlopen(request_obj, timeout=timeout) as response, target.open("wb") as fh:
-            shutil.copyfileobj(response, fh)
-    except error.URLError as exc:  # pragma: no cover - network failure
-        raise DownloadError(f"Failed to download {url}: {exc}") from exc
+    part, state_path = _part_paths(target)
+    state = _load_part_state(state_path, url)
+    if not state:
+        _discard_partial(part, state_path, {"segments": parallel_ranges})
+
+    def retry(fn: Callable[[], T]) -> T:
+        return _with_retries(fn, url=url, retries=retries, backoff_sec=backoff_sec)
+
+    if state.get("segments") or (parallel_ranges > 1 and not part.exists()):
+        _download_ranges(
+            url,
+            part,
+            state_path,
+            state,
+            segments=int(state.get("segments") or parallel_ranges),
+            timeout=timeout,
+            retry=retry,
+        )
+    retry(lambda: _stream_to_part(url, part, state_path, state, timeout=timeout))
 
+    size = state.get("size")
+    if size is not None and part.stat().st_size != size:
+        _discard_partial(part, state_path, state)
+        raise DownloadError(f"Size mismatch for {url}: expected {size} bytes")
     if expected_sha256:
-        actual = compute_file_sha256(target)
+        actual = compute_file_sha256(part)
         if actual != expected_sha256:
+            _discard_partial(part, state_path, state)
             raise DownloadError(
                 f"Checksum mismatch for {target}. Expected {expected_sha256}, got {actual}."
             )
+    os.replace(part, target)
+    state_path.unlink(missing_ok=True)
     return target
 
 
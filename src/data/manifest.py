@@ -0,0 +1,155 @@
+"""Random-access reader for JSONL task manifests.
+
+``TaskManifest`` memory-maps a tasks file and keeps a line-offset index in a
+sidecar ``<manifest>.idx`` (rebuilt when the manifest's size or mtime
+changes), so opening a large manifest costs one scan the first time and one
+small read afterwards. Tasks are decoded only when accessed.
+
+``iter_tasks`` walks the manifest in file order or in a seeded shuffled
+order, restricted to one shard of N and optionally resuming at a position
+within that shard. Lines are grouped by ``task_id``: a task belongs to shard
+``crc32(task_id) % N``, shuffling reorders whole tasks, and the lines of one
+task (its steps) always keep their file order. Memory use is the index
+(8 bytes per line) plus, when sharding or shuffling, the task groups.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import random
+import struct
+import zlib
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.data import codec
+
+
+_INDEX_MAGIC = b"ASTMIDX1"
+_INDEX_HEADER = struct.Struct("<8sQQQ")  # magic, size, mtime_ns, count
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """Parse ``"i/N"`` (0 <= i < N) into ``(i, N)``."""
+    index, sep, count = text.partition("/")
+    try:
+        i, n = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"Expected a shard like 0/4, got {text!r}") from None
+    if not sep or n < 1 or not 0 <= i < n:
+        raise ValueError(f"Expected a shard like 0/4, got {text!r}")
+    return i, n
+
+
+class TaskManifest:
+    """Memory-mapped JSONL manifest with a persistent line-offset index."""
+
+    def __init__(self, path: Path, *, index_path: Optional[Path] = None):
+        self.path = Path(path)
+        self.index_path = Path(index_path) if index_path is not None else self.path.with_name(self.path.name + ".idx")
+        st = self.path.stat()
+        self._size = st.st_size
+        self._fh = self.path.open("rb")
+        self._mm: Optional[mmap.mmap] = (
+            mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ) if self._size else None
+        )
+        self.offsets = self._load_index(st) or self._build_index(st)
+
+    def _load_index(self, st: os.stat_result) -> Optional[array]:
+        try:
+            with self.index_path.open("rb") as fh:
+                magic, size, mtime_ns, count = _INDEX_HEADER.unpack(fh.read(_INDEX_HEADER.size))
+                if magic != _INDEX_MAGIC or size != st.st_size or mtime_ns != st.st_mtime_ns:
+                    return None
+                offsets = array("Q")
+                offsets.fromfile(fh, count)
+                return offsets
+        except (OSError, struct.error, EOFError):
+            return None
+
+    def _build_index(self, st: os.stat_result) -> array:
+        offsets = array("Q")
+        mm = self._mm
+        if mm is not None:
+            pos = 0
+            while pos < self._size:
+                end = mm.find(b"\n", pos)
+                if end == -1:
+                    end = self._size
+                if mm[pos:end].strip():
+                    offsets.append(pos)
+                pos = end + 1
+        tmp = self.index_path.with_name(self.index_path.name + f".tmp{os.getpid()}")
+        try:
+            with tmp.open("wb") as fh:
+                fh.write(_INDEX_HEADER.pack(_INDEX_MAGIC, st.st_size, st.st_mtime_ns, len(offsets)))
+                offsets.tofile(fh)
+            os.replace(tmp, self.index_path)
+        except OSError:
+            # A read-only manifest directory just means no cached index.
+            tmp.unlink(missing_ok=True)
+        return offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def raw(self, i: int) -> bytes:
+        """Return line ``i`` (without the newline)."""
+        assert self._mm is not None
+        start = self.offsets[i]
+        end = self._mm.find(b"\n", start)
+        return self._mm[start : end if end != -1 else self._size]
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        return codec.loads(self.raw(i))
+
+    def order(self, *, seed: Optional[int] = None, shard: Tuple[int, int] = (0, 1)) -> array:
+        """Line indices of ``shard`` in file order, or with tasks shuffled by ``seed``.
+
+        Lines sharing a ``task_id`` stay together in file order; the task's
+        shard is fixed by a stable hash of its ``task_id``.
+        """
+        i, n = shard
+        if seed is None and n == 1:
+            return array("Q", range(len(self)))
+        groups: Dict[str, List[int]] = {}
+        for index in range(len(self)):
+            groups.setdefault(str(self[index]["task_id"]), []).append(index)
+        tasks = [
+            lines for task_id, lines in groups.items()
+            if n == 1 or zlib.crc32(task_id.encode("utf-8")) % n == i
+        ]
+        if seed is not None:
+            random.Random(seed).shuffle(tasks)
+        return array("Q", (index for lines in tasks for index in lines))
+
+    def iter_tasks(
+        self,
+        *,
+        shard: Tuple[int, int] = (0, 1),
+        start: int = 0,
+        seed: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield tasks of ``shard`` (``(i, N)``), skipping the first ``start`` of them."""
+        order = self.order(seed=seed, shard=shard)
+        for position in range(max(0, start), len(order)):
+            yield self[order[position]]
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._fh.close()
+
+    def __enter__(self) -> "TaskManifest":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+__all__ = [
+    "TaskManifest",
+    "parse_shard",
+]
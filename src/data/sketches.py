@@ -0,0 +1,235 @@
+"""Constant-memory, mergeable summaries for streams of latency samples.
+
+``QuantileSketch`` is a DDSketch-style log-bucketed sketch: every quantile it
+reports is within ``relative_accuracy`` of the true sample value, memory is
+bounded by ``max_buckets`` and two sketches with the same accuracy merge by
+adding bucket counts. ``LogHistogram`` keeps coarse power-of-``base`` buckets
+for display. Non-finite samples (NaN, ±inf) carry no latency and are left
+out of both; the sketch counts them in ``non_finite``. Both round-trip
+through plain dicts so they can be cached as JSON or shipped between worker
+processes.
+"""
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+
+class QuantileSketch:
+    """Streaming quantile sketch with bounded relative error."""
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.non_finite = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def _index(self, value: float) -> int:
+        return int(math.ceil(math.log(value) / self._log_gamma))
+
+    def _value(self, index: int) -> float:
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def add(self, value: float) -> None:
+        value = float(value)
+        if not math.isfinite(value):
+            self.non_finite += 1
+            return
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if value <= 0:
+            self.zero_count += 1
+            return
+        idx = self._index(value)
+        self._buckets[idx] = self._buckets.get(idx, 0) + 1
+        if len(self._buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self) -> None:
+        # Fold the lowest buckets together; accuracy is kept for the upper
+        # quantiles, which are the ones tail-latency tracking cares about.
+        keys = sorted(self._buckets)
+        excess = len(keys) - self.max_buckets
+        target = keys[excess]
+        folded = sum(self._buckets.pop(k) for k in keys[:excess])
+        self._buckets[target] += folded
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Fold ``other`` into this sketch and return self."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for idx, n in other._buckets.items():
+            self._buckets[idx] = self._buckets.get(idx, 0) + n
+        self.zero_count += other.zero_count
+        self.non_finite += other.non_finite
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        if len(self._buckets) > self.max_buckets:
+            self._collapse()
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Return the approximate ``q``-quantile, or None for an empty sketch."""
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for idx in sorted(self._buckets):
+            seen += self._buckets[idx]
+            if seen > rank:
+                value = self._value(idx)
+                return min(max(value, self.min), self.max)  # type: ignore[type-var]
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_buckets": self.max_buckets,
+            "buckets": {str(k): v for k, v in self._buckets.items()},
+            "zero_count": self.zero_count,
+            "non_finite": self.non_finite,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "QuantileSketch":
+        sketch = cls(
+            relative_accuracy=float(data.get("relative_accuracy", 0.01)),
+            max_buckets=int(data.get("max_buckets", 2048)),
+        )
+        sketch._buckets = {int(k): int(v) for k, v in (data.get("buckets") or {}).items()}
+        sketch.zero_count = int(data.get("zero_count", 0))
+        sketch.non_finite = int(data.get("non_finite", 0))
+        sketch.count = int(data.get("count", 0))
+        sketch.sum = float(data.get("sum", 0.0))
+        sketch.min = data.get("min")
+        sketch.max = data.get("max")
+        return sketch
+
+
+class LogHistogram:
+    """Histogram with buckets ``[min_value * base**i, min_value * base**(i+1))``.
+
+    Samples below ``min_value`` (including zero) land in a single underflow
+    bucket, so memory grows only with the logarithm of the observed range.
+    """
+
+    def __init__(self, base: float = 2.0, min_value: float = 1e-3):
+        if base <= 1 or min_value <= 0:
+            raise ValueError("base must be > 1 and min_value > 0")
+        self.base = base
+        self.min_value = min_value
+        self._log_base = math.log(base)
+        self._counts: Dict[int, int] = {}
+
+    def add(self, value: float) -> None:
+        value = float(value)
+        if not math.isfinite(value):
+            return
+        if value < self.min_value:
+            idx = -1
+        else:
+            idx = int(math.floor(math.log(value / self.min_value) / self._log_base))
+        self._counts[idx] = self._counts.get(idx, 0) + 1
+
+    def merge(self, other: "LogHistogram") -> "LogHistogram":
+        if other.base != self.base or other.min_value != self.min_value:
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        for idx, n in other._counts.items():
+            self._counts[idx] = self._counts.get(idx, 0) + n
+        return self
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts.values())
+
+    def buckets(self) -> List[Tuple[float, float, int]]:
+        """Return non-empty buckets as ``(low, high, count)`` in ascending order."""
+        out: List[Tuple[float, float, int]] = []
+        for idx in sorted(self._counts):
+            if idx < 0:
+                low, high = 0.0, self.min_value
+            else:
+                low = self.min_value * self.base ** idx
+                high = low * self.base
+            out.append((low, high, self._counts[idx]))
+        return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "base": self.base,
+            "min_value": self.min_value,
+            "counts": {str(k): v for k, v in self._counts.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "LogHistogram":
+        hist = cls(base=float(data.get("base", 2.0)), min_value=float(data.get("min_value", 1e-3)))
+        hist._counts = {int(k): int(v) for k, v in (data.get("counts") or {}).items()}
+        return hist
+
+
+class LatencyStats:
+    """Quantile sketch plus display histogram for one latency metric."""
+
+    def __init__(self) -> None:
+        self.sketch = QuantileSketch()
+        self.histogram = LogHistogram()
+
+    def add(self, value: float) -> None:
+        self.sketch.add(value)
+        self.histogram.add(value)
+
+    def merge(self, other: "LatencyStats") -> "LatencyStats":
+        self.sketch.merge(other.sketch)
+        self.histogram.merge(other.histogram)
+        return self
+
+    @property
+    def count(self) -> int:
+        return self.sketch.count
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"sketch": self.sketch.to_dict(), "histogram": self.histogram.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "LatencyStats":
+        stats = cls()
+        stats.sketch = QuantileSketch.from_dict(data.get("sketch") or {})
+        stats.histogram = LogHistogram.from_dict(data.get("histogram") or {})
+        return stats
+
+
+__all__ = [
+    "LatencyStats",
+    "LogHistogram",
+    "QuantileSketch",
+]
@@ -0,0 +1,197 @@
+"""Lightweight span tracing for actor and teacher steps.
+
+Code marks phases with ``span("name")`` (or the ``traced("name")``
+decorator). While tracing is disabled, the default, ``span`` returns a
+shared no-op context manager, so an instrumented call costs one global
+lookup and one function call.
+
+``enable()`` turns tracing on for the process:
+
+- Inside ``step_spans()``, every finished span adds its duration to a
+  per-step ``{name: seconds}`` breakdown, which the loops store in the
+  trajectory record's ``metrics["spans"]``. Nested spans are counted in
+  both the inner and the outer name, and spans on worker threads count
+  when the work was submitted through ``propagate``, so values need not add
+  up to the step's wall time.
+- With ``chrome_trace=path``, each span is also appended to ``path`` as a
+  Chrome trace event ("X" phase, microseconds). The file uses the JSON
+  array format with the closing bracket left off, as trace viewers allow,
+  so it can be streamed and stays readable after a crash. Open it in
+  ``chrome://tracing`` or https://ui.perfetto.dev.
+"""
+from __future__ import annotations
+
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterator, Optional, TypeVar
+
+from src.data import codec
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_enabled = False
+_trace_fh: Optional[IO[bytes]] = None
+_trace_lock = threading.Lock()
+_step: contextvars.ContextVar[Optional["_StepSpans"]] = contextvars.ContextVar("step_spans", default=None)
+
+
+class _StepSpans:
+    __slots__ = ("totals", "_lock")
+
+    def __init__(self) -> None:
+        self.totals: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name: str, args: Dict[str, Any]):
+        self.name = name
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        seconds = time.perf_counter() - self.start
+        step = _step.get()
+        if step is not None:
+            step.add(self.name, seconds)
+        if _trace_fh is not None:
+            _write_event(
+                {
+                    "name": self.name,
+                    "ph": "X",
+                    "ts": self.start * 1e6,
+                    "dur": seconds * 1e6,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    **({"args": self.args} if self.args else {}),
+                }
+            )
+
+
+def _write_event(event: Dict[str, Any]) -> None:
+    line = codec.dumpb(event) + b",\n"
+    with _trace_lock:
+        if _trace_fh is not None:
+            _trace_fh.write(line)
+
+
+def span(name: str, **args: Any) -> Any:
+    """Context manager timing one phase; ``args`` are attached to the trace event."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name, args)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Decorator form of ``span``."""
+
+    def decorate(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(*, chrome_trace: Optional[Path] = None) -> None:
+    """Turn tracing on; with ``chrome_trace``, also stream trace events to that file."""
+    global _enabled, _trace_fh
+    with _trace_lock:
+        if chrome_trace is not None and _trace_fh is None:
+            path = Path(chrome_trace)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _trace_fh = path.open("wb")
+            _trace_fh.write(b"[\n")
+        _enabled = True
+
+
+def disable() -> None:
+    """Turn tracing off and close the Chrome trace file, if any."""
+    global _enabled, _trace_fh
+    with _trace_lock:
+        _enabled = False
+        if _trace_fh is not None:
+            _trace_fh.close()
+            _trace_fh = None
+
+
+@contextmanager
+def step_spans() -> Iterator[Optional[Dict[str, float]]]:
+    """Collect a ``{span name: seconds}`` breakdown of the enclosed step.
+
+    Yields None while tracing is disabled; otherwise the dict fills in as
+    spans finish.
+    """
+    if not _enabled:
+        yield None
+        return
+    collector = _StepSpans()
+    token = _step.set(collector)
+    try:
+        yield collector.totals
+    finally:
+        _step.reset(token)
+
+
+def propagate(fn: F) -> F:
+    """Bind ``fn`` to the current step so spans it opens on another thread are counted."""
+    if not _enabled:
+        return fn
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        # A Context cannot be entered by two threads at once, so each call
+        # runs in its own copy; the collector object inside is shared.
+        return ctx.copy().run(fn, *args, **kwargs)
+
+    return wrapper  # type: ignore[return-value]
+
+
+__all__ = [
+    "disable",
+    "enable",
+    "enabled",
+    "propagate",
+    "span",
+    "step_spans",
+    "traced",
+]
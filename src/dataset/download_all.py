@@ -1,4 +1,4 @@
-"""Download all configured datasets sequentially.
+"""Download all configured datasets.
 
 This module looks at ``configs/datasets.yaml`` to determine which datasets
 are available, then invokes each dataset's ``download.py`` module:
@@ -6,19 +6,43 @@ are available, then invokes each dataset's ``download.py`` module:
     python -m dataset.<name>.download
 
 Use ``--metadata-only`` to run them in dry-run / metadata mode.
+
+By default the downloaders run one after another in name order. With
+``--jobs N`` up to N run at once, largest first (by ``approx_size_gb``) so
+the longest download does not start last; their output is interleaved line
+by line with a ``[name]`` prefix. Either way a summary of durations and
+failures is printed at the end.
 """
 from __future__ import annotations
 
 import argparse
 import subprocess
 import sys
-from typing import Mapping, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Mapping, Optional
 
 import yaml
 
 from src.data.schemas import repo_root
 
 
+@dataclass
+class DownloadResult:
+    name: str
+    seconds: float
+    returncode: int
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+_print_lock = threading.Lock()
+
+
 def _datasets_config() -> Mapping[str, Mapping[str, object]]:
     cfg_path = repo_root() / "configs" / "datasets.yaml"
     if not cfg_path.exists():
@@ -29,6 +53,102 @@ def _datasets_config() -> Mapping[str, Mapping[str, object]]:
     return data
 
 
+def _approx_size_gb(entry: object) -> float:
+    if not isinstance(entry, Mapping):
+        return 0.0
+    try:
+        return float(entry.get("approx_size_gb") or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def schedule(cfg: Mapping[str, Mapping[str, object]]) -> List[str]:
+    """Dataset names largest first; unknown sizes go last, ties by name."""
+    return sorted(cfg.keys(), key=lambda name: (-_approx_size_gb(cfg[name]), name))
+
+
+def _command(name: str, metadata_only: bool) -> List[str]:
+    cmd = [sys.executable, "-m", f"dataset.{name}.download"]
+    if metadata_only:
+        cmd.append("--metadata-only")
+    return cmd
+
+
+def _emit(line: str, *, err: bool = False) -> None:
+    with _print_lock:
+        print(line, file=sys.stderr if err else sys.stdout, flush=True)
+
+
+def _run_sequential(name: str, cmd: List[str]) -> DownloadResult:
+    print(f"==> [{name}] running: {' '.join(cmd)}")
+    start = time.monotonic()
+    returncode = 0
+    try:
+        subprocess.run(cmd, check=True)
+    except subprocess.CalledProcessError as exc:
+        returncode = exc.returncode
+        print(
+            f"[ERROR] Dataset {name!r} failed with exit code {exc.returncode}",
+            file=sys.stderr,
+        )
+    return DownloadResult(name, time.monotonic() - start, returncode)
+
+
+def _run_prefixed(name: str, cmd: List[str]) -> DownloadResult:
+    """Run one downloader, relaying its merged stdout/stderr with a ``[name]`` prefix."""
+    _emit(f"==> [{name}] running: {' '.join(cmd)}")
+    start = time.monotonic()
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+    except OSError as exc:
+        _emit(f"[ERROR] Dataset {name!r} could not start: {exc}", err=True)
+        return DownloadResult(name, time.monotonic() - start, -1)
+    assert proc.stdout is not None
+    # Binary mode splits on "\n" only, so a progress bar's "\r" redraws
+    # arrive as one line; print just its latest frame.
+    for raw in proc.stdout:
+        frames = [frame for frame in raw.decode("utf-8", "replace").rstrip("\r\n").split("\r") if frame.strip()]
+        if frames:
+            _emit(f"[{name}] {frames[-1].rstrip()}")
+    returncode = proc.wait()
+    seconds = time.monotonic() - start
+    if returncode:
+        _emit(f"[ERROR] Dataset {name!r} failed with exit code {returncode}", err=True)
+    else:
+        _emit(f"==> [{name}] done in {seconds:.1f}s")
+    return DownloadResult(name, seconds, returncode)
+
+
+def run_all(
+    cfg: Mapping[str, Mapping[str, object]],
+    *,
+    jobs: int = 1,
+    metadata_only: bool = False,
+) -> List[DownloadResult]:
+    """Run every dataset downloader; ``jobs > 1`` runs that many at once, largest first."""
+    if jobs <= 1:
+        return [_run_sequential(name, _command(name, metadata_only)) for name in sorted(cfg.keys())]
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_run_prefixed, name, _command(name, metadata_only)) for name in schedule(cfg)]
+        return [future.result() for future in futures]
+
+
+def print_summary(results: List[DownloadResult], wall_seconds: float) -> None:
+    print("\n==> Summary")
+    width = max((len(result.name) for result in results), default=4)
+    for result in results:
+        status = "ok" if result.ok else f"FAILED (exit {result.returncode})"
+        print(f"  {result.name:<{width}}  {result.seconds:>8.1f}s  {status}")
+    failed = [result.name for result in results if not result.ok]
+    print(f"  {len(results) - len(failed)}/{len(results)} succeeded in {wall_seconds:.1f}s")
+    if failed:
+        print(f"  failed: {', '.join(failed)}")
+
+
 def main(argv: Optional[list[str]] = None) -> None:
     parser = argparse.ArgumentParser(
         prog="python -m src.dataset.download_all",
@@ -39,28 +159,23 @@ def main(argv: Optional[list[str]] = None) -> None:
         action="store_true",
         help="Pass --metadata-only to each dataset downloader (dry-run/metadata mode).",
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of downloaders to run concurrently, largest dataset first (default: 1, sequential).",
+    )
     args = parser.parse_args(argv)
 
     cfg = _datasets_config()
     if not cfg:
         raise SystemExit("No datasets found in configs/datasets.yaml")
 
-    for name in sorted(cfg.keys()):
-        module = f"dataset.{name}.download"
-        cmd = [sys.executable, "-m", module]
-        if args.metadata_only:
-            cmd.append("--metadata-only")
-
-        print(f"==> [{name}] running: {' '.join(cmd)}")
-        try:
-            subprocess.run(cmd, check=True)
-        except subprocess.CalledProcessError as exc:
-            print(
-                f"[ERROR] Dataset {name!r} failed with exit code {exc.returncode}",
-                file=sys.stderr,
-            )
+    start = time.monotonic()
+    results = run_all(cfg, jobs=args.jobs, metadata_only=args.metadata_only)
+    print_summary(results, time.monotonic() - start)
 
 
 if __name__ == "__main__":
     main()
-
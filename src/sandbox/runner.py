@@ -11,7 +11,6 @@ This module intentionally avoids heavy isolation to reduce complexity.
 from __future__ import annotations
 
 import difflib
-import json
 import os
 import shutil
 import subprocess
@@ -30,6 +29,7 @@ try:  # POSIX resource limits
 except Exception:  # pragma: no cover - non-POSIX
     resource = None  # type: ignore
 
+from src.data import codec, tracing
 from src.data.schemas import repo_root
 
 
@@ -102,10 +102,11 @@ def _log_event(cfg: SandboxConfig, task_id: str, event: Mapping[str, object]) ->
     payload.setdefault("timestamp", time.time())
     payload.setdefault("task_id", task_id)
     log_path = cfg.logs_dir / f"{task_id}.jsonl"
-    with log_path.open("a", encoding="utf-8") as fh:
-        fh.write(json.dumps(payload, ensure_ascii=False) + "\n")
+    with log_path.open("ab") as fh:
+        fh.write(codec.dumpb(payload) + b"\n")
 
 
+@tracing.traced("sandbox.prepare_workspace")
 def prepare_workspace(task_id: str, files: Mapping[str, bytes | str]) -> Path:
     """Create a per-task workspace and materialize files.
 
@@ -126,6 +127,24 @@ def prepare_workspace(task_id: str, files: Mapping[str, bytes | str]) -> Path:
     return ws
 
 
+@tracing.traced("sandbox.clone_workspace")
+def clone_workspace(workspace: Path, name: str) -> Path:
+    """Copy a prepared workspace to a sibling directory ``name`` and return it.
+
+    Used to give each of several sampled actions its own copy of one task
+    workspace without re-materializing the task files. Files are copied with
+    ``shutil.copy2`` (in-kernel ``sendfile`` on Linux); an existing
+    destination is replaced.
+    """
+    cfg = _load_config()
+    dest = workspace.parent / _safe_relpath(Path(name))
+    if dest.exists():
+        shutil.rmtree(dest)
+    shutil.copytree(workspace, dest, symlinks=True)
+    _log_event(cfg, dest.name, {"event": "clone_workspace", "source": str(workspace), "workspace": str(dest)})
+    return dest
+
+
 @dataclass
 class SandboxResult:
     cmd: List[str]
@@ -195,6 +214,18 @@ def _snapshot_workspace(workspace: Path) -> Dict[str, str]:
     return snapshot
 
 
+def snapshot_workspace(workspace: Path) -> Dict[str, str]:
+    """Public form of the pre-action snapshot; see ``apply_action(baseline=...)``."""
+    with tracing.span("sandbox.snapshot_before"):
+        return _snapshot_workspace(workspace)
+
+
+def _snapshot_after(workspace: Path) -> Dict[str, str]:
+    with tracing.span("sandbox.snapshot_after"):
+        return _snapshot_workspace(workspace)
+
+
+@tracing.traced("sandbox.diff")
 def _compute_diff(before: Dict[str, str], after: Dict[str, str]) -> tuple[Optional[str], Optional[List[str]]]:
     """Compute a unified diff between two workspace snapshots."""
     changed_files: List[str] = []
@@ -220,11 +251,20 @@ def _compute_diff(before: Dict[str, str], after: Dict[str, str]) -> tuple[Option
     return "".join(chunks), changed_files
 
 
-def apply_action(workspace: Path, action: Mapping[str, object], *, timeout_sec: Optional[int] = None) -> SandboxResult:
+@tracing.traced("sandbox.apply_action")
+def apply_action(
+    workspace: Path,
+    action: Mapping[str, object],
+    *,
+    timeout_sec: Optional[int] = None,
+    baseline: Optional[Dict[str, str]] = None,
+) -> SandboxResult:
     """Execute an allowlisted command inside the workspace.
 
     Minimal action format: {"command": ["ast-grep", "..."], ...}
     Only the first element is validated against the allowlist.
+    ``baseline`` is a ``snapshot_workspace`` result to diff against instead of
+    snapshotting again; clones of one workspace can share it.
     """
     cfg = _load_config()
     cmd = action.get("command")
@@ -236,21 +276,22 @@ def apply_action(workspace: Path, action: Mapping[str, object], *, timeout_sec:
         return SandboxResult(cmd=cmd, exit_code=126, stdout="", stderr=f"binary '{cmd[0]}' not allowed", duration_sec=0.0, error="not_allowed")
 
     full_cmd = [bin_path] + cmd[1:]
-    before = _snapshot_workspace(workspace)
+    before = baseline if baseline is not None else snapshot_workspace(workspace)
     start = time.time()
     try:
-        proc = subprocess.run(
-            full_cmd,
-            cwd=str(workspace),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            timeout=timeout_sec or cfg.default_timeout_sec,
-            preexec_fn=_preexec_limits(cfg),  # type: ignore[arg-type]
-            env=_env_for_subprocess(),
-        )
+        with tracing.span("sandbox.subprocess", cmd=cmd[0]):
+            proc = subprocess.run(
+                full_cmd,
+                cwd=str(workspace),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                timeout=timeout_sec or cfg.default_timeout_sec,
+                preexec_fn=_preexec_limits(cfg),  # type: ignore[arg-type]
+                env=_env_for_subprocess(),
+            )
         duration = time.time() - start
-        after = _snapshot_workspace(workspace)
+        after = _snapshot_after(workspace)
         diff, changed_files = _compute_diff(before, after)
         result = SandboxResult(
             cmd=full_cmd,
@@ -263,7 +304,7 @@ def apply_action(workspace: Path, action: Mapping[str, object], *, timeout_sec:
         )
     except subprocess.TimeoutExpired as exc:
         duration = time.time() - start
-        after = _snapshot_workspace(workspace)
+        after = _snapshot_after(workspace)
         diff, changed_files = _compute_diff(before, after)
         result = SandboxResult(
             cmd=full_cmd,
@@ -311,6 +352,7 @@ def run_tests(workspace: Path, test_spec: Mapping[str, object], *, timeout_sec:
     )
 
 
+@tracing.traced("sandbox.cleanup")
 def cleanup(workspace: Path) -> None:
     cfg = _load_config()
     try:
@@ -332,6 +374,8 @@ def _env_for_subprocess() -> Dict[str, str]:
 __all__ = [
     "SandboxConfig",
     "prepare_workspace",
+    "clone_workspace",
+    "snapshot_workspace",
     "apply_action",
     "run_tests",
     "cleanup",
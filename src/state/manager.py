@@ -1,12 +1,17 @@
 from __future__ import annotations
 
 import argparse
-import json
+import atexit
+import os
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
 
+from src.data import codec, tracing
 from src.data.schemas import repo_root
 
 
@@ -25,24 +30,384 @@ _MAX_HISTORY_ITEMS = 3
 _MAX_TEXT_LEN = 256
 
 
+# Connections are cached per thread and re-opened after a fork. WAL lets
+# readers proceed while a writer commits, the busy timeout makes concurrent
+# writers queue instead of failing with "database is locked", and
+# synchronous=NORMAL skips the per-commit fsync that WAL does not need for
+# durability across process crashes.
+_BUSY_TIMEOUT_MS = 30_000
+_STATEMENT_CACHE_SIZE = 64
+
+_CREATE_STATE_TABLE = (
+    "CREATE TABLE IF NOT EXISTS state ("
+    " task_id TEXT PRIMARY KEY,"
+    " blob TEXT NOT NULL"
+    ")"
+)
+_CREATE_HISTORY_TABLE = (
+    "CREATE TABLE IF NOT EXISTS state_history ("
+    " task_id TEXT NOT NULL,"
+    " step INTEGER NOT NULL,"
+    " kind TEXT NOT NULL,"
+    " blob TEXT NOT NULL,"
+    " PRIMARY KEY (task_id, step)"
+    ") WITHOUT ROWID"
+)
+_SELECT_STATE = "SELECT blob FROM state WHERE task_id = ?"
+_UPSERT_STATE = (
+    "INSERT INTO state(task_id, blob) VALUES (?, ?)"
+    " ON CONFLICT(task_id) DO UPDATE SET blob=excluded.blob"
+)
+
+# Keep IN (...) lists under SQLite's default host-parameter limit (999 on
+# older builds).
+_IN_CHUNK_SIZE = 500
+
+_local = threading.local()
+_default_db_path: Optional[Path] = None
+
+
 def _db_path() -> Path:
-    root = repo_root()
-    db_dir = root / "data"
-    db_dir.mkdir(parents=True, exist_ok=True)
-    return db_dir / "state.sqlite3"
-
-
-def _get_connection() -> sqlite3.Connection:
-    conn = sqlite3.connect(_db_path())
-    conn.execute(
-        "CREATE TABLE IF NOT EXISTS state ("
-        " task_id TEXT PRIMARY KEY,"
-        " blob TEXT NOT NULL"
-        ")"
+    # Resolved once: repo_root() and mkdir cost several syscalls, and every
+    # load/save needs the path.
+    global _default_db_path
+    if _default_db_path is None:
+        db_dir = repo_root() / "data"
+        db_dir.mkdir(parents=True, exist_ok=True)
+        _default_db_path = db_dir / "state.sqlite3"
+    return _default_db_path
+
+
+def _open_connection(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(
+        path,
+        timeout=_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=_STATEMENT_CACHE_SIZE,
     )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={_BUSY_TIMEOUT_MS}")
+    conn.execute(_CREATE_STATE_TABLE)
+    conn.execute(_CREATE_HISTORY_TABLE)
+    conn.commit()
     return conn
 
 
+def _get_connection(path: Optional[Path] = None) -> sqlite3.Connection:
+    """Return this thread's cached connection to ``path`` (default: the state DB).
+
+    The same SQL strings are reused on a long-lived connection, so sqlite3's
+    statement cache keeps them prepared across calls.
+    """
+    pid = os.getpid()
+    if getattr(_local, "pid", None) != pid:
+        # Never reuse a connection inherited across fork().
+        _local.pid = pid
+        _local.connections = {}
+    if path is None:
+        path = _db_path()
+    key = str(path)
+    conn = _local.connections.get(key)
+    if conn is None:
+        conn = _open_connection(path)
+        _local.connections[key] = conn
+    return conn
+
+
+def close_connections() -> None:
+    """Close this thread's cached connections (they reopen on next use)."""
+    connections = getattr(_local, "connections", None) or {}
+    if getattr(_local, "pid", None) == os.getpid():
+        for conn in connections.values():
+            conn.close()
+    _local.connections = {}
+    _local.pid = os.getpid()
+
+
+class _WriteBehind:
+    """Group-commit queue for ``save`` calls against one database file.
+
+    ``submit`` records the latest blob per task_id and returns immediately; a
+    background thread commits everything queued so far in one transaction
+    every ``interval_sec`` or as soon as ``batch_size`` task_ids are pending.
+    Queued and in-flight blobs are visible to ``lookup`` so a process always
+    reads its own writes. ``flush`` blocks until everything submitted before
+    the call is durable.
+    """
+
+    def __init__(self, path: Path, *, interval_sec: float, batch_size: int):
+        self.path = path
+        self.pid = os.getpid()
+        self.interval_sec = interval_sec
+        self.batch_size = max(1, batch_size)
+        self._cond = threading.Condition()
+        self._pending: Dict[str, str] = {}
+        self._inflight: Dict[str, str] = {}
+        self._submitted = 0
+        self._committed = 0
+        self._error: Optional[BaseException] = None
+        self._flush_waiters = 0
+        self._stopping = False
+        self.commits = 0
+        self._thread = threading.Thread(target=self._run, name="state-write-behind", daemon=True)
+        self._thread.start()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("state write-behind commit failed") from error
+
+    def submit(self, task_id: str, blob: str) -> None:
+        with self._cond:
+            self._raise_error()
+            self._pending[task_id] = blob
+            self._submitted += 1
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+
+    def lookup(self, task_id: str) -> Optional[str]:
+        with self._cond:
+            blob = self._pending.get(task_id)
+            if blob is None:
+                blob = self._inflight.get(task_id)
+            return blob
+
+    def flush(self) -> None:
+        with self._cond:
+            target = self._submitted
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            try:
+                while self._committed < target and self._error is None and self._thread.is_alive():
+                    self._cond.wait(self.interval_sec)
+            finally:
+                self._flush_waiters -= 1
+            self._raise_error()
+
+    def stop(self) -> None:
+        try:
+            self.flush()
+        finally:
+            with self._cond:
+                self._stopping = True
+                self._cond.notify_all()
+            self._thread.join()
+
+    def _next_batch(self) -> tuple[Dict[str, str], int]:
+        with self._cond:
+            deadline = time.monotonic() + self.interval_sec
+            while (
+                not self._stopping
+                and not (self._flush_waiters and self._pending)
+                and len(self._pending) < self.batch_size
+            ):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending
+            self._pending = {}
+            self._inflight = batch
+            return batch, self._submitted
+
+    def _run(self) -> None:
+        conn = _open_connection(self.path)
+        try:
+            while True:
+                batch, target = self._next_batch()
+                if not batch and self._stopping:
+                    return
+                try:
+                    if batch:
+                        with conn:
+                            conn.executemany(_UPSERT_STATE, list(batch.items()))
+                except Exception as exc:
+                    with self._cond:
+                        self._error = exc
+                        # Re-queue the batch unless newer writes replaced it.
+                        for task_id, blob in batch.items():
+                            self._pending.setdefault(task_id, blob)
+                        self._inflight = {}
+                        self._cond.notify_all()
+                    if self._stopping:
+                        return
+                    time.sleep(self.interval_sec)
+                    continue
+                with self._cond:
+                    self._inflight = {}
+                    self._committed = target
+                    if batch:
+                        self.commits += 1
+                    self._cond.notify_all()
+        finally:
+            conn.close()
+
+
+_write_behind: Optional[_WriteBehind] = None
+_write_behind_lock = threading.Lock()
+
+
+def enable_write_behind(*, interval_sec: float = 0.05, batch_size: int = 256) -> None:
+    """Queue ``save`` calls and group-commit them in the background.
+
+    Saves become visible to ``load`` in this process immediately and reach
+    the database within ``interval_sec`` (or once ``batch_size`` task_ids are
+    pending). Call ``flush()`` before handing state to another process; the
+    queue is also flushed at interpreter exit.
+    """
+    disable_write_behind()
+    # Create the schema up front so readers never race the writer thread.
+    _get_connection()
+    global _write_behind
+    with _write_behind_lock:
+        _write_behind = _WriteBehind(_db_path(), interval_sec=interval_sec, batch_size=batch_size)
+
+
+def disable_write_behind() -> None:
+    """Flush queued saves and return to synchronous, per-call commits."""
+    global _write_behind
+    with _write_behind_lock:
+        wb, _write_behind = _write_behind, None
+        if wb is not None and wb.pid == os.getpid():
+            wb.stop()
+
+
+def flush() -> None:
+    """Block until every ``save`` issued so far has been committed."""
+    wb = _write_behind
+    if wb is not None and wb.pid == os.getpid():
+        wb.flush()
+
+
+def _active_write_behind(path: Path) -> Optional[_WriteBehind]:
+    wb = _write_behind
+    # A forked child inherits the object but not its writer thread, so it
+    # falls back to synchronous saves.
+    if wb is None or wb.pid != os.getpid() or wb.path != path:
+        return None
+    return wb
+
+
+atexit.register(disable_write_behind)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+    max_entries: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def _copy_state(state: State) -> State:
+    return State(
+        goals=list(state.goals),
+        constraints=list(state.constraints),
+        decisions=list(state.decisions),
+        hypotheses=list(state.hypotheses),
+        history=list(state.history),
+        open_issues=list(state.open_issues),
+        next_focus=state.next_focus,
+    )
+
+
+class _StateCache:
+    """Size-bounded LRU of decoded states keyed by (db path, task_id).
+
+    Entries are written through by ``save`` and handed out as copies, so
+    callers can never mutate the cached value.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], State]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[State]:
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            state = self._entries.get(key)
+            if state is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return _copy_state(state)
+
+    def put(self, key: Tuple[str, str], state: State) -> None:
+        if self.max_entries <= 0:
+            return
+        cached = _copy_state(state)
+        with self._lock:
+            self._entries[key] = cached
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, task_id: Optional[str] = None) -> None:
+        with self._lock:
+            if task_id is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[1] == task_id]:
+                del self._entries[key]
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                size=len(self._entries),
+                max_entries=self.max_entries,
+            )
+
+
+_DEFAULT_CACHE_ENTRIES = 4096
+# Off by default: the cache only sees this process's writes.
+_cache = _StateCache(0)
+
+
+def configure_cache(max_entries: int = _DEFAULT_CACHE_ENTRIES) -> None:
+    """Enable or resize the in-process state cache (``0`` disables it) and reset counters.
+
+    Only enable it when no other process writes the same tasks; otherwise
+    ``load`` can return a state that another process has since replaced.
+    """
+    global _cache
+    _cache = _StateCache(max_entries)
+
+
+def invalidate(task_id: Optional[str] = None) -> None:
+    """Drop cached state for ``task_id`` (or all tasks).
+
+    The cache only sees this process's writes. When several processes share a
+    database, invalidate a task before loading it if another process may have
+    saved it since.
+    """
+    _cache.invalidate(task_id)
+    with _history_lock:
+        for key in [key for key in _history_tail if task_id is None or key[1] == task_id]:
+            del _history_tail[key]
+
+
+def cache_stats() -> CacheStats:
+    """Return hit/miss/eviction counters for the in-process state cache."""
+    return _cache.stats()
+
+
 def _truncate_text(value: str) -> str:
     if len(value) <= _MAX_TEXT_LEN:
         return value
@@ -69,14 +434,8 @@ def _apply_caps(state: State) -> State:
     )
 
 
-def load(task_id: str) -> State:
-    """Load state for a task_id, or return a default empty State."""
-    with _get_connection() as conn:
-        cur = conn.execute("SELECT blob FROM state WHERE task_id = ?", (task_id,))
-        row = cur.fetchone()
-    if row is None:
-        return State()
-    payload = json.loads(row[0])
+def _state_from_blob(blob: str) -> State:
+    payload = codec.loads(blob)
     return State(
         goals=list(payload.get("goals", [])),
         constraints=list(payload.get("constraints", [])),
@@ -88,19 +447,155 @@ def load(task_id: str) -> State:
     )
 
 
-def save(task_id: str, state: State) -> None:
-    """Persist state for a task_id, applying caps before writing."""
-    capped = _apply_caps(state)
-    blob = json.dumps(asdict(capped), ensure_ascii=False)
-    with _get_connection() as conn:
-        conn.execute(
-            "INSERT INTO state(task_id, blob) VALUES (?, ?)"
-            " ON CONFLICT(task_id) DO UPDATE SET blob=excluded.blob",
-            (task_id, blob),
-        )
-        conn.commit()
+# Optional remote backend (see src.state.service). When set, the persistence
+# functions below forward to the state server instead of the local database,
+# and the in-process cache is bypassed because other hosts write too.
+_remote = None
+
+
+def use_server(address: Optional[str]) -> None:
+    """Route load/save (and history) calls to a state server; ``None`` reverts to local."""
+    global _remote
+    if _remote is not None:
+        _remote.close()
+        _remote = None
+    if address:
+        from src.state.service import StateClient
+
+        _remote = StateClient(address)
 
 
+def _remote_backend():
+    # Threads serving requests (src.state.service) always use the local DB,
+    # even when the server runs inside a process that is itself a client.
+    if _remote is None or getattr(_local, "serving", False):
+        return None
+    return _remote
+
+
+@tracing.traced("state.load")
+def load(task_id: str) -> State:
+    """Load state for a task_id, or return a default empty State."""
+    remote = _remote_backend()
+    if remote is not None:
+        return remote.load(task_id)
+    path = _db_path()
+    key = (str(path), task_id)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+    wb = _active_write_behind(path)
+    blob = wb.lookup(task_id) if wb is not None else None
+    if blob is None:
+        conn = _get_connection(path)
+        row = conn.execute(_SELECT_STATE, (task_id,)).fetchone()
+        if row is None:
+            return State()
+        blob = row[0]
+    state = _state_from_blob(blob)
+    _cache.put(key, state)
+    return state
+
+
+@tracing.traced("state.save")
+def save(task_id: str, state: State) -> None:
+    """Persist state for a task_id, applying caps before writing.
+
+    With write-behind enabled the write is queued and committed in the
+    background; see ``enable_write_behind``.
+    """
+    remote = _remote_backend()
+    if remote is not None:
+        remote.save(task_id, state)
+        return
+    capped = _apply_caps(state)
+    blob = codec.dumps(asdict(capped))
+    path = _db_path()
+    wb = _active_write_behind(path)
+    if wb is not None:
+        wb.submit(task_id, blob)
+    else:
+        conn = _get_connection(path)
+        with conn:
+            conn.execute(_UPSERT_STATE, (task_id, blob))
+    # Write-through: the next load for this task skips SQLite and JSON.
+    _cache.put((str(path), task_id), capped)
+
+
+@tracing.traced("state.load_many")
+def load_many(task_ids: Iterable[str]) -> Dict[str, State]:
+    """Load states for many task_ids in as few queries as possible.
+
+    Cached and write-behind entries are served in-process; the rest are read
+    with chunked ``IN (...)`` queries. Unknown task_ids map to an empty State.
+    """
+    remote = _remote_backend()
+    if remote is not None:
+        return remote.load_many(task_ids)
+    path = _db_path()
+    db_key = str(path)
+    result: Dict[str, State] = {}
+    missing: List[str] = []
+    wb = _active_write_behind(path)
+    for task_id in dict.fromkeys(task_ids):
+        cached = _cache.get((db_key, task_id))
+        if cached is not None:
+            result[task_id] = cached
+            continue
+        blob = wb.lookup(task_id) if wb is not None else None
+        if blob is not None:
+            result[task_id] = _state_from_blob(blob)
+            _cache.put((db_key, task_id), result[task_id])
+            continue
+        missing.append(task_id)
+
+    if missing:
+        conn = _get_connection(path)
+        for start in range(0, len(missing), _IN_CHUNK_SIZE):
+            chunk = missing[start : start + _IN_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT task_id, blob FROM state WHERE task_id IN ({placeholders})", chunk
+            )
+            for task_id, blob in rows:
+                state = _state_from_blob(blob)
+                result[task_id] = state
+                _cache.put((db_key, task_id), state)
+        for task_id in missing:
+            result.setdefault(task_id, State())
+    return result
+
+
+@tracing.traced("state.save_many")
+def save_many(states: Mapping[str, State]) -> None:
+    """Persist many states in a single transaction (or one write-behind batch)."""
+    remote = _remote_backend()
+    if remote is not None:
+        remote.save_many(states)
+        return
+    rows: List[Tuple[str, str]] = []
+    capped_states: Dict[str, State] = {}
+    for task_id, state in states.items():
+        capped = _apply_caps(state)
+        capped_states[task_id] = capped
+        rows.append((task_id, codec.dumps(asdict(capped))))
+    if not rows:
+        return
+    path = _db_path()
+    wb = _active_write_behind(path)
+    if wb is not None:
+        for task_id, blob in rows:
+            wb.submit(task_id, blob)
+    else:
+        conn = _get_connection(path)
+        with conn:
+            conn.executemany(_UPSERT_STATE, rows)
+    db_key = str(path)
+    for task_id, capped in capped_states.items():
+        _cache.put((db_key, task_id), capped)
+
+
+@tracing.traced("state.merge")
 def merge(existing: State, update: State) -> State:
     """Merge two states, extending list fields and overriding next_focus.
 
@@ -119,28 +614,245 @@ def merge(existing: State, update: State) -> State:
     return _apply_caps(merged)
 
 
-def render(state: State) -> str:
-    """Render state as a compact, human-readable block for prompts."""
-    parts = []
-    if state.goals:
-        parts.append("Goals:\n" + "\n".join(f"- {g}" for g in state.goals))
-    if state.constraints:
-        parts.append("Constraints:\n" + "\n".join(f"- {c}" for c in state.constraints))
-    if state.decisions:
-        parts.append("Decisions:\n" + "\n".join(f"- {d}" for d in state.decisions))
-    if state.hypotheses:
-        parts.append("Hypotheses:\n" + "\n".join(f"- {h}" for h in state.hypotheses))
-    if state.history:
-        parts.append("History:\n" + "\n".join(f"- {h}" for h in state.history))
-    if state.open_issues:
-        parts.append("Open issues:\n" + "\n".join(f"- {i}" for i in state.open_issues))
+_merge_lock = threading.Lock()
+
+
+def merge_update(task_id: str, update: State) -> State:
+    """Merge ``update`` into the stored state of ``task_id``, save and return it.
+
+    The read-modify-write is atomic within the process, and with a state
+    server it runs on the server, so concurrent actors on several hosts do
+    not lose each other's updates.
+    """
+    remote = _remote_backend()
+    if remote is not None:
+        return remote.merge(task_id, update)
+    with _merge_lock:
+        merged = merge(load(task_id), update)
+        save(task_id, merged)
+    return merged
+
+
+# Per-step history: every recorded version is stored as a delta against the
+# previous one, with a full snapshot every _SNAPSHOT_INTERVAL versions so
+# reconstruction never replays more than that many deltas.
+_SNAPSHOT_INTERVAL = 8
+_LIST_FIELDS = ("goals", "constraints", "decisions", "hypotheses", "history", "open_issues")
+
+_SELECT_HISTORY_SPAN = (
+    "SELECT step, kind, blob FROM state_history"
+    " WHERE task_id = ? AND step <= ? AND step >= COALESCE("
+    "  (SELECT MAX(step) FROM state_history"
+    "   WHERE task_id = ? AND step <= ? AND kind = 'full'), 0)"
+    " ORDER BY step"
+)
+_INSERT_HISTORY = "INSERT OR REPLACE INTO state_history(task_id, step, kind, blob) VALUES (?, ?, ?, ?)"
+_SELECT_LATEST_HISTORY = "SELECT step, blob FROM state_history WHERE task_id = ? ORDER BY step DESC LIMIT 1"
+
+# Last recorded (step, state, deltas since snapshot, stored blob) per (db
+# path, task_id), so recording a step does not have to reconstruct the
+# previous version. It is checked against the latest stored row first.
+_history_tail: "OrderedDict[Tuple[str, str], Tuple[int, State, int, str]]" = OrderedDict()
+_history_lock = threading.Lock()
+
+
+def _diff_list(old: List[str], new: List[str]) -> Optional[Dict[str, object]]:
+    if old == new:
+        return None
+    # merge() appends and the caps drop from the front, so most changes are
+    # "drop k leading items, append a tail".
+    for drop in range(len(old) + 1):
+        kept = old[drop:]
+        if new[: len(kept)] == kept:
+            return {"drop": drop, "add": new[len(kept):]}
+    return {"set": list(new)}  # pragma: no cover - the loop always matches at drop=len(old)
+
+
+def _state_delta(old: State, new: State) -> Dict[str, object]:
+    delta: Dict[str, object] = {}
+    for name in _LIST_FIELDS:
+        change = _diff_list(getattr(old, name), getattr(new, name))
+        if change is not None:
+            delta[name] = change
+    if old.next_focus != new.next_focus:
+        delta["next_focus"] = new.next_focus
+    return delta
+
+
+def _apply_delta(state: State, delta: Dict[str, object]) -> State:
+    result = _copy_state(state)
+    for name in _LIST_FIELDS:
+        change = delta.get(name)
+        if not isinstance(change, dict):
+            continue
+        if "set" in change:
+            setattr(result, name, list(change["set"]))
+        else:
+            current = getattr(result, name)[int(change.get("drop", 0)) :]
+            setattr(result, name, current + list(change.get("add", [])))
+    if "next_focus" in delta:
+        result.next_focus = str(delta["next_focus"])
+    return result
+
+
+def _reconstruct(conn: sqlite3.Connection, task_id: str, step: int) -> Optional[Tuple[int, State, int]]:
+    """Return (version step, state, deltas since snapshot) for the latest version <= step."""
+    rows = conn.execute(_SELECT_HISTORY_SPAN, (task_id, step, task_id, step)).fetchall()
+    if not rows:
+        return None
+    state = State()
+    deltas = 0
+    for _, kind, blob in rows:
+        if kind == "full":
+            state = _state_from_blob(blob)
+            deltas = 0
+        else:
+            state = _apply_delta(state, codec.loads(blob))
+            deltas += 1
+    return rows[-1][0], state, deltas
+
+
+@tracing.traced("state.record_step")
+def record_step(task_id: str, step: int, state: State) -> None:
+    """Append the state reached after ``step`` to the task's history.
+
+    Steps must be recorded in increasing order; re-recording the latest step
+    replaces it.
+    """
+    remote = _remote_backend()
+    if remote is not None:
+        remote.record_step(task_id, step, state)
+        return
+    capped = _apply_caps(state)
+    path = _db_path()
+    conn = _get_connection(path)
+    key = (str(path), task_id)
+    with _history_lock:
+        # Hold the write lock from reading the latest version to writing the
+        # next one, so another process cannot record in between.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            latest = conn.execute(_SELECT_LATEST_HISTORY, (task_id,)).fetchone()
+            if latest is not None and latest[0] > step:
+                raise ValueError(f"step {step} is older than recorded step {latest[0]} for {task_id}")
+            tail = _history_tail.get(key)
+            # The cached version is only a valid base if it is still the
+            # latest row, byte for byte; another process may have recorded
+            # (or re-recorded) a step since.
+            if tail is None or latest is None or tuple(latest) != (tail[0], tail[3]) or tail[0] >= step:
+                found = _reconstruct(conn, task_id, step - 1)
+                tail = None if found is None else (*found, "")
+
+            if tail is None or tail[2] + 1 >= _SNAPSHOT_INTERVAL:
+                kind, blob, since_full = "full", codec.dumps(asdict(capped)), 0
+            else:
+                kind, blob, since_full = "delta", codec.dumps(_state_delta(tail[1], capped)), tail[2] + 1
+            conn.execute(_INSERT_HISTORY, (task_id, int(step), kind, blob))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        _history_tail[key] = (int(step), capped, since_full, blob)
+        _history_tail.move_to_end(key)
+        while len(_history_tail) > _DEFAULT_CACHE_ENTRIES:
+            _history_tail.popitem(last=False)
+
+
+@tracing.traced("state.load_at")
+def load_at(task_id: str, step: int) -> State:
+    """Reconstruct the state as recorded after ``step`` (empty before the first)."""
+    remote = _remote_backend()
+    if remote is not None:
+        return remote.load_at(task_id, step)
+    found = _reconstruct(_get_connection(), task_id, step)
+    return found[1] if found is not None else State()
+
+
+def history_steps(task_id: str) -> List[int]:
+    """Return the steps recorded for ``task_id`` in ascending order."""
+    remote = _remote_backend()
+    if remote is not None:
+        return remote.history_steps(task_id)
+    rows = _get_connection().execute(
+        "SELECT step FROM state_history WHERE task_id = ? ORDER BY step", (task_id,)
+    )
+    return [int(step) for (step,) in rows]
+
+
+# Sections in display order with their priority; when a rendered state goes
+# over its token budget the lowest-priority sections are dropped first.
+_RENDER_SECTIONS = (
+    ("goals", "Goals", 6),
+    ("constraints", "Constraints", 4),
+    ("decisions", "Decisions", 1),
+    ("hypotheses", "Hypotheses", 0),
+    ("history", "History", 2),
+    ("open_issues", "Open issues", 3),
+)
+_NEXT_FOCUS_PRIORITY = 5
+_RENDER_TOKEN_BUDGET = 1024
+_CHARS_PER_TOKEN = 4
+_RENDER_CACHE_ENTRIES = 1024
+
+_render_cache: "OrderedDict[Tuple[object, ...], str]" = OrderedDict()
+_render_lock = threading.Lock()
+
+
+def approx_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token for English and code)."""
+    return -(-len(text) // _CHARS_PER_TOKEN)
+
+
+def _render_uncached(state: State, max_tokens: Optional[int]) -> str:
+    sections: List[Tuple[int, str]] = []
+    for name, title, priority in _RENDER_SECTIONS:
+        items = getattr(state, name)
+        if items:
+            sections.append((priority, f"{title}:\n" + "\n".join(f"- {item}" for item in items)))
     if state.next_focus:
-        parts.append("Next focus:\n" + state.next_focus)
-    return "\n\n".join(parts).strip()
+        sections.append((_NEXT_FOCUS_PRIORITY, "Next focus:\n" + state.next_focus))
+
+    text = "\n\n".join(body for _, body in sections).strip()
+    if max_tokens is None or approx_tokens(text) <= max_tokens:
+        return text
+
+    for dropped in sorted(range(len(sections)), key=lambda i: sections[i][0])[:-1]:
+        sections[dropped] = (sections[dropped][0], "")
+        text = "\n\n".join(body for _, body in sections if body).strip()
+        if approx_tokens(text) <= max_tokens:
+            return text
+    # Only the highest-priority section is left and it is still too long.
+    return text[: max(0, max_tokens) * _CHARS_PER_TOKEN].rstrip()
 
 
-def _cli_dump(task_id: str) -> None:
-    state = load(task_id)
+def render(state: State, *, max_tokens: Optional[int] = _RENDER_TOKEN_BUDGET) -> str:
+    """Render state as a compact, human-readable block for prompts.
+
+    The output stays within ``max_tokens`` (by ``approx_tokens``) by dropping
+    whole sections, lowest priority first; ``None`` disables the budget.
+    Results are cached by state content.
+    """
+    key = (
+        tuple(tuple(getattr(state, name)) for name, _, _ in _RENDER_SECTIONS),
+        state.next_focus,
+        max_tokens,
+    )
+    with _render_lock:
+        text = _render_cache.get(key)
+        if text is not None:
+            _render_cache.move_to_end(key)
+            return text
+    text = _render_uncached(state, max_tokens)
+    with _render_lock:
+        _render_cache[key] = text
+        if len(_render_cache) > _RENDER_CACHE_ENTRIES:
+            _render_cache.popitem(last=False)
+    return text
+
+
+def _cli_dump(task_id: str, step: Optional[int] = None) -> None:
+    state = load(task_id) if step is None else load_at(task_id, step)
     print(render(state))
 
 
@@ -150,10 +862,16 @@ def main(argv: list[str] | None = None) -> None:
 
     dump_parser = subparsers.add_parser("dump", help="Dump state for a task_id")
     dump_parser.add_argument("task_id")
+    dump_parser.add_argument(
+        "--step",
+        type=int,
+        default=None,
+        help="Dump the state recorded after this step instead of the latest state.",
+    )
 
     args = parser.parse_args(argv)
     if args.command == "dump":
-        _cli_dump(args.task_id)
+        _cli_dump(args.task_id, args.step)
 
 
 if __name__ == "__main__":
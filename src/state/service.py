@@ -0,0 +1,284 @@
+"""Serve task state over a Unix or TCP socket so actors on several hosts can share it.
+
+The server wraps ``src.state.manager`` in one process that owns the SQLite
+database; clients talk to it with newline-delimited JSON:
+
+    request:  {"id": 7, "op": "load", "task_id": "t1"}
+    response: {"id": 7, "ok": true, "result": {...state...}}
+
+Requests on one connection are answered in order, so a client may write a
+batch of requests before reading any response (``StateClient.pipeline``).
+Addresses are ``unix:/path/to.sock`` or ``host:port``.
+
+    python -m src.state.service --listen 127.0.0.1:7077
+    python -m src.actors.actor_loop tasks.jsonl --state-server 127.0.0.1:7077
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import socketserver
+import threading
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+from src.data import codec
+from src.state import manager
+
+
+Address = Union[str, Tuple[str, int]]
+
+
+class StateServiceError(RuntimeError):
+    """Raised by ``StateClient`` when the server rejects a request."""
+
+
+def parse_address(address: str) -> Address:
+    """Return a Unix socket path or a ``(host, port)`` tuple."""
+    if address.startswith("unix:"):
+        return address[len("unix:") :]
+    host, sep, port = address.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError(f"Expected unix:/path or host:port, got {address!r}")
+    return (host or "127.0.0.1", int(port))
+
+
+def _state(data: Mapping[str, Any]) -> manager.State:
+    return manager.State(**{k: v for k, v in data.items() if k in manager.State.__dataclass_fields__})
+
+
+def _op_merge(req: Mapping[str, Any]) -> Dict[str, Any]:
+    # merge_update serializes the read-modify-write server-wide; this is what
+    # lets concurrent actors append to the same task without losing updates.
+    return asdict(manager.merge_update(str(req["task_id"]), _state(req["update"])))
+
+
+_OPS: Dict[str, Callable[[Mapping[str, Any]], Any]] = {
+    "ping": lambda req: "pong",
+    "load": lambda req: asdict(manager.load(str(req["task_id"]))),
+    "save": lambda req: manager.save(str(req["task_id"]), _state(req["state"])),
+    "merge": _op_merge,
+    "load_many": lambda req: {k: asdict(v) for k, v in manager.load_many(req["task_ids"]).items()},
+    "save_many": lambda req: manager.save_many({k: _state(v) for k, v in req["states"].items()}),
+    "record_step": lambda req: manager.record_step(str(req["task_id"]), int(req["step"]), _state(req["state"])),
+    "load_at": lambda req: asdict(manager.load_at(str(req["task_id"]), int(req["step"]))),
+    "history_steps": lambda req: manager.history_steps(str(req["task_id"])),
+}
+
+
+def _dispatch(line: bytes) -> bytes:
+    req_id = None
+    try:
+        req = codec.loads(line)
+        req_id = req.get("id")
+        op = _OPS.get(req.get("op"))
+        if op is None:
+            raise ValueError(f"Unknown op: {req.get('op')!r}")
+        response = {"id": req_id, "ok": True, "result": op(req)}
+    except Exception as exc:  # reported to the client, the connection stays up
+        response = {"id": req_id, "ok": False, "error": f"{type(exc).__name__}: {exc}"}
+    return codec.dumpb(response) + b"\n"
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def setup(self) -> None:
+        super().setup()
+        manager._local.serving = True
+        if self.connection.family != getattr(socket, "AF_UNIX", None):
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if line.strip():
+                self.wfile.write(_dispatch(line))
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class StateServer:
+    """Threaded state server; ``start()`` runs it in the background."""
+
+    def __init__(self, address: Address):
+        if isinstance(address, str):
+            path = Path(address)
+            if path.exists():
+                path.unlink()
+            self._server: socketserver.BaseServer = _UnixServer(str(path), _Handler)
+        else:
+            self._server = _TCPServer(address, _Handler)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        """Bound address in ``parse_address`` form (resolves port 0)."""
+        addr = self._server.server_address
+        if isinstance(addr, (str, bytes)):
+            return "unix:" + (addr.decode() if isinstance(addr, bytes) else addr)
+        return f"{addr[0]}:{addr[1]}"
+
+    def start(self) -> "StateServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="state-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        addr = self._server.server_address
+        if isinstance(addr, str) and os.path.exists(addr):
+            os.unlink(addr)
+
+
+class StateClient:
+    """Client for ``StateServer`` with the ``manager`` load/save API.
+
+    One socket is shared by all threads of a process and reconnected after
+    ``fork()``; each call (or pipeline) holds it for one round trip.
+    """
+
+    def __init__(self, address: Union[str, Tuple[str, int]], *, timeout: float = 30.0):
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._rfile: Any = None
+        self._pid = 0
+        self._next_id = 0
+
+    def _connect(self) -> None:
+        if isinstance(self.address, str):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(self.timeout)
+        sock.connect(self.address)
+        self._sock = sock
+        self._rfile = sock.makefile("rb")
+        self._pid = os.getpid()
+
+    def _drop(self) -> None:
+        if self._sock is not None:
+            self._rfile.close()
+            self._sock.close()
+        self._sock = None
+        self._rfile = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._drop()
+
+    def pipeline(self, requests: Iterable[Mapping[str, Any]]) -> List[Any]:
+        """Send all requests in one write, then read their results in order."""
+        reqs = list(requests)
+        if not reqs:
+            return []
+        with self._lock:
+            if self._sock is None or self._pid != os.getpid():
+                self._connect()
+            payload = bytearray()
+            ids = []
+            for req in reqs:
+                self._next_id += 1
+                ids.append(self._next_id)
+                payload += codec.dumpb({**req, "id": self._next_id}) + b"\n"
+            try:
+                self._sock.sendall(payload)  # type: ignore[union-attr]
+                lines = [self._rfile.readline() for _ in reqs]
+            except OSError:
+                self._drop()
+                raise
+        results: List[Any] = []
+        for req_id, line in zip(ids, lines):
+            if not line:
+                with self._lock:
+                    self._drop()
+                raise StateServiceError("Connection closed by state server")
+            response = codec.loads(line)
+            if response.get("id") != req_id:
+                raise StateServiceError(f"Out-of-order response: expected {req_id}, got {response.get('id')}")
+            if not response.get("ok"):
+                raise StateServiceError(str(response.get("error")))
+            results.append(response.get("result"))
+        return results
+
+    def _call(self, op: str, **fields: Any) -> Any:
+        return self.pipeline([{"op": op, **fields}])[0]
+
+    def ping(self) -> bool:
+        return self._call("ping") == "pong"
+
+    def load(self, task_id: str) -> manager.State:
+        return _state(self._call("load", task_id=task_id))
+
+    def save(self, task_id: str, state: manager.State) -> None:
+        self._call("save", task_id=task_id, state=asdict(state))
+
+    def merge(self, task_id: str, update: manager.State) -> manager.State:
+        """Atomically merge ``update`` into the stored state and return the result."""
+        return _state(self._call("merge", task_id=task_id, update=asdict(update)))
+
+    def load_many(self, task_ids: Iterable[str]) -> Dict[str, manager.State]:
+        result = self._call("load_many", task_ids=list(dict.fromkeys(task_ids)))
+        return {k: _state(v) for k, v in result.items()}
+
+    def save_many(self, states: Mapping[str, manager.State]) -> None:
+        self._call("save_many", states={k: asdict(v) for k, v in states.items()})
+
+    def record_step(self, task_id: str, step: int, state: manager.State) -> None:
+        self._call("record_step", task_id=task_id, step=step, state=asdict(state))
+
+    def load_at(self, task_id: str, step: int) -> manager.State:
+        return _state(self._call("load_at", task_id=task_id, step=step))
+
+    def history_steps(self, task_id: str) -> List[int]:
+        return list(self._call("history_steps", task_id=task_id))
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.state.service")
+    parser.add_argument(
+        "--listen",
+        default="127.0.0.1:7077",
+        help="unix:/path/to.sock or host:port to listen on (default: 127.0.0.1:7077).",
+    )
+    parser.add_argument(
+        "--write-behind",
+        action="store_true",
+        help="Group-commit saves in the background (see manager.enable_write_behind).",
+    )
+    args = parser.parse_args(argv)
+
+    server = StateServer(parse_address(args.listen))
+    if args.write_behind:
+        manager.enable_write_behind()
+    # The server is the only process writing its database.
+    manager.configure_cache()
+    print(f"State server listening on {server.address} (db: {manager._db_path()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.disable_write_behind()
+
+
+if __name__ == "__main__":
+    main()
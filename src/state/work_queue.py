@@ -0,0 +1,367 @@
+"""Lease-based task queue shared by actor and teacher processes.
+
+Tasks live in one SQLite file. A worker *leases* a batch of tasks: each
+leased row gets a fresh token and an expiry ``visibility_timeout`` seconds
+ahead, during which no other worker can lease it. The worker ``ack``s a task
+when its step is done, or ``release``s it to hand it back. A lease that
+expires, because its worker crashed or hung, makes the task leasable again,
+so work is never lost; a task whose lease lapsed ``max_attempts`` times is
+parked as ``failed`` instead of being retried forever.
+
+Acks and renewals only apply while the caller's token is current, so a
+worker that lost a lease cannot complete or extend someone else's. Delivery
+is at-least-once: a step that outlives its lease may run twice, once per
+holder, but only the current holder's ack counts. ``drain`` renews every
+lease it holds from a heartbeat thread, so only a worker that died or hung
+loses its tasks.
+
+A task_id may appear on several lines of a manifest (one line per step of a
+multi-step task); the n-th line with a given task_id is queued as its n-th
+item. An item is only leased once every earlier item of its task is done,
+so the steps of one task never run concurrently or out of order, even
+across workers. Enqueueing the same manifest again adds nothing, so every
+worker can enqueue it at startup.
+
+    python -m src.state.work_queue --queue data/queue.sqlite3 enqueue tasks.jsonl
+    python -m src.actors.actor_loop --queue data/queue.sqlite3    # on every worker
+    python -m src.state.work_queue --queue data/queue.sqlite3 stats
+
+Like the state DB, the queue file must be on a local disk shared by the
+worker processes (not NFS).
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional
+
+from src.data import codec
+from src.data.schemas import repo_root
+
+
+_BUSY_TIMEOUT_MS = 30_000
+_VISIBILITY_TIMEOUT_SEC = 600.0
+_MAX_ATTEMPTS = 3
+
+_CREATE_TASKS_TABLE = (
+    "CREATE TABLE IF NOT EXISTS tasks ("
+    "seq INTEGER PRIMARY KEY, "
+    "task_id TEXT NOT NULL, "
+    "occurrence INTEGER NOT NULL DEFAULT 0, "
+    "payload TEXT NOT NULL, "
+    "status TEXT NOT NULL DEFAULT 'pending', "
+    "token TEXT, "
+    "lease_until REAL, "
+    "attempts INTEGER NOT NULL DEFAULT 0, "
+    "updated REAL, "
+    "UNIQUE(task_id, occurrence))"
+)
+_CREATE_STATUS_INDEX = "CREATE INDEX IF NOT EXISTS tasks_status ON tasks(status, lease_until)"
+_STATUSES = ("pending", "leased", "done", "failed")
+
+
+def default_path() -> Path:
+    return repo_root() / "data" / "queue.sqlite3"
+
+
+@dataclass
+class Lease:
+    task: Dict[str, Any]
+    token: str
+    lease_until: float
+    attempt: int
+
+    @property
+    def task_id(self) -> str:
+        return str(self.task["task_id"])
+
+
+class WorkQueue:
+    """Handle on a queue file; safe to share between threads of one process."""
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        visibility_timeout: float = _VISIBILITY_TIMEOUT_SEC,
+        max_attempts: int = _MAX_ATTEMPTS,
+    ):
+        self.path = Path(path)
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max(1, max_attempts)
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        # Per thread, and never reused across fork(), as in the state manager.
+        if getattr(self._local, "pid", None) != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={_BUSY_TIMEOUT_MS}")
+            conn.execute(_CREATE_TASKS_TABLE)
+            conn.execute(_CREATE_STATUS_INDEX)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def enqueue(self, tasks: Iterable[Mapping[str, Any]]) -> int:
+        """Add tasks and return how many were new.
+
+        Repeats of a task_id within ``tasks`` are queued as further items of
+        that task; items already in the queue (in any status) are ignored.
+        """
+        now = time.time()
+        seen: Dict[str, int] = {}
+
+        def _rows() -> Iterable[tuple]:
+            for task in tasks:
+                task_id = str(task["task_id"])
+                occurrence = seen[task_id] = seen.get(task_id, -1) + 1
+                yield (task_id, occurrence, codec.dumps(task), now)
+
+        rows = _rows()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks(task_id, occurrence, payload, updated) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            added = conn.total_changes - before
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def lease(self, count: int = 1) -> List[Lease]:
+        """Lease up to ``count`` tasks in enqueue order (pending or lapsed leases).
+
+        Items whose task has an earlier item that is not done yet are skipped.
+        """
+        now = time.time()
+        lease_until = now + self.visibility_timeout
+        conn = self._conn()
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers can
+        # never select the same rows.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE tasks SET status = 'failed', token = NULL, updated = ? "
+                "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            rows = conn.execute(
+                "SELECT seq, payload, attempts FROM tasks "
+                "WHERE (status = 'pending' OR (status = 'leased' AND lease_until < ?)) "
+                "AND NOT EXISTS (SELECT 1 FROM tasks AS prev WHERE prev.task_id = tasks.task_id "
+                "AND prev.occurrence < tasks.occurrence AND prev.status != 'done') "
+                "ORDER BY seq LIMIT ?",
+                (now, max(1, count)),
+            ).fetchall()
+            leases = []
+            for seq, payload, attempts in rows:
+                token = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE tasks SET status = 'leased', token = ?, lease_until = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE seq = ?",
+                    (token, lease_until, now, seq),
+                )
+                leases.append(Lease(codec.loads(payload), token, lease_until, attempts + 1))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return leases
+
+    def _update_held(self, lease: Lease, assignments: str, params: tuple) -> bool:
+        # Tokens are unique per lease, so they identify the row.
+        cur = self._conn().execute(
+            f"UPDATE tasks SET {assignments}, updated = ? WHERE token = ? AND status = 'leased'",
+            (*params, time.time(), lease.token),
+        )
+        return cur.rowcount == 1
+
+    def extend(self, lease: Lease) -> bool:
+        """Push the lease's expiry out by another visibility timeout.
+
+        Returns False when the lease was lost (it lapsed and another worker
+        took the task), in which case the caller should drop the task.
+        """
+        lease_until = time.time() + self.visibility_timeout
+        if not self._update_held(lease, "lease_until = ?", (lease_until,)):
+            return False
+        lease.lease_until = lease_until
+        return True
+
+    def extend_many(self, leases: Iterable[Lease]) -> List[Lease]:
+        """Extend several leases in one transaction; return the ones lost."""
+        lease_until = time.time() + self.visibility_timeout
+        lost = []
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for lease in leases:
+                if self._update_held(lease, "lease_until = ?", (lease_until,)):
+                    lease.lease_until = lease_until
+                else:
+                    lost.append(lease)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return lost
+
+    def ack(self, lease: Lease) -> bool:
+        """Mark the task done; False if the lease had already been lost."""
+        return self._update_held(lease, "status = 'done', token = NULL", ())
+
+    def release(self, lease: Lease, *, attempted: bool = True) -> bool:
+        """Return the task to the queue right away; after ``max_attempts`` it is parked as failed.
+
+        With ``attempted=False`` (the task never ran) the lease does not
+        count against the task's attempts.
+        """
+        if not attempted:
+            return self._update_held(lease, "status = 'pending', attempts = attempts - 1, token = NULL", ())
+        return self._update_held(
+            lease,
+            "status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, token = NULL",
+            (self.max_attempts,),
+        )
+
+    def stats(self) -> Dict[str, int]:
+        counts = dict.fromkeys(_STATUSES, 0)
+        for status, count in self._conn().execute("SELECT status, COUNT(*) FROM tasks GROUP BY status"):
+            counts[status] = count
+        return counts
+
+    def retry_failed(self) -> int:
+        """Move failed tasks back to pending with a fresh attempt budget."""
+        cur = self._conn().execute(
+            "UPDATE tasks SET status = 'pending', attempts = 0, updated = ? WHERE status = 'failed'",
+            (time.time(),),
+        )
+        return cur.rowcount
+
+    def drain(
+        self,
+        run: Callable[[Dict[str, Any]], None],
+        *,
+        batch_size: int = 1,
+        on_batch: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        poll_interval: Optional[float] = None,
+    ) -> int:
+        """Lease and run tasks until none are pending or leased; return how many this worker acked.
+
+        ``on_batch`` sees each leased batch before it runs (for example to
+        prefetch state). A heartbeat thread renews every lease of the batch
+        that has not finished each third of the visibility timeout, so tasks
+        waiting behind slow steps are not reclaimed by other workers. While
+        other workers still hold leases this worker keeps polling, so it
+        picks up their tasks if they crash. If ``run`` raises, the task is
+        released, the rest of the batch is handed back without using up an
+        attempt, and the error propagates.
+        """
+        if poll_interval is None:
+            poll_interval = min(5.0, self.visibility_timeout / 4)
+        completed = 0
+        held: List[Lease] = []
+        held_lock = threading.Lock()
+        stop = threading.Event()
+
+        def _heartbeat() -> None:
+            while not stop.wait(self.visibility_timeout / 3):
+                with held_lock:
+                    leases = list(held)
+                if leases:
+                    self.extend_many(leases)
+            self.close()
+
+        heartbeat = threading.Thread(target=_heartbeat, name="work-queue-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            while True:
+                leases = self.lease(batch_size)
+                if not leases:
+                    if not self.stats()["leased"]:
+                        return completed
+                    time.sleep(poll_interval)
+                    continue
+                with held_lock:
+                    held[:] = leases
+                if on_batch is not None:
+                    on_batch([lease.task for lease in leases])
+                for i, lease in enumerate(leases):
+                    if not self.extend(lease):
+                        with held_lock:
+                            held.remove(lease)
+                        continue
+                    try:
+                        run(lease.task)
+                    except BaseException:
+                        with held_lock:
+                            held.clear()
+                        self.release(lease)
+                        for rest in leases[i + 1 :]:
+                            self.release(rest, attempted=False)
+                        raise
+                    with held_lock:
+                        held.remove(lease)
+                    completed += int(self.ack(lease))
+        finally:
+            stop.set()
+            heartbeat.join()
+
+    def close(self) -> None:
+        """Close this thread's connection (it reopens on next use)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "pid", None) == os.getpid():
+            conn.close()
+        self._local.pid = None
+
+
+def _iter_jsonl(path: Path) -> Iterable[Dict[str, Any]]:
+    with path.open("rb") as fh:
+        for line in fh:
+            if line.strip():
+                yield codec.loads(line)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.state.work_queue")
+    parser.add_argument(
+        "--queue",
+        type=Path,
+        default=None,
+        help="Queue database (default: data/queue.sqlite3).",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    enqueue_parser = subparsers.add_parser("enqueue", help="Add the tasks of a JSONL file")
+    enqueue_parser.add_argument("tasks_path")
+    subparsers.add_parser("stats", help="Print task counts by status")
+    subparsers.add_parser("retry-failed", help="Re-queue tasks that ran out of attempts")
+    args = parser.parse_args(argv)
+
+    queue = WorkQueue(args.queue or default_path())
+    if args.command == "enqueue":
+        path = Path(args.tasks_path)
+        if not path.exists():
+            raise SystemExit(f"Tasks file not found: {path}")
+        print(f"enqueued={queue.enqueue(_iter_jsonl(path))}")
+    elif args.command == "retry-failed":
+        print(f"requeued={queue.retry_failed()}")
+    stats = queue.stats()
+    print(" ".join(f"{status}={stats[status]}" for status in _STATUSES))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""Resumable, concurrent batch runner for teacher steps.
+
+Runs ``srl_teacher.run_teacher_step`` over a tasks JSONL file with a fixed
+number of worker threads and writes the trajectory records to sharded
+outputs under ``--output-dir``:
+
+    <output-dir>/shard-000.jsonl ... shard-<N-1>.jsonl
+    <output-dir>/ledger.jsonl        one line per finished step
+
+A task_id may appear on several lines; its n-th line is step n, passed to
+the step function because the records go to the shards rather than the
+per-task trajectory file the step would otherwise be counted from. Steps
+of one task run one after another in file order.
+
+Each shard is written by one step at a time. After a step's record is
+flushed, a ledger line ``{"task_id", "step", "shard", "end"}`` records the
+shard's size. On restart the ledger is replayed: finished steps are skipped and
+every shard is truncated back to its last recorded ``end`` (including shards
+of a previous run with more workers), which drops records of tasks that were
+in flight when the previous run died, so no trajectory line is duplicated. (State merges of those tasks are not rolled
+back.)
+
+    python -m src.teachers.batch_runner tasks.jsonl --workers 16 --output-dir trajectories/batches/run1
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Mapping, Optional, Set, Tuple
+
+from src.actors.vllm_client import MultiActorClient
+from src.data import codec
+from src.data.schemas import repo_root
+from src.state import manager as state_manager
+from src.teachers import srl_teacher
+
+
+_LEDGER_NAME = "ledger.jsonl"
+_REPORT_INTERVAL_SEC = 30.0
+
+
+def _default_output_dir(tasks_path: Path) -> Path:
+    return repo_root() / "trajectories" / "batches" / tasks_path.stem
+
+
+def _shard_path(output_dir: Path, shard: int) -> Path:
+    return output_dir / f"shard-{shard:03d}.jsonl"
+
+
+def _truncate_idle_shards(output_dir: Path, ends: Mapping[int, int], active: int) -> None:
+    """Truncate shards this run will not open to their last ledger ``end``.
+
+    A previous run with more workers left shards past ``active``; records of
+    its in-flight tasks there would otherwise be duplicated when those tasks
+    rerun on the remaining shards. A shard with no ledger entry is emptied.
+    """
+    for path in output_dir.glob("shard-*.jsonl"):
+        try:
+            index = int(path.stem.partition("-")[2])
+        except ValueError:
+            continue
+        if index >= active:
+            with path.open("ab") as fh:
+                fh.truncate(ends.get(index, 0))
+
+
+def read_ledger(output_dir: Path) -> Tuple[Set[Tuple[str, int]], Dict[int, int]]:
+    """Return finished ``(task_id, step)`` pairs and the committed size of each shard.
+
+    A torn final line (crash during the ledger write) is ignored.
+    """
+    done: Set[Tuple[str, int]] = set()
+    ends: Dict[int, int] = {}
+    path = output_dir / _LEDGER_NAME
+    if not path.exists():
+        return done, ends
+    with path.open("rb") as fh:
+        for line in fh:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entry = codec.loads(line)
+            except ValueError:
+                continue
+            done.add((str(entry["task_id"]), int(entry.get("step", 1))))
+            shard = int(entry["shard"])
+            ends[shard] = max(ends.get(shard, 0), int(entry["end"]))
+    return done, ends
+
+
+@dataclass
+class BatchStats:
+    completed: int = 0
+    failed: int = 0
+    skipped: int = 0
+    elapsed_sec: float = 0.0
+    steady_tasks_per_sec: float = 0.0
+    completion_times: List[float] = field(default_factory=list, repr=False)
+
+    def steady_rate(self, warmup: int) -> float:
+        """Tasks/sec between the ``warmup``-th and the last completion."""
+        times = self.completion_times
+        if len(times) <= warmup + 1:
+            return 0.0
+        span = times[-1] - times[warmup]
+        return (len(times) - 1 - warmup) / span if span > 0 else 0.0
+
+
+class _Shard:
+    def __init__(self, index: int, path: Path, committed: int):
+        self.index = index
+        self.path = path
+        # Drop anything past the last ledger entry: records of tasks that were
+        # still running when a previous run stopped.
+        with path.open("ab") as fh:
+            fh.truncate(committed)
+        self.fh = path.open("ab")
+
+    def write(self, task_id: str, record: Mapping[str, Any]) -> None:
+        self.fh.write(codec.dumpb(record) + b"\n")
+
+    def commit(self) -> int:
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+        return self.fh.tell()
+
+    def rollback(self, end: int) -> None:
+        self.fh.flush()
+        self.fh.truncate(end)
+        self.fh.seek(end)
+
+
+class _Ledger:
+    def __init__(self, path: Path):
+        self._fh = path.open("ab")
+        self._lock = threading.Lock()
+
+    def append(self, task_id: str, step: int, shard: int, end: int) -> None:
+        entry = {"task_id": task_id, "step": step, "shard": shard, "end": end, "t": time.time()}
+        line = codec.dumpb(entry) + b"\n"
+        with self._lock:
+            self._fh.write(line)
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+def _iter_tasks(path: Path) -> Iterator[Dict[str, Any]]:
+    with path.open("rb") as fh:
+        for line in fh:
+            if line.strip():
+                yield codec.loads(line)
+
+
+def run_batch(
+    tasks_path: Path,
+    output_dir: Path,
+    *,
+    workers: int = 8,
+    step_fn: Optional[Callable[..., None]] = None,
+    client: Optional[Any] = None,
+    report: Optional[Callable[[str], None]] = None,
+    report_interval_sec: float = _REPORT_INTERVAL_SEC,
+) -> BatchStats:
+    """Run every unfinished task in ``tasks_path``; see the module docstring."""
+    workers = max(1, workers)
+    step_fn = step_fn or srl_teacher.run_teacher_step
+    output_dir.mkdir(parents=True, exist_ok=True)
+    done, ends = read_ledger(output_dir)
+
+    _truncate_idle_shards(output_dir, ends, workers)
+    free: "queue.Queue[_Shard]" = queue.Queue()
+    shards = [_Shard(i, _shard_path(output_dir, i), ends.get(i, 0)) for i in range(workers)]
+    for shard in shards:
+        free.put(shard)
+    ledger = _Ledger(output_dir / _LEDGER_NAME)
+    stats = BatchStats()
+    lock = threading.Lock()
+    start = time.perf_counter()
+    last_report = start
+
+    def _run(task: Dict[str, Any], step: int) -> None:
+        task_id = str(task["task_id"])
+        shard = free.get()
+        committed = shard.fh.tell()
+        try:
+            step_fn(task, client=client, writer=shard.write, step=step)
+            ledger.append(task_id, step, shard.index, shard.commit())
+            with lock:
+                stats.completion_times.append(time.perf_counter())
+        except BaseException:
+            shard.rollback(committed)
+            raise
+        finally:
+            free.put(shard)
+
+    # Steps of one task run in file order: while one is in flight, the
+    # task's later lines wait here.
+    waiting: Dict[str, Deque[Tuple[Dict[str, Any], int]]] = {}
+    running: Dict["Future[None]", str] = {}
+    broken: Set[str] = set()  # tasks with a failed step in this run
+
+    def _submit(pool: ThreadPoolExecutor, task: Dict[str, Any], step: int) -> None:
+        future = pool.submit(_run, task, step)
+        running[future] = str(task["task_id"])
+        pending.add(future)
+
+    def _collect(pool: ThreadPoolExecutor, finished: Set["Future[None]"]) -> None:
+        nonlocal last_report
+        for future in finished:
+            task_id = running.pop(future)
+            exc = future.exception()
+            if exc is not None and report is not None:
+                report(f"[batch] task failed: {exc!r}")
+            queued = waiting.get(task_id)
+            with lock:
+                if exc is not None:
+                    # Later steps need this one first; leave them for the next run.
+                    stats.failed += 1 + len(queued or ())
+                    broken.add(task_id)
+                else:
+                    stats.completed += 1
+            if exc is None and queued:
+                _submit(pool, *queued.popleft())
+            else:
+                waiting.pop(task_id, None)
+        now = time.perf_counter()
+        if report is not None and now - last_report >= report_interval_sec:
+            last_report = now
+            report(
+                f"[batch] completed={stats.completed} failed={stats.failed} skipped={stats.skipped} "
+                f"steady={stats.steady_rate(workers):.2f} tasks/s"
+            )
+
+    pending: Set["Future[None]"] = set()
+    occurrences: Dict[str, int] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="teacher") as pool:
+            for task in _iter_tasks(tasks_path):
+                task_id = str(task["task_id"])
+                # The n-th line of a task_id is that task's step n.
+                step = occurrences[task_id] = occurrences.get(task_id, 0) + 1
+                if (task_id, step) in done:
+                    stats.skipped += 1
+                    continue
+                if task_id in broken:
+                    stats.failed += 1
+                    continue
+                if task_id in waiting:
+                    waiting[task_id].append((task, step))
+                    continue
+                # Keep a bounded number of tasks in flight instead of
+                # materializing futures for the whole file.
+                while len(pending) >= 2 * workers:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    _collect(pool, finished)
+                waiting[task_id] = deque()
+                _submit(pool, task, step)
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _collect(pool, finished)
+    finally:
+        ledger.close()
+        for shard in shards:
+            shard.fh.close()
+
+    stats.elapsed_sec = time.perf_counter() - start
+    # The first ``workers`` completions include connection setup and ramp-up.
+    stats.steady_tasks_per_sec = stats.steady_rate(workers)
+    return stats
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.teachers.batch_runner")
+    parser.add_argument(
+        "tasks_path",
+        help="Path to a JSONL file containing queued tasks.",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=None,
+        help="Directory for shards and the completion ledger (default: trajectories/batches/<tasks file stem>).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Tasks run concurrently; also the number of output shards (default: 8).",
+    )
+    parser.add_argument(
+        "--state-write-behind",
+        action="store_true",
+        help="Group-commit state saves in the background instead of once per step.",
+    )
+    parser.add_argument(
+        "--report-interval",
+        type=float,
+        default=_REPORT_INTERVAL_SEC,
+        help=f"Seconds between progress lines (default: {_REPORT_INTERVAL_SEC:.0f}).",
+    )
+    args = parser.parse_args(argv)
+
+    path = Path(args.tasks_path)
+    if not path.exists():
+        raise SystemExit(f"Tasks file not found: {path}")
+    output_dir = args.output_dir or _default_output_dir(path)
+
+    client = MultiActorClient()
+    if args.state_write_behind:
+        state_manager.enable_write_behind()
+    # This process is the only one running the file's tasks.
+    state_manager.configure_cache()
+    try:
+        stats = run_batch(
+            path,
+            output_dir,
+            workers=args.workers,
+            client=client,
+            report=print,
+            report_interval_sec=args.report_interval,
+        )
+    finally:
+        client.close()
+        state_manager.disable_write_behind()
+        state_manager.configure_cache(max_entries=0)
+
+    print(
+        f"completed={stats.completed} failed={stats.failed} skipped={stats.skipped} "
+        f"elapsed={stats.elapsed_sec:.1f}s steady={stats.steady_tasks_per_sec:.2f} tasks/s "
+        f"(output: {output_dir})"
+    )
+
+
+if __name__ == "__main__":
+    main()
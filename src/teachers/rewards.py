@@ -0,0 +1,387 @@
+"""Group-wise SRL rewards: score G sampled steps per prompt against the teacher.
+
+Each sample is compared with the teacher's step for the same prompt on three
+components:
+
+- ``action_f1``: F1 over the action's fields, with list values (such as
+  ``command``) expanded into one item per element.
+- ``edit_distance``: Levenshtein distance between the rendered actions
+  (the command joined by spaces, or compact JSON without a command), with
+  ``edit_similarity = 1 - distance / max(len)``.
+- ``state_jaccard``: Jaccard index over the items of the ``state_update`` list
+  fields (plus ``next_focus``).
+
+``score_groups`` scores a whole batch of groups at once and returns
+per-component arrays together with the weighted ``total`` and its
+group-normalized ``advantage`` ((total - group mean) / (group std + eps)).
+With NumPy installed, set overlap is computed with sorted integer keys across
+the batch, and edit distance runs a bit-parallel (Myers/Hyyrö) recurrence over
+all samples of the batch in lockstep, one uint64 word per sample, for
+reference actions of up to 64 characters; longer ones use the same recurrence
+on Python integers. Without NumPy the same
+numbers come back as plain lists.
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    np = None  # type: ignore
+
+from src.data import codec
+
+
+_STATE_LIST_FIELDS = ("goals", "constraints", "decisions", "hypotheses", "history", "open_issues")
+_EPS = 1e-6
+
+
+@dataclass
+class RewardWeights:
+    action_f1: float = 1.0
+    edit_similarity: float = 1.0
+    state_jaccard: float = 1.0
+
+
+@dataclass
+class Group:
+    """Teacher reference and sampled outputs for one prompt.
+
+    Actions and state updates are the decoded JSON objects from the
+    ``<action>``/``<state_update>`` blocks; ``None`` means the block was
+    missing or invalid.
+    """
+
+    reference_action: Optional[Mapping[str, Any]]
+    reference_update: Optional[Mapping[str, Any]]
+    actions: Sequence[Optional[Mapping[str, Any]]]
+    updates: Sequence[Optional[Mapping[str, Any]]] = field(default_factory=list)
+
+
+@dataclass
+class GroupRewards:
+    """Per-sample arrays (NumPy when available, else lists) plus per-group stats."""
+
+    group_index: Any
+    action_f1: Any
+    edit_distance: Any
+    edit_similarity: Any
+    state_jaccard: Any
+    total: Any
+    advantage: Any
+    group_mean: Any
+    group_std: Any
+
+
+_SCALARS = (str, int, float, bool, type(None))
+
+
+def _items(value: Any, prefix: str, out: List[str]) -> None:
+    if isinstance(value, list):
+        for element in value:
+            out.append(prefix + "[]=" + (repr(element) if isinstance(element, _SCALARS) else codec.dumps(element)))
+    elif isinstance(value, dict):
+        for key, sub in value.items():
+            _items(sub, f"{prefix}.{key}", out)
+    else:
+        out.append(prefix + "=" + (repr(value) if isinstance(value, _SCALARS) else codec.dumps(value)))
+
+
+def action_items(action: Optional[Mapping[str, Any]]) -> List[str]:
+    """Field items compared by ``action_f1``; compared as a set, so repeats count once."""
+    out: List[str] = []
+    if action:
+        for key, value in action.items():
+            _items(value, str(key), out)
+    return out
+
+
+def update_items(update: Optional[Mapping[str, Any]]) -> List[str]:
+    """Items compared by ``state_jaccard``: one per list entry, plus next_focus (as a set)."""
+    if not update:
+        return []
+    out: List[str] = []
+    for name in _STATE_LIST_FIELDS:
+        value = update.get(name)
+        if value is None:
+            continue
+        if isinstance(value, list):
+            out += [f"{name}={v}" for v in value]
+        else:
+            out.append(f"{name}={value}")
+    focus = update.get("next_focus")
+    if focus:
+        out.append(f"next_focus={focus}")
+    return out
+
+
+def action_text(action: Optional[Mapping[str, Any]]) -> str:
+    """Rendering of an action used for edit distance."""
+    if not action:
+        return ""
+    command = action.get("command")
+    if isinstance(command, list):
+        return " ".join(str(part) for part in command)
+    return codec.dumps(action)
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance with the bit-parallel recurrence on Python ints."""
+    if len(a) < len(b):
+        a, b = b, a
+    m = len(b)
+    if m == 0:
+        return len(a)
+    peq: Dict[str, int] = {}
+    for i, ch in enumerate(b):
+        peq[ch] = peq.get(ch, 0) | (1 << i)
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    for ch in a:
+        eq = peq.get(ch, 0)
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & mask) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+    return score
+
+
+def _edit_distances_np(references: Sequence[str], row_group: Any, texts: Sequence[str]) -> Any:
+    """Distance from ``references[row_group[r]]`` (each <= 64 chars) to ``texts[r]``.
+
+    Every row advances one text character per iteration, so the Python loop
+    runs max(len(text)) times regardless of the number of rows.
+    """
+    rows = len(texts)
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=rows)
+    ref_len = np.fromiter((len(r) for r in references), dtype=np.int64, count=len(references))
+    if rows == 0:
+        return lengths
+
+    # One alphabet over all references; slot 0 is "not in any reference".
+    ref_cps = np.frombuffer("".join(references).encode("utf-32-le"), dtype=np.uint32)
+    alphabet = np.unique(ref_cps)
+    peq = np.zeros((len(references), len(alphabet) + 1), dtype=np.uint64)
+    if len(ref_cps):
+        owner = np.repeat(np.arange(len(references)), ref_len)
+        position = np.arange(len(ref_cps)) - np.repeat(np.cumsum(ref_len) - ref_len, ref_len)
+        slots = np.searchsorted(alphabet, ref_cps) + 1
+        np.bitwise_or.at(peq, (owner, slots), np.left_shift(np.uint64(1), position.astype(np.uint64)))
+
+    n = int(lengths.max())
+    codes = np.zeros((rows, max(n, 1)), dtype=np.int64)
+    text_cps = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32)
+    if len(alphabet) and len(text_cps):
+        idx = np.minimum(np.searchsorted(alphabet, text_cps), len(alphabet) - 1)
+        owner = np.repeat(np.arange(rows), lengths)
+        column = np.arange(len(text_cps)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        codes[owner, column] = np.where(alphabet[idx] == text_cps, idx + 1, 0)
+
+    m = ref_len[row_group]
+    one = np.uint64(1)
+    mask = np.where(m >= 64, np.uint64(0xFFFFFFFFFFFFFFFF), (one << m.astype(np.uint64)) - one)
+    high = np.where(m > 0, one << np.maximum(m - 1, 0).astype(np.uint64), np.uint64(0))
+    row_peq = peq[row_group]
+    pv = mask.copy()
+    mv = np.zeros(rows, dtype=np.uint64)
+    score = m.copy()
+    arange = np.arange(rows)
+    for j in range(n):
+        active = lengths > j
+        eq = row_peq[arange, codes[:, j]]
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & mask) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        step = (ph & high != 0).astype(np.int64) - (mh & high != 0).astype(np.int64)
+        # An empty reference has no bit to watch: every character costs one.
+        step = np.where(m == 0, 1, step)
+        score += np.where(active, step, 0)
+        ph = ((ph << one) | one) & mask
+        mh = (mh << one) & mask
+        pv = np.where(active, mh | (~(xv | ph) & mask), pv)
+        mv = np.where(active, ph & xv, mv)
+    return score
+
+
+def _overlap_np(samples: List[List[str]], references: List[List[str]]) -> Tuple[Any, Any, Any]:
+    """Return (|S ∩ R|, |S|, |R|) per row for item sets, vectorized across rows.
+
+    Items are interned to integer ids and each (row, id) pair becomes one
+    int64 key, so dedup and intersection are single sorted-array operations.
+    """
+    vocab: Dict[str, int] = {}
+    intern = vocab.setdefault
+    rows = len(samples)
+
+    def _keys(item_lists: List[List[str]]) -> Any:
+        ids = [intern(item, len(vocab)) for items in item_lists for item in items]
+        owner = np.repeat(np.arange(rows, dtype=np.int64), [len(items) for items in item_lists])
+        return owner, np.asarray(ids, dtype=np.int64)
+
+    s_owner, s_ids = _keys(samples)
+    r_owner, r_ids = _keys(references)
+    width = max(1, len(vocab))
+    s_keys = np.unique(s_owner * width + s_ids)
+    r_keys = np.unique(r_owner * width + r_ids)
+    common = np.intersect1d(s_keys, r_keys, assume_unique=True)
+    inter = np.bincount(common // width, minlength=rows)
+    s_size = np.bincount(s_keys // width, minlength=rows)
+    r_size = np.bincount(r_keys // width, minlength=rows)
+    return inter, s_size, r_size
+
+
+def _overlap_py(samples: List[List[str]], references: List[List[str]]) -> Tuple[List[int], List[int], List[int]]:
+    inter, s_size, r_size = [], [], []
+    for sample, ref in zip(samples, references):
+        s, r = set(sample), set(ref)
+        inter.append(len(s & r))
+        s_size.append(len(s))
+        r_size.append(len(r))
+    return inter, s_size, r_size
+
+
+def score_groups(groups: Sequence[Group], weights: Optional[RewardWeights] = None) -> GroupRewards:
+    """Score every sample of every group; see the module docstring for components."""
+    weights = weights or RewardWeights()
+    group_index: List[int] = []
+    act_items: List[List[str]] = []
+    act_ref_items: List[List[str]] = []
+    upd_items: List[List[str]] = []
+    upd_ref_items: List[List[str]] = []
+    for g, group in enumerate(groups):
+        ref_act = action_items(group.reference_action)
+        ref_upd = update_items(group.reference_update)
+        updates = list(group.updates) + [None] * (len(group.actions) - len(group.updates))
+        for action, update in zip(group.actions, updates):
+            group_index.append(g)
+            act_items.append(action_items(action))
+            act_ref_items.append(ref_act)
+            upd_items.append(update_items(update))
+            upd_ref_items.append(ref_upd)
+
+    weight_sum = weights.action_f1 + weights.edit_similarity + weights.state_jaccard or 1.0
+
+    if np is None:
+        return _score_py(groups, group_index, act_items, act_ref_items, upd_items, upd_ref_items, weights, weight_sum)
+
+    a_inter, a_size, a_ref = _overlap_np(act_items, act_ref_items)
+    denom = a_size + a_ref
+    action_f1 = np.where(denom > 0, 2.0 * a_inter / np.maximum(denom, 1), 1.0)
+    u_inter, u_size, u_ref = _overlap_np(upd_items, upd_ref_items)
+    union = u_size + u_ref - u_inter
+    state_jaccard = np.where(union > 0, u_inter / np.maximum(union, 1), 1.0)
+
+    gidx = np.asarray(group_index, dtype=np.int64)
+    references = [action_text(group.reference_action) for group in groups]
+    texts = [action_text(a) for group in groups for a in group.actions]
+    longest = np.asarray(
+        [max(len(references[g]), len(t)) for g, t in zip(group_index, texts)], dtype=np.int64
+    )
+    dist = np.zeros(len(texts), dtype=np.int64)
+    short = np.asarray([len(references[g]) <= 64 for g in group_index], dtype=bool)
+    if short.any():
+        rows = np.flatnonzero(short)
+        dist[rows] = _edit_distances_np(references, gidx[rows], [texts[r] for r in rows])
+    for r in np.flatnonzero(~short):
+        dist[r] = edit_distance(references[group_index[r]], texts[r])
+    edit_similarity = np.where(longest > 0, 1.0 - dist / np.maximum(longest, 1), 1.0)
+
+    total = (
+        weights.action_f1 * action_f1
+        + weights.edit_similarity * edit_similarity
+        + weights.state_jaccard * state_jaccard
+    ) / weight_sum
+
+    counts = np.bincount(gidx, minlength=len(groups))
+    safe = np.maximum(counts, 1)
+    mean = np.bincount(gidx, weights=total, minlength=len(groups)) / safe
+    var = np.bincount(gidx, weights=(total - mean[gidx]) ** 2, minlength=len(groups)) / safe
+    std = np.sqrt(var)
+    advantage = (total - mean[gidx]) / (std[gidx] + _EPS)
+
+    return GroupRewards(
+        group_index=gidx,
+        action_f1=action_f1,
+        edit_distance=dist,
+        edit_similarity=edit_similarity,
+        state_jaccard=state_jaccard,
+        total=total,
+        advantage=advantage,
+        group_mean=mean,
+        group_std=std,
+    )
+
+
+def _score_py(
+    groups: Sequence[Group],
+    group_index: List[int],
+    act_items: List[List[str]],
+    act_ref_items: List[List[str]],
+    upd_items: List[List[str]],
+    upd_ref_items: List[List[str]],
+    weights: RewardWeights,
+    weight_sum: float,
+) -> GroupRewards:
+    a_inter, a_size, a_ref = _overlap_py(act_items, act_ref_items)
+    action_f1 = [2.0 * i / (s + r) if s + r else 1.0 for i, s, r in zip(a_inter, a_size, a_ref)]
+    u_inter, u_size, u_ref = _overlap_py(upd_items, upd_ref_items)
+    state_jaccard = [i / (s + r - i) if s + r - i else 1.0 for i, s, r in zip(u_inter, u_size, u_ref)]
+
+    dist: List[int] = []
+    edit_similarity: List[float] = []
+    for group in groups:
+        reference = action_text(group.reference_action)
+        for action in group.actions:
+            text = action_text(action)
+            d = edit_distance(reference, text)
+            longest = max(len(reference), len(text))
+            dist.append(d)
+            edit_similarity.append(1.0 - d / longest if longest else 1.0)
+
+    total = [
+        (weights.action_f1 * f + weights.edit_similarity * e + weights.state_jaccard * j) / weight_sum
+        for f, e, j in zip(action_f1, edit_similarity, state_jaccard)
+    ]
+    members: List[List[float]] = [[] for _ in groups]
+    for g, value in zip(group_index, total):
+        members[g].append(value)
+    mean = [sum(v) / len(v) if v else 0.0 for v in members]
+    std = [math.sqrt(sum((x - mu) ** 2 for x in v) / len(v)) if v else 0.0 for v, mu in zip(members, mean)]
+    advantage = [(value - mean[g]) / (std[g] + _EPS) for g, value in zip(group_index, total)]
+
+    return GroupRewards(
+        group_index=group_index,
+        action_f1=action_f1,
+        edit_distance=dist,
+        edit_similarity=edit_similarity,
+        state_jaccard=state_jaccard,
+        total=total,
+        advantage=advantage,
+        group_mean=mean,
+        group_std=std,
+    )
+
+
+__all__ = [
+    "Group",
+    "GroupRewards",
+    "RewardWeights",
+    "action_items",
+    "action_text",
+    "edit_distance",
+    "score_groups",
+    "update_items",
+]
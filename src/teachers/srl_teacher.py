@@ -1,21 +1,26 @@
 from __future__ import annotations
 
 import argparse
-import json
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict
 from pathlib import Path
-from typing import Any, Dict, Mapping, Optional
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
 
 try:
     import yaml  # type: ignore
 except Exception:  # pragma: no cover - optional dependency
     yaml = None  # type: ignore
 
-from src.actors.vllm_client import VLLMClient
+from src.actors.output_parser import parse_model_output
+from src.actors.vllm_client import MultiActorClient, VLLMClient
+from src.data import codec, tracing
+from src.data.manifest import TaskManifest, parse_shard
 from src.data.schemas import repo_root
 from src.sandbox import runner as sandbox_runner
 from src.state import manager as state_manager
+from src.state.work_queue import WorkQueue
 
 
 def _config_path() -> Path:
@@ -31,6 +36,9 @@ def _load_prompts_config() -> Dict[str, Any]:
             "stop": ["</state_update>"],
             "temperature": 0.2,
             "max_tokens": 512,
+            "state_token_budget": 1024,
+            "group_size": 1,
+            "group_min_std": 0.0,
         }
     data = yaml.safe_load(cfg_path.read_text()) or {}
     return {
@@ -39,6 +47,9 @@ def _load_prompts_config() -> Dict[str, Any]:
         "stop": data.get("stop") or ["</state_update>"],
         "temperature": float(data.get("temperature", 0.2)),
         "max_tokens": int(data.get("max_tokens", 512)),
+        "state_token_budget": int(data.get("state_token_budget", 1024)),
+        "group_size": int(data.get("group_size", 1)),
+        "group_min_std": float(data.get("group_min_std", 0.0)),
     }
 
 
@@ -55,65 +66,49 @@ def _trajectory_path(task_id: str) -> Path:
 
 def _append_trajectory_step(task_id: str, record: Mapping[str, Any]) -> None:
     path = _trajectory_path(task_id)
-    with path.open("a", encoding="utf-8") as fh:
-        fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+    with path.open("ab") as fh:
+        fh.write(codec.dumpb(record) + b"\n")
 
 
-def _next_step_index(task_id: str) -> int:
-    path = _trajectory_path(task_id)
-    if not path.exists():
-        return 1
+_TAIL_BLOCK = 64 * 1024
+
+
+def _count_records(path: Path) -> int:
     count = 0
     with path.open("r", encoding="utf-8") as fh:
         for _ in fh:
             count += 1
-    return count + 1
-
-
-def _extract_block(text: str, tag: str) -> Optional[str]:
-    start_tag = f"<{tag}>"
-    end_tag = f"</{tag}>"
-    start = text.find(start_tag)
-    if start == -1:
-        return None
-    start += len(start_tag)
-    end = text.find(end_tag, start)
-    if end == -1:
-        return None
-    return text[start:end].strip()
-
+    return count
 
-def _parse_model_output(raw: str) -> Dict[str, Any]:
-    think = _extract_block(raw, "think")
-    action_raw = _extract_block(raw, "action")
-    state_update_raw = _extract_block(raw, "state_update")
 
-    action_obj: Optional[Dict[str, Any]] = None
-    state_update_obj: Optional[Dict[str, Any]] = None
-    parse_error: Optional[str] = None
-
-    if action_raw:
-        try:
-            candidate = json.loads(action_raw)
-            if isinstance(candidate, dict):
-                action_obj = candidate
-        except json.JSONDecodeError:
-            parse_error = parse_error or "invalid_action_json"
-    if state_update_raw:
-        try:
-            candidate = json.loads(state_update_raw)
-            if isinstance(candidate, dict):
-                state_update_obj = candidate
-        except json.JSONDecodeError:
-            parse_error = parse_error or "invalid_state_update_json"
+def _next_step_index(task_id: str) -> int:
+    """Return the step after the last recorded one.
 
-    return {
-        "raw": raw,
-        "think": think,
-        "action": action_obj,
-        "state_update": state_update_obj,
-        "parse_error": parse_error,
-    }
+    Grouped rollouts write several records per step, so this reads the last
+    record's ``step`` from the end of the file instead of counting lines.
+    """
+    path = _trajectory_path(task_id)
+    if not path.exists():
+        return 1
+    last = b""
+    with path.open("rb") as fh:
+        pos = fh.seek(0, os.SEEK_END)
+        tail = b""
+        while pos > 0:
+            size = min(_TAIL_BLOCK, pos)
+            pos -= size
+            fh.seek(pos)
+            tail = fh.read(size) + tail
+            parts = tail.rstrip(b"\n").rsplit(b"\n", 1)
+            if len(parts) == 2 or pos == 0:
+                last = parts[-1]
+                break
+    if not last.strip():
+        return 1
+    try:
+        return int(codec.loads(last)["step"]) + 1
+    except (ValueError, KeyError, TypeError):
+        return _count_records(path) + 1
 
 
 def _to_str_list(value: Any) -> list[str]:
@@ -166,35 +161,84 @@ def _compute_reward(parsed: Mapping[str, Any], sandbox_result: Optional[Any]) ->
     return 1.0
 
 
-def run_teacher_step(task: Mapping[str, Any], *, client: Optional[VLLMClient] = None) -> None:
+def _sandbox_result_dict(sandbox_result: Optional[Any]) -> Optional[Dict[str, Any]]:
+    if sandbox_result is None:
+        return None
+    return {
+        "cmd": sandbox_result.cmd,
+        "exit_code": sandbox_result.exit_code,
+        "stdout": sandbox_result.stdout,
+        "stderr": sandbox_result.stderr,
+        "duration_sec": sandbox_result.duration_sec,
+        "error": sandbox_result.error,
+        "diff": sandbox_result.diff,
+        "changed_files": sandbox_result.changed_files,
+    }
+
+
+def run_teacher_step(
+    task: Mapping[str, Any],
+    *,
+    client: Optional[VLLMClient] = None,
+    state_refs: bool = False,
+    writer: Optional[Callable[[str, Mapping[str, Any]], None]] = None,
+    step: Optional[int] = None,
+) -> None:
     """Run a single teacher-labeled step for a task and append a trajectory record.
 
     The task mapping should contain:
       - task_id: unique identifier
       - prompt: base user prompt string
       - workspace_files: optional mapping of relative path -> file content
+
+    ``writer(task_id, record)`` replaces the default per-task JSONL append
+    (the batch runner uses it to write sharded outputs). ``step`` is the
+    step index; by default it is counted from the task's trajectory file,
+    so callers with a ``writer`` should pass it. With tracing
+    enabled (``src.data.tracing``), the step's span breakdown is stored in
+    ``metrics["spans"]``.
     """
+    with tracing.step_spans() as spans:
+        _run_teacher_step(
+            task, client=client, state_refs=state_refs, writer=writer, step=step, spans=spans
+        )
+
+
+def _run_teacher_step(
+    task: Mapping[str, Any],
+    *,
+    client: Optional[VLLMClient],
+    state_refs: bool,
+    writer: Optional[Callable[[str, Mapping[str, Any]], None]],
+    step: Optional[int],
+    spans: Optional[Dict[str, float]],
+) -> None:
     cfg = _load_prompts_config()
     task_id = str(task["task_id"])
     base_prompt = str(task["prompt"])
 
     state_before = state_manager.load(task_id)
-    state_text = state_manager.render(state_before)
-    prompt = _build_prompt(base_prompt, state_text, cfg)
+    with tracing.span("prompt.build"):
+        state_text = state_manager.render(
+            state_before, max_tokens=int(cfg.get("state_token_budget", 1024))
+        )
+        prompt = _build_prompt(base_prompt, state_text, cfg)
 
     if client is None:
         client = VLLMClient()
 
     teacher_start = time.time()
-    model_text = client.generate(
-        prompt,
-        stop=cfg.get("stop"),
-        temperature=float(cfg.get("temperature", 0.2)),
-        max_tokens=int(cfg.get("max_tokens", 512)),
-    )
+    with tracing.span("generate"):
+        model_text = client.generate(
+            prompt,
+            stop=cfg.get("stop"),
+            temperature=float(cfg.get("temperature", 0.2)),
+            max_tokens=int(cfg.get("max_tokens", 512)),
+        )
     teacher_latency = time.time() - teacher_start
 
-    parsed = _parse_model_output(model_text)
+    with tracing.span("parse"):
+        parsed = parse_model_output(model_text)
 
     workspace_files = task.get("workspace_files") or {}
     sandbox_result = None
@@ -210,30 +254,29 @@ def run_teacher_step(task: Mapping[str, Any], *, client: Optional[VLLMClient] =
     state_update_obj = parsed.get("state_update")
     if isinstance(state_update_obj, dict):
         update_state = _state_from_update(state_update_obj)
-        state_after = state_manager.merge(state_before, update_state)
-        state_manager.save(task_id, state_after)
-
-    reward = _compute_reward(parsed, sandbox_result)
-
-    sandbox_result_dict: Optional[Dict[str, Any]] = None
-    if sandbox_result is not None:
-        sandbox_result_dict = {
-            "cmd": sandbox_result.cmd,
-            "exit_code": sandbox_result.exit_code,
-            "stdout": sandbox_result.stdout,
-            "stderr": sandbox_result.stderr,
-            "duration_sec": sandbox_result.duration_sec,
-            "error": sandbox_result.error,
-            "diff": sandbox_result.diff,
-            "changed_files": sandbox_result.changed_files,
-        }
+        state_after = state_manager.merge_update(task_id, update_state)
+
+    with tracing.span("reward"):
+        reward = _compute_reward(parsed, sandbox_result)
+
+    sandbox_result_dict = _sandbox_result_dict(sandbox_result)
+
+    if step is None:
+        step = _next_step_index(task_id)
+    state_fields: Dict[str, Any]
+    if state_refs:
+        # The state history keeps a delta per step; the record only points at
+        # it (state_before is the version recorded for step - 1).
+        state_manager.record_step(task_id, step, state_after)
+        state_fields = {"state_ref": {"step": step}}
+    else:
+        state_fields = {"state_before": asdict(state_before), "state_after": asdict(state_after)}
 
     record: Dict[str, Any] = {
         "task_id": task_id,
-        "step": _next_step_index(task_id),
+        "step": step,
         "prompt": prompt,
-        "state_before": asdict(state_before),
-        "state_after": asdict(state_after),
+        **state_fields,
         "model_output": parsed,
         "sandbox_result": sandbox_result_dict,
         "reward": reward,
@@ -245,29 +288,398 @@ def run_teacher_step(task: Mapping[str, Any], *, client: Optional[VLLMClient] =
             "sandbox_failed": sandbox_result_dict is None or (sandbox_result and sandbox_result.exit_code != 0),
         },
     }
-    _append_trajectory_step(task_id, record)
+    if spans is not None:
+        record["metrics"]["spans"] = dict(spans)
+    with tracing.span("trajectory.append"):
+        (writer or _append_trajectory_step)(task_id, record)
+
+
+def _has_command(parsed: Mapping[str, Any]) -> bool:
+    action_obj = parsed.get("action")
+    return isinstance(action_obj, dict) and bool(action_obj.get("command"))
+
+
+def _std(values: List[float]) -> float:
+    mean = sum(values) / len(values)
+    return (sum((v - mean) ** 2 for v in values) / len(values)) ** 0.5
+
+
+def run_teacher_group(
+    task: Mapping[str, Any],
+    *,
+    group_size: int,
+    min_std: float = 0.0,
+    client: Optional[VLLMClient] = None,
+    max_workers: Optional[int] = None,
+    state_refs: bool = False,
+    writer: Optional[Callable[[str, Mapping[str, Any]], None]] = None,
+    step: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Sample ``group_size`` teacher completions for one prompt and score them as a group.
+
+    The task workspace is prepared once and cloned per sample that has a
+    runnable action; the actions are validated in parallel. Rewards are
+    bounded before any sandbox work (a sample that does not parse scores 0),
+    so a group whose samples all fail to parse needs no sandbox work. A
+    group whose final reward std is below ``min_std`` is skipped: nothing
+    is written and the task state is left unchanged (with the default 0.0
+    no group is skipped). Otherwise every sample is appended as a record
+    sharing one ``step`` (with ``group.sample`` set) and the state update
+    of the best-scoring sample is merged. ``writer`` and ``step`` work as
+    in ``run_teacher_step``.
+
+    Returns a summary with ``rewards``, ``reward_std``, ``skipped`` and
+    ``skip_reason`` (plus ``spans`` when tracing is enabled).
+    """
+    with tracing.step_spans() as spans:
+        summary = _run_teacher_group(
+            task,
+            group_size=group_size,
+            min_std=min_std,
+            client=client,
+            max_workers=max_workers,
+            state_refs=state_refs,
+            writer=writer,
+            step=step,
+            spans=spans,
+        )
+        if spans is not None:
+            summary["spans"] = dict(spans)
+        return summary
+
+
+def _run_teacher_group(
+    task: Mapping[str, Any],
+    *,
+    group_size: int,
+    min_std: float,
+    client: Optional[VLLMClient],
+    max_workers: Optional[int],
+    state_refs: bool,
+    writer: Optional[Callable[[str, Mapping[str, Any]], None]],
+    step: Optional[int],
+    spans: Optional[Dict[str, float]],
+) -> Dict[str, Any]:
+    cfg = _load_prompts_config()
+    task_id = str(task["task_id"])
+    base_prompt = str(task["prompt"])
+    group_size = max(1, int(group_size))
+
+    state_before = state_manager.load(task_id)
+    with tracing.span("prompt.build"):
+        state_text = state_manager.render(
+            state_before, max_tokens=int(cfg.get("state_token_budget", 1024))
+        )
+        prompt = _build_prompt(base_prompt, state_text, cfg)
+
+    if client is None:
+        client = VLLMClient()
+
+    gen_kwargs: Dict[str, Any] = {
+        "stop": cfg.get("stop"),
+        "temperature": float(cfg.get("temperature", 0.2)),
+        "max_tokens": int(cfg.get("max_tokens", 512)),
+    }
+    teacher_start = time.time()
+    generate_many = getattr(client, "generate_many", None)
+    with tracing.span("generate", n=group_size):
+        if callable(generate_many):
+            texts = list(generate_many(prompt, group_size, **gen_kwargs))
+        else:
+            texts = [client.generate(prompt, **gen_kwargs) for _ in range(group_size)]
+    teacher_latency = time.time() - teacher_start
+
+    with tracing.span("parse"):
+        samples = [parse_model_output(text) for text in texts]
+    runnable = [i for i, parsed in enumerate(samples) if _has_command(parsed) and parsed.get("state_update")]
+    results: List[Optional[Any]] = [None] * len(samples)
+    summary: Dict[str, Any] = {
+        "task_id": task_id,
+        "group_size": len(samples),
+        "rewards": [0.0] * len(samples),
+        "reward_std": 0.0,
+        "skipped": False,
+        "skip_reason": None,
+        "teacher_latency_sec": teacher_latency,
+        "sandbox_sec": 0.0,
+    }
+    if not runnable and min_std > 0:
+        # Every sample already has its final reward (0.0): std is zero.
+        summary.update(skipped=True, skip_reason="no_runnable_actions")
+        return summary
+
+    if runnable:
+        sandbox_start = time.time()
+        workspace = sandbox_runner.prepare_workspace(task_id, task.get("workspace_files") or {})
+        clones: List[Path] = []
+        try:
+            baseline = sandbox_runner.snapshot_workspace(workspace)
+            for i in runnable:
+                clones.append(sandbox_runner.clone_workspace(workspace, f"{workspace.name}.g{i}"))
+
+            @tracing.propagate
+            def _validate(item: Tuple[int, Path]) -> Tuple[int, Any]:
+                i, clone = item
+                return i, sandbox_runner.apply_action(clone, samples[i]["action"], baseline=baseline)
+
+            workers = max(1, min(len(runnable), max_workers or os.cpu_count() or 1))
+            if workers == 1:
+                validated = [_validate(item) for item in zip(runnable, clones)]
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    validated = list(pool.map(_validate, zip(runnable, clones)))
+            for i, result in validated:
+                results[i] = result
+        finally:
+            for clone in clones:
+                sandbox_runner.cleanup(clone)
+            sandbox_runner.cleanup(workspace)
+        summary["sandbox_sec"] = time.time() - sandbox_start
+
+    with tracing.span("reward"):
+        rewards = [_compute_reward(parsed, result) for parsed, result in zip(samples, results)]
+    reward_std = _std(rewards)
+    summary.update(rewards=rewards, reward_std=reward_std)
+    if reward_std < min_std:
+        summary.update(skipped=True, skip_reason="low_reward_std")
+        return summary
+
+    best = max(range(len(samples)), key=lambda i: rewards[i])
+    state_after = state_before
+    update_obj = samples[best].get("state_update")
+    if isinstance(update_obj, dict):
+        state_after = state_manager.merge_update(task_id, _state_from_update(update_obj))
+
+    if step is None:
+        step = _next_step_index(task_id)
+    state_fields: Dict[str, Any]
+    if state_refs:
+        state_manager.record_step(task_id, step, state_after)
+        state_fields = {"state_ref": {"step": step}}
+    else:
+        state_fields = {"state_before": asdict(state_before), "state_after": asdict(state_after)}
+
+    mean = sum(rewards) / len(rewards)
+    metrics_spans = dict(spans) if spans is not None else None
+    records: List[Dict[str, Any]] = []
+    for i, (parsed, result) in enumerate(zip(samples, results)):
+        result_dict = _sandbox_result_dict(result)
+        record: Dict[str, Any] = {
+            "task_id": task_id,
+            "step": step,
+            "prompt": prompt,
+            **state_fields,
+            "model_output": parsed,
+            "sandbox_result": result_dict,
+            "reward": rewards[i],
+            "teacher": {
+                "model": getattr(client, "model", None),
+            },
+            "group": {
+                "sample": i,
+                "size": len(samples),
+                "reward_mean": mean,
+                "reward_std": reward_std,
+                "selected": i == best,
+            },
+            "metrics": {
+                "teacher_latency_sec": teacher_latency,
+                "sandbox_failed": result_dict is None or result.exit_code != 0,
+            },
+        }
+        if metrics_spans is not None:
+            record["metrics"]["spans"] = metrics_spans
+        records.append(record)
+    with tracing.span("trajectory.append"):
+        if writer is not None:
+            for record in records:
+                writer(task_id, record)
+        else:
+            with _trajectory_path(task_id).open("ab") as fh:
+                fh.write(b"".join(codec.dumpb(record) + b"\n" for record in records))
+    return summary
+
+
+_PREFETCH_WINDOW = 64
+
+
+def _iter_task_windows(
+    path: Path,
+    size: int,
+    *,
+    shard: Tuple[int, int] = (0, 1),
+    start: int = 0,
+    seed: Optional[int] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    window: List[Dict[str, Any]] = []
+    with TaskManifest(path) as manifest:
+        for task in manifest.iter_tasks(shard=shard, start=start, seed=seed):
+            window.append(task)
+            if len(window) >= max(1, size):
+                yield window
+                window = []
+    if window:
+        yield window
 
 
 def main(argv: Optional[list[str]] = None) -> None:
     parser = argparse.ArgumentParser(prog="python -m src.teachers.srl_teacher")
     parser.add_argument(
         "tasks_path",
+        nargs="?",
         help="Path to a JSONL file containing queued tasks.",
     )
+    parser.add_argument(
+        "--state-write-behind",
+        action="store_true",
+        help="Group-commit state saves in the background instead of once per step.",
+    )
+    parser.add_argument(
+        "--state-server",
+        default=None,
+        help="Use a shared state server (unix:/path or host:port, see src.state.service) instead of the local DB.",
+    )
+    parser.add_argument(
+        "--state-refs",
+        action="store_true",
+        help="Store per-step state in the delta-encoded state history and reference it from records.",
+    )
+    parser.add_argument(
+        "--group-size",
+        type=int,
+        default=None,
+        help="Sample G completions per prompt and score them as a group (default: group_size from the prompts config, 1).",
+    )
+    parser.add_argument(
+        "--group-min-std",
+        type=float,
+        default=None,
+        help="Skip groups whose reward std is below this (default: group_min_std from the prompts config, 0.0).",
+    )
+    parser.add_argument(
+        "--group-workers",
+        type=int,
+        default=None,
+        help="Parallel sandbox validations per group (default: CPU count).",
+    )
+    parser.add_argument(
+        "--prefetch-window",
+        type=int,
+        default=_PREFETCH_WINDOW,
+        help=f"Number of tasks whose state is loaded in one batch (default: {_PREFETCH_WINDOW}).",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=(0, 1),
+        metavar="I/N",
+        help="Only run tasks whose task_id hashes to shard I of N (default: 0/1, every task).",
+    )
+    parser.add_argument(
+        "--start-index",
+        type=int,
+        default=0,
+        help="Skip the first K tasks of this shard, e.g. to resume a stopped run (default: 0).",
+    )
+    parser.add_argument(
+        "--shuffle-seed",
+        type=int,
+        default=None,
+        help="Visit tasks in a shuffled order fixed by this seed (default: file order).",
+    )
+    parser.add_argument(
+        "--queue",
+        type=Path,
+        default=None,
+        help="Lease tasks from this shared work queue (see src.state.work_queue); tasks_path, if given, is enqueued first.",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Record a per-step span breakdown in each trajectory record's metrics.spans.",
+    )
+    parser.add_argument(
+        "--trace-out",
+        type=Path,
+        default=None,
+        help="Also write Chrome trace-event JSON to this file (implies --trace).",
+    )
     args = parser.parse_args(argv)
 
-    client = VLLMClient()
-    path = Path(args.tasks_path)
-    if not path.exists():
+    # Spreads requests over the configured actors, skipping any that fail
+    # their background health probes.
+    client = MultiActorClient()
+    cfg = _load_prompts_config()
+    group_size = args.group_size if args.group_size is not None else int(cfg.get("group_size", 1))
+    min_std = args.group_min_std if args.group_min_std is not None else float(cfg.get("group_min_std", 0.0))
+    groups = skipped = 0
+    path = Path(args.tasks_path) if args.tasks_path else None
+    if path is None and args.queue is None:
+        parser.error("tasks_path is required unless --queue is given")
+    if path is not None and not path.exists():
         raise SystemExit(f"Tasks file not found: {path}")
 
-    with path.open("r", encoding="utf-8") as fh:
-        for line in fh:
-            line = line.strip()
-            if not line:
-                continue
-            task = json.loads(line)
-            run_teacher_step(task, client=client)
+    def _run(task: Dict[str, Any]) -> None:
+        nonlocal groups, skipped
+        if group_size > 1:
+            summary = run_teacher_group(
+                task,
+                group_size=group_size,
+                min_std=min_std,
+                client=client,
+                max_workers=args.group_workers,
+                state_refs=args.state_refs,
+            )
+            groups += 1
+            skipped += int(summary["skipped"])
+        else:
+            run_teacher_step(task, client=client, state_refs=args.state_refs)
+
+    # The state cache only sees this process's writes, so it is used only when
+    # no other process runs these tasks: not with a queue (steps of one task
+    # may be leased by different workers) or a state server. A shard owns all
+    # lines of its task_ids, so sharded runs keep the cache.
+    use_cache = args.queue is None and not args.state_server
+
+    def _prefetch(window: List[Dict[str, Any]]) -> None:
+        # One query warms the local state cache for the whole window.
+        if use_cache:
+            state_manager.load_many(str(task["task_id"]) for task in window)
+
+    if args.trace or args.trace_out:
+        tracing.enable(chrome_trace=args.trace_out)
+    if args.state_server:
+        state_manager.use_server(args.state_server)
+    elif args.state_write_behind:
+        state_manager.enable_write_behind()
+    if use_cache:
+        state_manager.configure_cache()
+    try:
+        if args.queue is not None:
+            queue = WorkQueue(args.queue)
+            if path is not None:
+                with TaskManifest(path) as manifest:
+                    queue.enqueue(manifest.iter_tasks())
+            queue.drain(_run, batch_size=args.prefetch_window, on_batch=_prefetch)
+        else:
+            for window in _iter_task_windows(
+                path,
+                args.prefetch_window,
+                shard=args.shard,
+                start=args.start_index,
+                seed=args.shuffle_seed,
+            ):
+                _prefetch(window)
+                for task in window:
+                    _run(task)
+        if group_size > 1:
+            print(f"groups={groups} skipped={skipped} (reward std < {min_std})")
+    finally:
+        client.close()
+        state_manager.disable_write_behind()
+        state_manager.configure_cache(max_entries=0)
+        state_manager.use_server(None)
+        tracing.disable()
 
 
 if __name__ == "__main__":
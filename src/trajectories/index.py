@@ -0,0 +1,420 @@
+"""Incrementally maintained SQLite index over trajectory JSONL files.
+
+Each complete line under ``trajectories/raw/*.jsonl`` gets one row holding
+its core scalar fields (task id, step, teacher model, reward, sandbox exit
+code, latencies) together with the file it lives in and its byte offset.
+Queries filter on the indexed columns and then seek straight to the matching
+records instead of re-parsing every file.
+
+Re-running ``update`` only reads bytes appended since the previous run; files
+that shrank or were rewritten are reindexed from scratch and files that
+disappeared are dropped from the index. A file only counts as appended to if
+it kept its inode and a hash of its first block still matches, so a rewrite
+that is as long as the old file (or longer) is not mistaken for an append.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from src.data import codec
+from src.data.schemas import repo_root
+
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS files ("
+    " path TEXT PRIMARY KEY,"
+    " size INTEGER NOT NULL,"
+    " mtime REAL NOT NULL,"
+    " indexed_bytes INTEGER NOT NULL,"
+    " inode INTEGER,"
+    " head_len INTEGER NOT NULL DEFAULT 0,"
+    " head TEXT"
+    ")",
+    "CREATE TABLE IF NOT EXISTS steps ("
+    " file TEXT NOT NULL,"
+    " offset INTEGER NOT NULL,"
+    " length INTEGER NOT NULL,"
+    " task_id TEXT,"
+    " step INTEGER,"
+    " model TEXT,"
+    " reward REAL,"
+    " exit_code INTEGER,"
+    " sandbox_failed INTEGER,"
+    " parse_error TEXT,"
+    " actor_latency_sec REAL,"
+    " teacher_latency_sec REAL,"
+    " duration_sec REAL,"
+    " PRIMARY KEY (file, offset)"
+    ")",
+    "CREATE INDEX IF NOT EXISTS steps_model_reward ON steps(model, reward)",
+    "CREATE INDEX IF NOT EXISTS steps_task ON steps(task_id, step)",
+    "CREATE INDEX IF NOT EXISTS steps_exit_code ON steps(exit_code)",
+)
+
+_INSERT_STEP = (
+    "INSERT OR REPLACE INTO steps("
+    " file, offset, length, task_id, step, model, reward, exit_code,"
+    " sandbox_failed, parse_error, actor_latency_sec, teacher_latency_sec, duration_sec"
+    ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+# Columns added to ``files`` after its first release; older index files get
+# them on open (with NULL inodes, so those files are reindexed once).
+_FILES_UPGRADE = (
+    ("inode", "INTEGER"),
+    ("head_len", "INTEGER NOT NULL DEFAULT 0"),
+    ("head", "TEXT"),
+)
+
+# Leading bytes hashed to tell an append from an in-place rewrite.
+HEAD_BYTES = 4096
+
+
+def head_digest(path: Path, length: int) -> Optional[str]:
+    """SHA-256 of the first ``length`` bytes of ``path``, or None if it is shorter."""
+    try:
+        with open(path, "rb") as fh:
+            data = fh.read(length)
+    except OSError:
+        return None
+    if len(data) < length:
+        return None
+    return hashlib.sha256(data).hexdigest()
+
+
+def default_db_path() -> Path:
+    db_dir = repo_root() / "data"
+    db_dir.mkdir(parents=True, exist_ok=True)
+    return db_dir / "trajectory_index.sqlite3"
+
+
+def default_trajectories_root() -> Path:
+    return repo_root() / "trajectories" / "raw"
+
+
+def _as_float(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_int(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _row_fields(record: Mapping[str, Any]) -> Tuple[Any, ...]:
+    """Extract the indexed scalar columns from a trajectory record."""
+    teacher = record.get("teacher") or {}
+    metrics = record.get("metrics") or {}
+    sandbox = record.get("sandbox_result") or {}
+    model_output = record.get("model_output") or {}
+    if not isinstance(teacher, dict):
+        teacher = {}
+    if not isinstance(metrics, dict):
+        metrics = {}
+    if not isinstance(sandbox, dict):
+        sandbox = {}
+    if not isinstance(model_output, dict):
+        model_output = {}
+    task_id = record.get("task_id")
+    model = teacher.get("model")
+    parse_error = model_output.get("parse_error")
+    sandbox_failed = metrics.get("sandbox_failed")
+    return (
+        str(task_id) if task_id is not None else None,
+        _as_int(record.get("step")),
+        str(model) if model is not None else None,
+        _as_float(record.get("reward")),
+        _as_int(sandbox.get("exit_code")),
+        None if sandbox_failed is None else int(bool(sandbox_failed)),
+        str(parse_error) if parse_error else None,
+        _as_float(metrics.get("actor_latency_sec")),
+        _as_float(metrics.get("teacher_latency_sec")),
+        _as_float(sandbox.get("duration_sec")),
+    )
+
+
+@dataclass
+class UpdateSummary:
+    files_scanned: int = 0
+    files_reindexed: int = 0
+    files_removed: int = 0
+    records_added: int = 0
+    bytes_read: int = 0
+
+
+class TrajectoryIndex:
+    """Query index over the trajectory store, backed by a SQLite file."""
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path) if db_path is not None else default_db_path()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path)
+        for stmt in _SCHEMA:
+            self._conn.execute(stmt)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}
+        for name, decl in _FILES_UPGRADE:
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE files ADD COLUMN {name} {decl}")
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "TrajectoryIndex":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    # -- maintenance -----------------------------------------------------
+
+    def update(self, root: Optional[Path] = None) -> UpdateSummary:
+        """Bring the index up to date with the JSONL files under ``root``."""
+        root = Path(root) if root is not None else default_trajectories_root()
+        summary = UpdateSummary()
+        known: Dict[str, Tuple[Any, ...]] = {
+            row[0]: row[1:]
+            for row in self._conn.execute(
+                "SELECT path, size, mtime, indexed_bytes, inode, head_len, head FROM files"
+            )
+        }
+        seen: set[str] = set()
+        paths = sorted(root.glob("*.jsonl")) if root.exists() else []
+        for path in paths:
+            key = str(path.resolve())
+            seen.add(key)
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            summary.files_scanned += 1
+            start = 0
+            prev = known.get(key)
+            if prev is not None:
+                prev_size, prev_mtime, prev_indexed, prev_inode, prev_head_len, prev_head = prev
+                same_file = st.st_ino == prev_inode
+                if same_file and st.st_size == prev_size and st.st_mtime == prev_mtime:
+                    continue
+                if (
+                    same_file
+                    and st.st_size >= prev_indexed
+                    and st.st_size >= prev_size
+                    and head_digest(path, prev_head_len) == prev_head
+                ):
+                    start = prev_indexed
+                else:
+                    # Truncated or rewritten: drop stale rows and start over.
+                    self._conn.execute("DELETE FROM steps WHERE file = ?", (key,))
+                    summary.files_reindexed += 1
+            added, end = self._index_file(path, key, start)
+            summary.records_added += added
+            summary.bytes_read += end - start
+            head_len = min(st.st_size, HEAD_BYTES)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files(path, size, mtime, indexed_bytes, inode, head_len, head)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, st.st_size, st.st_mtime, end, st.st_ino, head_len, head_digest(path, head_len)),
+            )
+            self._conn.commit()
+
+        resolved = root.resolve()
+        for key in set(known) - seen:
+            # Only files directly under this root; a prefix check would also
+            # match a sibling such as ``raw_old``.
+            if Path(key).parent != resolved:
+                continue
+            self._conn.execute("DELETE FROM steps WHERE file = ?", (key,))
+            self._conn.execute("DELETE FROM files WHERE path = ?", (key,))
+            summary.files_removed += 1
+        self._conn.commit()
+        return summary
+
+    def _index_file(self, path: Path, key: str, start: int) -> Tuple[int, int]:
+        """Index complete lines from ``start``; return (records added, end offset).
+
+        A trailing line without a newline may still be being written. It is
+        indexed only if it already parses as a JSON object, and the returned
+        offset stops before it so the next update revisits it (rows are keyed
+        by ``(file, offset)``, so re-indexing it is idempotent).
+        """
+        rows: List[Tuple[Any, ...]] = []
+        offset = start
+        end = start
+        with path.open("rb") as fh:
+            fh.seek(start)
+            for line in fh:
+                line_offset = offset
+                offset += len(line)
+                complete = line.endswith(b"\n")
+                if complete:
+                    end = offset
+                stripped = line.strip()
+                if not stripped:
+                    continue
+                try:
+                    record = codec.loads(stripped)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+                if not isinstance(record, dict):
+                    continue
+                rows.append((key, line_offset, len(line)) + _row_fields(record))
+        if rows:
+            self._conn.executemany(_INSERT_STEP, rows)
+        return len(rows), end
+
+    # -- queries ---------------------------------------------------------
+
+    def locate(
+        self,
+        *,
+        model: Optional[str] = None,
+        task_id: Optional[str] = None,
+        exit_code: Optional[int] = None,
+        reward_gt: Optional[float] = None,
+        reward_ge: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[str, int, int]]:
+        """Return ``(file, offset, length)`` for every matching record."""
+        clauses: List[str] = []
+        params: List[Any] = []
+        if model is not None:
+            clauses.append("model = ?")
+            params.append(model)
+        if task_id is not None:
+            clauses.append("task_id = ?")
+            params.append(task_id)
+        if exit_code is not None:
+            clauses.append("exit_code = ?")
+            params.append(int(exit_code))
+        if reward_gt is not None:
+            clauses.append("reward > ?")
+            params.append(float(reward_gt))
+        if reward_ge is not None:
+            clauses.append("reward >= ?")
+            params.append(float(reward_ge))
+        sql = "SELECT file, offset, length FROM steps"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY file, offset"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return [(f, o, n) for f, o, n in self._conn.execute(sql, params)]
+
+    def query(self, **filters: Any) -> Iterator[Dict[str, Any]]:
+        """Yield full records matching ``filters`` (see ``locate``) by seeking."""
+        handle = None
+        current: Optional[str] = None
+        try:
+            for file, offset, length in self.locate(**filters):
+                if file != current:
+                    if handle is not None:
+                        handle.close()
+                    handle = open(file, "rb")
+                    current = file
+                handle.seek(offset)
+                yield codec.loads(handle.read(length))
+        finally:
+            if handle is not None:
+                handle.close()
+
+    def model_aggregates(self) -> Dict[str, Tuple[int, float, int]]:
+        """Return ``model -> (steps, reward_sum, verified)`` for rewarded steps.
+
+        Steps without a teacher model are grouped under ``"unknown"``, matching
+        ``scripts.report_teacher_metrics``.
+        """
+        out: Dict[str, Tuple[int, float, int]] = {}
+        cur = self._conn.execute(
+            "SELECT COALESCE(NULLIF(model, ''), 'unknown'), COUNT(*), SUM(reward),"
+            " SUM(CASE WHEN reward > 0 THEN 1 ELSE 0 END)"
+            " FROM steps WHERE reward IS NOT NULL GROUP BY 1"
+        )
+        for model, steps, reward_sum, verified in cur:
+            out[str(model)] = (int(steps), float(reward_sum or 0.0), int(verified or 0))
+        return out
+
+    def iter_latencies(self) -> Iterator[Tuple[str, Optional[float], Optional[float], Optional[float]]]:
+        """Yield ``(model, actor_latency_sec, teacher_latency_sec, duration_sec)`` per step."""
+        cur = self._conn.execute(
+            "SELECT COALESCE(NULLIF(model, ''), 'unknown'), actor_latency_sec,"
+            " teacher_latency_sec, duration_sec FROM steps"
+            " WHERE actor_latency_sec IS NOT NULL OR teacher_latency_sec IS NOT NULL"
+            " OR duration_sec IS NOT NULL"
+        )
+        for model, actor, teacher, duration in cur:
+            yield str(model), actor, teacher, duration
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.trajectories.index")
+    parser.add_argument(
+        "--db",
+        default=None,
+        help="Path to the index database (default: data/trajectory_index.sqlite3).",
+    )
+    parser.add_argument(
+        "--traj-root",
+        default=None,
+        help="Trajectory directory to index (default: trajectories/raw).",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("update", help="Index new or appended trajectory records")
+
+    query_parser = subparsers.add_parser("query", help="Print matching records as JSONL")
+    query_parser.add_argument("--model", default=None)
+    query_parser.add_argument("--task-id", dest="task_id", default=None)
+    query_parser.add_argument("--exit-code", dest="exit_code", type=int, default=None)
+    query_parser.add_argument("--reward-gt", dest="reward_gt", type=float, default=None)
+    query_parser.add_argument("--reward-ge", dest="reward_ge", type=float, default=None)
+    query_parser.add_argument("--limit", type=int, default=None)
+    query_parser.add_argument(
+        "--no-update",
+        action="store_true",
+        help="Query the index as-is without picking up new records first.",
+    )
+
+    args = parser.parse_args(argv)
+    traj_root = Path(args.traj_root) if args.traj_root else None
+    with TrajectoryIndex(Path(args.db) if args.db else None) as index:
+        if args.command == "update":
+            summary = index.update(traj_root)
+            print(
+                f"scanned={summary.files_scanned} added={summary.records_added} "
+                f"reindexed={summary.files_reindexed} removed={summary.files_removed} "
+                f"bytes={summary.bytes_read}"
+            )
+            return
+        if not args.no_update:
+            index.update(traj_root)
+        for record in index.query(
+            model=args.model,
+            task_id=args.task_id,
+            exit_code=args.exit_code,
+            reward_gt=args.reward_gt,
+            reward_ge=args.reward_ge,
+            limit=args.limit,
+        ):
+            sys.stdout.write(codec.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Follow trajectory JSONL files while they are being written.
+
+``TrajectoryTailer`` remembers a byte offset per file and, on every ``poll``,
+returns only the complete lines appended since the previous call. A final
+line without a newline is buffered until its writer finishes it, new shards
+are picked up as they appear, and files that are truncated or replaced are
+re-read from the start. A file counts as replaced when its inode changes,
+when it shrinks below the offset, or when its first bytes no longer match
+what was read (a rewrite that already grew past the offset); ``poll_files``
+reports these resets so callers can drop what they derived from the old
+contents. A deleted file is reported as a reset with no lines and forgotten.
+Unchanged files cost one ``stat`` per poll.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Leading bytes kept per file to recognize in-place rewrites.
+_HEAD_BYTES = 256
+
+
+@dataclass
+class _FileCursor:
+    inode: int
+    offset: int = 0
+    mtime_ns: int = 0
+    pending: bytes = b""
+    head: bytes = b""
+
+
+class TrajectoryTailer:
+    """Incremental reader over ``root/*.jsonl``."""
+
+    def __init__(self, root: Path, *, from_end: bool = False):
+        self.root = Path(root)
+        self._cursors: Dict[str, _FileCursor] = {}
+        self.bytes_read = 0
+        if from_end:
+            for path, st in self._list():
+                try:
+                    with open(path, "rb") as fh:
+                        head = fh.read(min(st.st_size, _HEAD_BYTES))
+                except OSError:
+                    continue
+                self._cursors[path] = _FileCursor(
+                    inode=st.st_ino, offset=st.st_size, mtime_ns=st.st_mtime_ns, head=head
+                )
+
+    def _list(self) -> List[Tuple[str, os.stat_result]]:
+        if not self.root.exists():
+            return []
+        entries: List[Tuple[str, os.stat_result]] = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if not entry.name.endswith(".jsonl"):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.path, st))
+        entries.sort(key=lambda item: item[0])
+        return entries
+
+    def poll(self) -> List[bytes]:
+        """Return complete lines appended to any file since the last poll."""
+        return [line for _, lines, _ in self.poll_files() for line in lines]
+
+    def poll_files(self) -> List[Tuple[str, List[bytes], bool]]:
+        """Return ``(path, new lines, reset)`` for every file that changed.
+
+        ``reset`` is True when the file was truncated, replaced or deleted:
+        its lines start over from the beginning (a deleted file has none),
+        and everything returned for it before is void.
+        """
+        changes: List[Tuple[str, List[bytes], bool]] = []
+        listed = self._list()
+        present = {path for path, _ in listed}
+        for path in sorted(set(self._cursors) - present):
+            del self._cursors[path]
+            changes.append((path, [], True))
+        for path, st in listed:
+            cursor = self._cursors.get(path)
+            reset = cursor is not None and (cursor.inode != st.st_ino or st.st_size < cursor.offset)
+            if cursor is None or reset:
+                cursor = _FileCursor(inode=st.st_ino)
+                self._cursors[path] = cursor
+            if st.st_size == cursor.offset and st.st_mtime_ns == cursor.mtime_ns:
+                if reset:
+                    changes.append((path, [], True))
+                continue
+            try:
+                with open(path, "rb") as fh:
+                    if cursor.head and fh.read(len(cursor.head)) != cursor.head:
+                        reset = True
+                        cursor = _FileCursor(inode=st.st_ino)
+                        self._cursors[path] = cursor
+                    fh.seek(cursor.offset)
+                    chunk = fh.read(st.st_size - cursor.offset)
+            except OSError:
+                continue
+            if cursor.offset == len(cursor.head) < _HEAD_BYTES:
+                cursor.head = (cursor.head + chunk)[:_HEAD_BYTES]
+            cursor.offset += len(chunk)
+            cursor.mtime_ns = st.st_mtime_ns
+            self.bytes_read += len(chunk)
+            data = cursor.pending + chunk
+            parts = data.split(b"\n")
+            cursor.pending = parts.pop()
+            lines = [part for part in parts if part.strip()]
+            if lines or reset:
+                changes.append((path, lines, reset))
+        return changes
+
+
+__all__ = ["TrajectoryTailer"]
@@ -30,6 +30,9 @@ class DummyClient:
     def generate(self, *args: Any, **kwargs: Any) -> str:  # noqa: D401 - simple stub
         return self._text
 
+    def close(self) -> None:
+        pass
+
 
 def test_run_single_step_writes_trajectory_and_updates_state(tmp_path, monkeypatch):
     def fake_repo_root():
@@ -102,3 +105,97 @@ Reflect on the task.
     assert record["state_after"]["next_focus"] == "next step"
     assert record["sandbox_result"]["exit_code"] == 0
 
+
+
+def test_main_prefetches_state_per_window(tmp_path, monkeypatch):
+    tasks_path = tmp_path / "tasks.jsonl"
+    tasks_path.write_text(
+        "\n".join(json.dumps({"task_id": f"t{i}", "prompt": "p"}) for i in range(5)) + "\n",
+        encoding="utf-8",
+    )
+
+    prefetched = []
+    ran = []
+    monkeypatch.setattr(actor_loop, "MultiActorClient", lambda *args, **kwargs: DummyClient(""))
+    monkeypatch.setattr(actor_loop.state_manager, "load_many", lambda ids: prefetched.append(list(ids)))
+    monkeypatch.setattr(actor_loop, "run_single_step", lambda task, client, **_: ran.append(task["task_id"]))
+
+    actor_loop.main([str(tasks_path), "--prefetch-window", "2"])
+
+    assert prefetched == [["t0", "t1"], ["t2", "t3"], ["t4"]]
+    assert ran == ["t0", "t1", "t2", "t3", "t4"]
+
+
+def test_main_runs_one_shard_from_start_index(tmp_path, monkeypatch):
+    tasks_path = tmp_path / "tasks.jsonl"
+    tasks_path.write_text(
+        "\n".join(json.dumps({"task_id": f"t{i}", "prompt": "p"}) for i in range(7)) + "\n",
+        encoding="utf-8",
+    )
+
+    ran = []
+    monkeypatch.setattr(actor_loop, "MultiActorClient", lambda *args, **kwargs: DummyClient(""))
+    monkeypatch.setattr(actor_loop.state_manager, "load_many", lambda ids: list(ids))
+    monkeypatch.setattr(actor_loop, "run_single_step", lambda task, client, **_: ran.append(task["task_id"]))
+
+    actor_loop.main([str(tasks_path), "--shard", "1/2", "--start-index", "1"])
+
+    # crc32 puts t0..t3 in shard 1 of 2; the start index skips t0.
+    assert ran == ["t1", "t2", "t3"]
+
+
+def test_main_queue_mode_enqueues_and_drains(tmp_path, monkeypatch):
+    tasks_path = tmp_path / "tasks.jsonl"
+    tasks_path.write_text(
+        "\n".join(json.dumps({"task_id": f"t{i}", "prompt": "p"}) for i in range(3)) + "\n",
+        encoding="utf-8",
+    )
+    queue_path = tmp_path / "queue.sqlite3"
+
+    ran = []
+    monkeypatch.setattr(actor_loop, "MultiActorClient", lambda *args, **kwargs: DummyClient(""))
+    monkeypatch.setattr(actor_loop.state_manager, "load_many", lambda ids: list(ids))
+    monkeypatch.setattr(actor_loop, "run_single_step", lambda task, client, **_: ran.append(task["task_id"]))
+
+    actor_loop.main([str(tasks_path), "--queue", str(queue_path)])
+    # A second worker joining later finds nothing left to do.
+    actor_loop.main(["--queue", str(queue_path)])
+
+    assert ran == ["t0", "t1", "t2"]
+    assert actor_loop.WorkQueue(queue_path).stats()["done"] == 3
+
+
+def test_run_single_step_with_state_refs_records_history(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.actors.actor_loop.repo_root", lambda: tmp_path)
+    monkeypatch.setattr("src.state.manager._db_path", lambda: tmp_path / "state.sqlite3")
+    monkeypatch.setattr(actor_loop.sandbox_runner, "prepare_workspace", lambda task_id, files: tmp_path)
+    monkeypatch.setattr(actor_loop.sandbox_runner, "cleanup", lambda workspace: None)
+
+    for n in (1, 2):
+        client = DummyClient(f'<state_update>{{"history": ["step {n}"]}}</state_update>')
+        actor_loop.run_single_step({"task_id": "task-r", "prompt": "p"}, client=client, state_refs=True)
+
+    lines = (tmp_path / "trajectories" / "raw" / "task-r.jsonl").read_text().splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [r["state_ref"] for r in records] == [{"step": 1}, {"step": 2}]
+    assert all("state_after" not in r for r in records)
+    assert state_manager.load_at("task-r", 1).history == ["step 1"]
+    assert state_manager.load_at("task-r", 2).history == ["step 1", "step 2"]
+
+
+def test_run_single_step_records_span_breakdown(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.actors.actor_loop.repo_root", lambda: tmp_path)
+    monkeypatch.setattr("src.state.manager._db_path", lambda: tmp_path / "state.sqlite3")
+    monkeypatch.setattr(actor_loop.sandbox_runner, "prepare_workspace", lambda task_id, files: tmp_path)
+    monkeypatch.setattr(actor_loop.sandbox_runner, "cleanup", lambda workspace: None)
+    client = DummyClient('<state_update>{"history": ["x"]}</state_update>')
+
+    actor_loop.tracing.enable()
+    try:
+        actor_loop.run_single_step({"task_id": "traced", "prompt": "p"}, client=client)
+    finally:
+        actor_loop.tracing.disable()
+
+    record = json.loads((tmp_path / "trajectories" / "raw" / "traced.jsonl").read_text())
+    spans = record["metrics"]["spans"]
+    assert {"state.load", "prompt.build", "generate", "parse", "state.merge", "state.save"} <= set(spans)
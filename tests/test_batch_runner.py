@@ -0,0 +1,112 @@
+import json
+import threading
+
+from src.teachers import batch_runner
+
+
+def _write_tasks(path, n):
+    path.write_text("".join(json.dumps({"task_id": f"t{i}", "prompt": "p"}) + "\n" for i in range(n)))
+
+
+def _records(out_dir):
+    lines = []
+    for shard in sorted(out_dir.glob("shard-*.jsonl")):
+        lines.extend(json.loads(line) for line in shard.read_text().splitlines())
+    return lines
+
+
+def test_run_batch_shards_records_and_resumes_without_duplicates(tmp_path):
+    tasks = tmp_path / "tasks.jsonl"
+    _write_tasks(tasks, 20)
+    out_dir = tmp_path / "out"
+    seen = []
+    lock = threading.Lock()
+
+    def flaky_step(task, *, client=None, writer=None, step=None):
+        writer(task["task_id"], {"task_id": task["task_id"], "step": step})
+        if task["task_id"] in {"t3", "t7"}:
+            raise RuntimeError("sandbox exploded")
+        with lock:
+            seen.append(task["task_id"])
+
+    stats = batch_runner.run_batch(tasks, out_dir, workers=4, step_fn=flaky_step)
+    assert (stats.completed, stats.failed, stats.skipped) == (18, 2, 0)
+    assert len(list(out_dir.glob("shard-*.jsonl"))) == 4
+    # Failed tasks' partial records were rolled back.
+    assert sorted(r["task_id"] for r in _records(out_dir)) == sorted(seen)
+
+    # Simulate a crash mid-task: a record past the last ledger entry.
+    with (out_dir / "shard-000.jsonl").open("a") as fh:
+        fh.write(json.dumps({"task_id": "t3", "step": 1}) + "\n")
+
+    def step_fn(task, *, client=None, writer=None, step=None):
+        writer(task["task_id"], {"task_id": task["task_id"], "step": step})
+
+    stats = batch_runner.run_batch(tasks, out_dir, workers=2, step_fn=step_fn)
+    assert (stats.completed, stats.failed, stats.skipped) == (2, 0, 18)
+    ids = [r["task_id"] for r in _records(out_dir)]
+    assert sorted(ids) == sorted(f"t{i}" for i in range(20))
+
+    done, _ = batch_runner.read_ledger(out_dir)
+    assert len(done) == 20
+
+
+def test_resume_with_fewer_workers_truncates_every_shard(tmp_path):
+    tasks = tmp_path / "tasks.jsonl"
+    _write_tasks(tasks, 12)
+    out_dir = tmp_path / "out"
+
+    def step_fn(task, *, client=None, writer=None, step=None):
+        writer(task["task_id"], {"task_id": task["task_id"], "step": step})
+
+    def failing_step(task, *, client=None, writer=None, step=None):
+        if task["task_id"] in {"t10", "t11"}:
+            raise RuntimeError("killed")
+        step_fn(task, writer=writer, step=step)
+
+    batch_runner.run_batch(tasks, out_dir, workers=4, step_fn=failing_step)
+    # A crash mid-task on a shard the next run will not open: one whole
+    # record and one torn line past the last ledger entry.
+    with (out_dir / "shard-003.jsonl").open("a") as fh:
+        fh.write(json.dumps({"task_id": "t10", "step": 1}) + "\n" + '{"task_id": "t1')
+    # A shard that never made it into the ledger.
+    (out_dir / "shard-005.jsonl").write_text(json.dumps({"task_id": "t11", "step": 1}) + "\n")
+
+    stats = batch_runner.run_batch(tasks, out_dir, workers=2, step_fn=step_fn)
+    assert (stats.completed, stats.failed, stats.skipped) == (2, 0, 10)
+    ids = [r["task_id"] for r in _records(out_dir)]
+    assert sorted(ids) == sorted(f"t{i}" for i in range(12))
+
+
+def test_repeated_task_lines_run_as_ordered_steps(tmp_path):
+    tasks = tmp_path / "tasks.jsonl"
+    lines = [{"task_id": "a", "n": 1}, {"task_id": "b", "n": 1}, {"task_id": "a", "n": 2}, {"task_id": "a", "n": 3}]
+    tasks.write_text("".join(json.dumps(line) + "\n" for line in lines))
+    out_dir = tmp_path / "out"
+    active = set()
+    lock = threading.Lock()
+
+    def step_fn(task, *, client=None, writer=None, step=None):
+        with lock:
+            assert task["task_id"] not in active  # steps of one task never overlap
+            active.add(task["task_id"])
+        writer(task["task_id"], {"task_id": task["task_id"], "step": step, "n": task["n"]})
+        with lock:
+            active.discard(task["task_id"])
+        if task["task_id"] == "a" and step == 2:
+            raise RuntimeError("boom")
+
+    stats = batch_runner.run_batch(tasks, out_dir, workers=4, step_fn=step_fn)
+    # a's third step waits for its second, which failed.
+    assert (stats.completed, stats.failed, stats.skipped) == (2, 2, 0)
+    assert sorted((r["task_id"], r["step"]) for r in _records(out_dir)) == [("a", 1), ("b", 1)]
+
+    def ok_step(task, *, client=None, writer=None, step=None):
+        writer(task["task_id"], {"task_id": task["task_id"], "step": step, "n": task["n"]})
+
+    stats = batch_runner.run_batch(tasks, out_dir, workers=4, step_fn=ok_step)
+    assert (stats.completed, stats.failed, stats.skipped) == (2, 0, 2)
+    records = sorted((r["task_id"], r["step"], r["n"]) for r in _records(out_dir))
+    assert records == [("a", 1, 1), ("a", 2, 2), ("a", 3, 3), ("b", 1, 1)]
+    done, _ = batch_runner.read_ledger(out_dir)
+    assert done == {("a", 1), ("a", 2), ("a", 3), ("b", 1)}
@@ -0,0 +1,80 @@
+import datetime
+import enum
+import json
+import math
+import random
+from dataclasses import dataclass
+
+import pytest
+
+from src.data import codec
+
+
+RECORD = {
+    "task_id": "t1",
+    "step": 3,
+    "prompt": "Refactor `foo` — keep ünïcode as-is",
+    "model_output": {"think": "x", "action": {"command": ["ast-grep", "-p", "$A"]}, "parse_error": None},
+    "reward": 1.0,
+    "metrics": {"teacher_latency_sec": 0.125, "sandbox_failed": False},
+}
+
+
+@pytest.fixture(params=["fast", "stdlib"])
+def backend(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(codec, "orjson", None)
+    elif codec.orjson is None:
+        pytest.skip("orjson not installed")
+    return request.param
+
+
+def test_dumps_is_compact_and_roundtrips(backend):
+    expected = json.dumps(RECORD, ensure_ascii=False, separators=(",", ":"))
+    assert codec.dumps(RECORD) == expected
+    assert codec.dumpb(RECORD) == expected.encode("utf-8")
+    assert codec.loads(codec.dumpb(RECORD)) == RECORD
+    assert codec.loads(expected) == RECORD
+
+
+def test_falls_back_for_inputs_the_fast_backend_rejects(backend):
+    assert codec.loads(codec.dumps({1: 2**70})) == {"1": 2**70}
+    assert codec.loads('{"x": NaN}')["x"] != codec.loads('{"x": NaN}')["x"]
+    with pytest.raises(json.JSONDecodeError):
+        codec.loads("{not json")
+
+
+class Level(enum.IntEnum):
+    LOW = 1
+
+
+@dataclass
+class Point:
+    x: int
+
+
+def test_matches_stdlib_output_and_round_trips(backend):
+    rng = random.Random(0)
+    floats = [rng.uniform(-1, 1) * 10.0 ** rng.randint(-30, 30) for _ in range(500)]
+    values = [
+        RECORD,
+        floats,
+        [1e-05, 1e-4, 1e16, 1e22, -0.0, 5e-324, 0.1, 1.5e300, 1234567890123456.0],
+        {"nan": math.nan, "inf": math.inf, "-inf": -math.inf, "none": None},
+        {"big": 2**70, "neg": -(2**63) - 1, "u64": 2**64 - 1, "level": Level.LOW},
+        ("tuple", ["nested", {"deep": [1.0, None, True]}]),
+    ]
+    for value in values:
+        expected = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        assert codec.dumps(value) == expected
+        assert codec.dumpb(value) == expected.encode("utf-8")
+        assert codec.dumps(codec.loads(codec.dumpb(value))) == expected
+    assert codec.loads("[18446744073709551616, -9223372036854775809]") == [2**64, -(2**63) - 1]
+
+
+def test_rejects_what_the_stdlib_rejects(backend):
+    for value in (Point(1), datetime.datetime(2024, 1, 1), {1j: 1}, object()):
+        with pytest.raises(TypeError):
+            codec.dumps(value)
+        with pytest.raises(TypeError):
+            codec.dumpb(value)
@@ -1,3 +1,4 @@
+import sys
 from pathlib import Path
 
 from src.dataset import download_all
@@ -35,3 +36,36 @@ def test_download_all_datasets_invokes_each_downloader(tmp_path, monkeypatch, ca
     assert calls[1][1:] == ["-m", "dataset.foo.download", "--metadata-only"]
     assert "==> [bar] running:" in out
     assert "==> [foo] running:" in out
+
+
+def test_download_all_parallel_runs_largest_first_with_prefixed_logs(monkeypatch, capsys):
+    cfg = {
+        "small": {"approx_size_gb": 0.1},
+        "big": {"approx_size_gb": 5.0},
+        "broken": {"approx_size_gb": 1.0},
+    }
+    assert download_all.schedule(cfg) == ["big", "broken", "small"]
+
+    def fake_command(name, metadata_only):
+        code = (
+            f"import sys; sys.stdout.write('{name} 10%\\r{name} 50%\\r{name} 100%\\n'); "
+            f"print('fetching {name}'); sys.exit({1 if name == 'broken' else 0})"
+        )
+        return [sys.executable, "-c", code]
+
+    monkeypatch.setattr(download_all, "_command", fake_command)
+
+    results = download_all.run_all(cfg, jobs=2)
+    download_all.print_summary(results, 1.0)
+    captured = capsys.readouterr()
+
+    assert [r.name for r in results] == ["big", "broken", "small"]
+    assert [r.ok for r in results] == [True, False, True]
+    assert "[big] fetching big" in captured.out
+    assert "[small] fetching small" in captured.out
+    assert "[big] big 100%" in captured.out
+    assert "[big] big 10%" not in captured.out
+    assert "[big] big 50%" not in captured.out
+    assert "Dataset 'broken' failed with exit code 1" in captured.err
+    assert "2/3 succeeded" in captured.out
+    assert "failed: broken" in captured.out
@@ -1,9 +1,12 @@
 import io
+import json
+import re
 import tarfile
 import zipfile
 
 import pytest
 
+from src.data import download_utils
 from src.data.download_utils import (
     DownloadError,
     compute_directory_sha256,
@@ -46,6 +49,90 @@ def test_download_http_resource_validates_checksum(monkeypatch, tmp_path):
     assert target.read_bytes() == payload
 
 
+class RangeResponse(DummyResponse):
+    def __init__(self, payload, *, status=200, headers=None, fail_after=None):
+        super().__init__(payload)
+        self.status = status
+        self.headers = headers or {}
+        self._fail_after = fail_after
+
+    def read(self, size=-1):
+        if self._fail_after is not None:
+            remaining = self._fail_after - self.tell()
+            if remaining <= 0:
+                raise ConnectionResetError("connection dropped")
+            size = remaining if size < 0 else min(size, remaining)
+        return super().read(size)
+
+
+def range_server(payload, etag='"v1"', *, drop_first_after=None):
+    """Fake urlopen serving ``payload`` with Range/If-Range support; records each request."""
+    calls = []
+
+    def urlopen(request_obj, timeout=300):  # noqa: ANN001 - signature defined by urllib
+        rng = request_obj.get_header("Range")
+        calls.append((request_obj.get_method(), rng, request_obj.get_header("If-range")))
+        headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+        if request_obj.get_method() == "HEAD":
+            return RangeResponse(b"", headers={**headers, "Content-Length": str(len(payload))})
+        fail_after = drop_first_after if len(calls) == 1 else None
+        match = re.match(r"bytes=(\d+)-(\d*)", rng or "")
+        if match and request_obj.get_header("If-range") == etag:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(payload) - 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(payload)}"
+            return RangeResponse(payload[start : end + 1], status=206, headers=headers, fail_after=fail_after)
+        headers["Content-Length"] = str(len(payload))
+        return RangeResponse(payload, headers=headers, fail_after=fail_after)
+
+    return urlopen, calls
+
+
+def test_download_http_resource_resumes_after_dropped_connection(monkeypatch, tmp_path):
+    payload = bytes(range(256)) * 40
+    urlopen, calls = range_server(payload, drop_first_after=3000)
+    monkeypatch.setattr("src.data.download_utils.request.urlopen", urlopen)
+    target = tmp_path / "archive.zip"
+
+    download_http_resource("https://example.com/archive.zip", target, backoff_sec=0)
+
+    assert target.read_bytes() == payload
+    assert calls[1] == ("GET", "bytes=3000-", '"v1"')
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["archive.zip"]
+
+
+def test_download_http_resource_restarts_when_resource_changed(monkeypatch, tmp_path):
+    payload = b"new contents " * 100
+    target = tmp_path / "archive.zip"
+    (tmp_path / "archive.zip.part").write_bytes(b"old")
+    (tmp_path / "archive.zip.part.json").write_text(
+        json.dumps({"url": "https://example.com/archive.zip", "etag": '"v0"', "size": 999})
+    )
+    urlopen, calls = range_server(payload, etag='"v1"')
+    monkeypatch.setattr("src.data.download_utils.request.urlopen", urlopen)
+
+    download_http_resource("https://example.com/archive.zip", target)
+
+    # The stale partial was offered with its old ETag, and the full body replaced it.
+    assert calls == [("GET", "bytes=3-", '"v0"')]
+    assert target.read_bytes() == payload
+
+
+def test_download_http_resource_fetches_parallel_ranges(monkeypatch, tmp_path):
+    payload = bytes(range(256)) * 64
+    urlopen, calls = range_server(payload)
+    monkeypatch.setattr("src.data.download_utils.request.urlopen", urlopen)
+    monkeypatch.setattr(download_utils, "MIN_PARALLEL_BYTES", 1024)
+    target = tmp_path / "archive.zip"
+
+    download_http_resource("https://example.com/archive.zip", target, parallel_ranges=4)
+
+    assert target.read_bytes() == payload
+    ranges = sorted(rng for method, rng, _ in calls if method == "GET")
+    assert ranges == ["bytes=0-4095", "bytes=12288-16383", "bytes=4096-8191", "bytes=8192-12287"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["archive.zip"]
+
+
 def test_extract_archive_blocks_zip_path_traversal(tmp_path):
     archive = tmp_path / "bad.zip"
     with zipfile.ZipFile(archive, "w") as zf:
@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from src.actors import flow_control
+from src.actors.flow_control import AdaptiveLimiter, TokenBucket
+from src.actors.vllm_client import VLLMClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_limiter_grows_on_fast_responses_and_backs_off_once_per_window():
+    clock = FakeClock()
+    limiter = AdaptiveLimiter(4, max_limit=8, clock=clock)
+    for _ in range(40):
+        started = limiter.acquire()
+        clock.now += 0.01
+        limiter.release(started, ok=True, latency=0.01)
+    assert limiter.limit == 8
+
+    # Four requests of one window come back slow; the limit is cut once.
+    starts = [limiter.acquire() for _ in range(4)]
+    clock.now += 1
+    for started in starts:
+        limiter.release(started, ok=True, latency=0.05)
+    assert limiter.limit == pytest.approx(8 * 0.7)
+    assert limiter.decreases == 1
+
+    clock.now += 0.01
+    started = limiter.acquire()
+    clock.now += 1
+    limiter.release(started, ok=False)
+    assert limiter.limit == pytest.approx(8 * 0.7 * 0.7)
+
+
+def test_token_bucket_paces_requests():
+    clock = FakeClock()
+    bucket = TokenBucket(10, burst=2, clock=clock, sleep=clock.sleep)
+    waits = [bucket.acquire() for _ in range(6)]
+    assert waits[:2] == [0.0, 0.0]
+    assert clock.now == pytest.approx(0.4)
+    # An oversized request waits for a full bucket, then leaves it in debt.
+    bucket.acquire(5)
+    bucket.refund(3)
+    assert bucket._tokens == pytest.approx(0.0)
+
+
+def test_client_caps_in_flight_requests_and_shrinks_on_overload(monkeypatch, tmp_path):
+    cfg_path = tmp_path / "vllm_actors.yaml"
+    cfg_path.write_text(
+        "actors:\n"
+        "  - name: a0\n"
+        "    base_url: http://localhost:9998\n"
+        "    model: dummy\n"
+        "    max_concurrency: 2\n"
+        "initial_concurrency: 2\n"
+    )
+    monkeypatch.setattr("src.actors.vllm_client._config_path", lambda: cfg_path)
+    monkeypatch.setattr(flow_control, "_registry", {})
+
+    active = []
+    peak = []
+    lock = threading.Lock()
+    status = {"code": 200}
+
+    class Response:
+        def __init__(self, code):
+            self.status_code = code
+
+        def json(self):
+            return {"text": ["ok"]}
+
+        def raise_for_status(self):
+            if self.status_code >= 400:
+                raise RuntimeError(f"HTTP {self.status_code}")
+
+    def fake_post(url, json, timeout):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.01)
+        with lock:
+            active.pop()
+        return Response(status["code"])
+
+    monkeypatch.setattr("src.actors.vllm_client.requests.post", fake_post)
+    client = VLLMClient(actor_name="a0")
+    threads = [threading.Thread(target=client.generate, args=("hi",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) <= 2
+    assert client.limits()["successes"] == 8
+
+    status["code"] = 503
+    with pytest.raises(RuntimeError):
+        client.generate("hi")
+    stats = client.limits()
+    assert stats["failures"] == 1 and stats["limit"] < 2
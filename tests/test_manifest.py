@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from src.data.manifest import TaskManifest, parse_shard
+
+
+def _write_tasks(path, count):
+    lines = [json.dumps({"task_id": f"t{i}", "prompt": "p"}) for i in range(count)]
+    # Blank lines are not tasks.
+    lines.insert(3, "")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def _ids(tasks):
+    return [task["task_id"] for task in tasks]
+
+
+def test_manifest_index_random_access_and_reuse(tmp_path):
+    path = tmp_path / "tasks.jsonl"
+    _write_tasks(path, 10)
+
+    with TaskManifest(path) as manifest:
+        assert len(manifest) == 10
+        assert manifest[7]["task_id"] == "t7"
+        assert _ids(manifest.iter_tasks()) == [f"t{i}" for i in range(10)]
+    index = path.with_name("tasks.jsonl.idx")
+    assert index.exists()
+
+    # A changed manifest invalidates the cached index.
+    with path.open("a", encoding="utf-8") as fh:
+        fh.write(json.dumps({"task_id": "t10", "prompt": "p"}))
+    with TaskManifest(path) as manifest:
+        assert len(manifest) == 11
+        assert manifest[10]["task_id"] == "t10"
+
+
+def test_manifest_shards_partition_shuffled_order_and_resume(tmp_path):
+    path = tmp_path / "tasks.jsonl"
+    _write_tasks(path, 23)
+
+    with TaskManifest(path) as manifest:
+        shards = [_ids(manifest.iter_tasks(shard=(i, 3), seed=5)) for i in range(3)]
+        assert sorted(sum(shards, [])) == sorted(f"t{i}" for i in range(23))
+        assert shards[0] == _ids(manifest.iter_tasks(shard=(0, 3), seed=5))
+        assert sum(shards, []) != [f"t{i}" for i in range(23)]
+        assert _ids(manifest.iter_tasks(shard=(1, 3), seed=5, start=2)) == shards[1][2:]
+
+
+def test_manifest_keeps_a_tasks_steps_together_and_in_order(tmp_path):
+    path = tmp_path / "tasks.jsonl"
+    lines = [{"task_id": f"t{i % 7}", "step": i // 7} for i in range(35)]
+    path.write_text("\n".join(json.dumps(line) for line in lines) + "\n", encoding="utf-8")
+
+    with TaskManifest(path) as manifest:
+        for seed in (None, 3):
+            shards = [list(manifest.iter_tasks(shard=(i, 3), seed=seed)) for i in range(3)]
+            assert sorted(len(shard) for shard in shards) != [0, 0, 35]
+            owners = {}
+            for index, shard in enumerate(shards):
+                for task in shard:
+                    assert owners.setdefault(task["task_id"], index) == index
+            for shard in shards:
+                steps = {}
+                for task in shard:
+                    steps.setdefault(task["task_id"], []).append(task["step"])
+                assert all(found == list(range(5)) for found in steps.values())
+                # Shuffling moves whole tasks: each task's lines are contiguous.
+                if seed is not None:
+                    ids = _ids(shard)
+                    assert all(ids[k : k + 5] == [ids[k]] * 5 for k in range(0, len(ids), 5))
+
+
+def test_parse_shard():
+    assert parse_shard("2/4") == (2, 4)
+    for bad in ("4/4", "1", "a/2", "0/0"):
+        with pytest.raises(ValueError):
+            parse_shard(bad)
@@ -0,0 +1,66 @@
+import pytest
+
+from src.actors.output_parser import TagParser, parse_model_output
+
+
+SAMPLE = (
+    "preamble <think>\nplan it\n</think>\n"
+    '<action>\n{"command": ["ast-grep", "run"]}\n</action>\n'
+    '<state_update>{"history": ["ran"]}</state_update>'
+)
+
+
+def test_parse_model_output_extracts_blocks_and_spans():
+    parsed = parse_model_output(SAMPLE)
+    assert parsed["think"] == "plan it"
+    assert parsed["action"] == {"command": ["ast-grep", "run"]}
+    assert parsed["state_update"] == {"history": ["ran"]}
+    assert parsed["parse_error"] is None
+    assert parsed["tag_errors"] == []
+    start, end = parsed["spans"]["action"]
+    assert SAMPLE[start:end].strip() == '{"command": ["ast-grep", "run"]}'
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_chunked_feed_matches_whole_input(size):
+    parser = TagParser()
+    events = []
+    for i in range(0, len(SAMPLE), size):
+        events.extend(block.tag for block in parser.feed(SAMPLE[i : i + size]))
+    assert parser.finish() == []
+    assert events == ["think", "action", "state_update"]
+
+    whole = TagParser()
+    whole.feed(SAMPLE)
+    assert parser.blocks == whole.blocks
+
+
+def test_layout_errors_and_json_errors():
+    parsed = parse_model_output(
+        "<action>{bad json}</action><think>a</think><think>b</think><state_update>{}"
+    )
+    assert parsed["think"] == "a"
+    assert parsed["action"] is None
+    assert parsed["state_update"] is None
+    assert parsed["parse_error"] == "invalid_action_json"
+    assert parsed["tag_errors"] == ["out_of_order_think", "out_of_order_think", "unclosed_state_update"]
+
+    parsed = parse_model_output("<think>x</think><think>y</think>")
+    assert parsed["tag_errors"] == ["duplicate_think"]
+    assert parse_model_output("no tags < here")["spans"] == {}
+
+
+def test_unclosed_block_does_not_hide_later_blocks():
+    parsed = parse_model_output(
+        '<think>plan <action>{"command": ["ls"]}</action><state_update>{"history": ["x"]}</state_update>'
+    )
+    assert parsed["think"] is None
+    assert parsed["action"] == {"command": ["ls"]}
+    assert parsed["state_update"] == {"history": ["x"]}
+    assert parsed["tag_errors"] == ["unclosed_think"]
+
+    parser = TagParser()
+    for ch in "<think>a <action>{}</action> <state_update>{":
+        parser.feed(ch)
+    assert parser.finish() == ["unclosed_think", "unclosed_state_update"]
+    assert parser.blocks["action"].text == "{}"
@@ -6,6 +6,7 @@ from scripts import report_teacher_metrics
 def test_report_teacher_metrics_writes_per_model_stats(tmp_path, monkeypatch):
     # Point repo_root at a temporary directory.
     monkeypatch.setattr("src.data.schemas.repo_root", lambda: tmp_path)
+    monkeypatch.setattr("scripts.report_teacher_metrics.repo_root", lambda: tmp_path)
 
     traj_root = tmp_path / "trajectories" / "raw"
     traj_root.mkdir(parents=True, exist_ok=True)
@@ -38,3 +39,175 @@ def test_report_teacher_metrics_writes_per_model_stats(tmp_path, monkeypatch):
     assert "| m1 | 2 | 1 | 0.500 | 0.500 |" in content
     assert "| m2 | 1 | 1 | 1.000 | 1.000 |" in content
 
+
+
+def test_scan_trajectories_parallel_chunks_and_cache(tmp_path, monkeypatch):
+    traj_root = tmp_path / "raw"
+    traj_root.mkdir()
+    lines = [
+        '{"task_id":"t%d","step":1,"reward":%s,"teacher":{"model":"m1"}}' % (i, "1.0" if i % 2 else "0.0")
+        for i in range(40)
+    ]
+    path = traj_root / "big.jsonl"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    (traj_root / "other.jsonl").write_text('{"reward":1.0,"teacher":{"model":"m2"}}', encoding="utf-8")
+
+    # Force several byte ranges per file so chunk boundaries split lines.
+    monkeypatch.setattr(report_teacher_metrics, "_CHUNK_BYTES", 97)
+    cache_path = tmp_path / "cache.json"
+    stats = report_teacher_metrics._scan_trajectories(traj_root, jobs=2, cache_path=cache_path)
+    assert stats["m1"].steps == 40
+    assert stats["m1"].verified == 20
+    assert stats["m2"].steps == 1
+
+    with path.open("a", encoding="utf-8") as fh:
+        fh.write('{"reward":1.0,"teacher":{"model":"m1"}}\n')
+
+    scanned = []
+    original = report_teacher_metrics._scan_range
+
+    def tracking_scan_range(p, start, stop, size):
+        scanned.append((p, start))
+        return original(p, start, stop, size)
+
+    monkeypatch.setattr(report_teacher_metrics, "_scan_range", tracking_scan_range)
+    stats = report_teacher_metrics._scan_trajectories(traj_root, jobs=1, cache_path=cache_path)
+    assert stats["m1"].steps == 41
+    assert stats["m1"].verified == 21
+    # The unchanged prefix comes from the cache; only appended bytes and the
+    # unterminated line of the other file are read again.
+    assert all(start > 0 for p, start in scanned if p.endswith("big.jsonl"))
+    assert stats["m2"].steps == 1
+
+
+def test_scan_cache_rescans_files_rewritten_in_place(tmp_path):
+    traj_root = tmp_path / "raw"
+    traj_root.mkdir()
+    path = traj_root / "a.jsonl"
+    record = '{"reward":1.0,"teacher":{"model":"m1"}}\n'
+    path.write_text(record, encoding="utf-8")
+    cache_path = tmp_path / "cache.json"
+    stats = report_teacher_metrics._scan_trajectories(traj_root, jobs=1, cache_path=cache_path)
+    assert (stats["m1"].steps, stats["m1"].verified) == (1, 1)
+
+    # Rewritten with the same length first, then longer: neither is an append.
+    path.write_text(record.replace("1.0", "0.0"), encoding="utf-8")
+    stats = report_teacher_metrics._scan_trajectories(traj_root, jobs=1, cache_path=cache_path)
+    assert (stats["m1"].steps, stats["m1"].verified) == (1, 0)
+
+    path.write_text(record * 2, encoding="utf-8")
+    stats = report_teacher_metrics._scan_trajectories(traj_root, jobs=1, cache_path=cache_path)
+    assert (stats["m1"].steps, stats["m1"].verified) == (2, 2)
+
+
+def test_report_teacher_metrics_can_use_index(tmp_path):
+    traj_root = tmp_path / "trajectories" / "raw"
+    traj_root.mkdir(parents=True, exist_ok=True)
+    (traj_root / "sample.jsonl").write_text(
+        '{"task_id":"t1","step":1,"reward":1.0,"teacher":{"model":"m1"}}\n'
+        '{"task_id":"t2","step":1,"reward":0.0,"teacher":{"model":"m1"}}\n'
+        '{"task_id":"t3","step":1}\n',
+        encoding="utf-8",
+    )
+
+    out_path = tmp_path / "metrics.md"
+    args = [
+        "--traj-root",
+        str(traj_root),
+        "--output",
+        str(out_path),
+        "--use-index",
+        "--index-db",
+        str(tmp_path / "index.sqlite3"),
+    ]
+    report_teacher_metrics.main(args)
+    assert "| m1 | 2 | 1 | 0.500 | 0.500 |" in out_path.read_text(encoding="utf-8")
+
+    # A second run only picks up the appended record.
+    with (traj_root / "sample.jsonl").open("a", encoding="utf-8") as fh:
+        fh.write('{"task_id":"t4","step":1,"reward":1.0,"teacher":{"model":"m1"}}\n')
+    report_teacher_metrics.main(args)
+    assert "| m1 | 3 | 2 | 0.667 | 0.667 |" in out_path.read_text(encoding="utf-8")
+
+
+def test_report_teacher_metrics_renders_latency_quantiles(tmp_path):
+    traj_root = tmp_path / "raw"
+    traj_root.mkdir()
+    lines = [
+        '{"reward":1.0,"teacher":{"model":"m1"},"metrics":{"teacher_latency_sec":%s},'
+        '"sandbox_result":{"exit_code":0,"duration_sec":0.25}}' % (i + 1)
+        for i in range(100)
+    ]
+    lines.append('{"reward":null,"metrics":{"actor_latency_sec":0.5}}')
+    (traj_root / "a.jsonl").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    out_path = tmp_path / "metrics.md"
+    report_teacher_metrics.main(
+        ["--traj-root", str(traj_root), "--output", str(out_path), "--no-cache", "--jobs", "1"]
+    )
+    content = out_path.read_text(encoding="utf-8")
+
+    assert "## Latency" in content
+    assert "| m1 | teacher_latency_sec | 100 |" in content
+    assert "| m1 | sandbox_duration_sec | 100 | 250.0ms |" in content
+    assert "| unknown | actor_latency_sec | 1 | 500.0ms |" in content
+    # Reward-less steps do not show up in the per-model reward table.
+    assert "| unknown | 0 |" not in content
+    assert "### m1 / teacher_latency_sec" in content
+
+
+def test_follow_prints_rolling_summary(tmp_path, monkeypatch, capsys):
+    traj_root = tmp_path / "raw"
+    traj_root.mkdir()
+    path = traj_root / "a.jsonl"
+    path.write_text(
+        '{"reward":1.0,"teacher":{"model":"m1"},"metrics":{"teacher_latency_sec":2.0}}\n'
+        '{"reward":0.0,"teacher":{"model":"m1"}',
+        encoding="utf-8",
+    )
+
+    def fake_sleep(_seconds):
+        with path.open("a", encoding="utf-8") as fh:
+            fh.write('}\n')
+
+    monkeypatch.setattr(report_teacher_metrics.time, "sleep", fake_sleep)
+    stats = report_teacher_metrics._follow(traj_root, interval=0.0, max_polls=2)
+
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].startswith("[follow] steps=1 (+1,")
+    assert "reward_rate=1.000" in out[0]
+    assert "teacher_latency_sec p50/p90/p99=2.00s/2.00s/2.00s" in out[0]
+    assert out[1].startswith("[follow] steps=2 (+1,")
+    assert "window_reward_rate=0.000" in out[1]
+    assert stats["m1"].steps == 2
+
+
+def test_follow_recounts_a_rewritten_file(tmp_path, monkeypatch, capsys):
+    traj_root = tmp_path / "raw"
+    traj_root.mkdir()
+    path = traj_root / "a.jsonl"
+    record = '{"reward":1.0,"teacher":{"model":"m1"}}\n'
+    path.write_text(record * 2, encoding="utf-8")
+    (traj_root / "b.jsonl").write_text(record, encoding="utf-8")
+
+    def fake_sleep(_seconds):
+        # Rewritten in place with three different records.
+        path.write_text(record.replace("1.0", "0.0") * 3, encoding="utf-8")
+
+    monkeypatch.setattr(report_teacher_metrics.time, "sleep", fake_sleep)
+    stats = report_teacher_metrics._follow(traj_root, interval=0.0, max_polls=2)
+    assert (stats["m1"].steps, stats["m1"].verified) == (4, 1)
+    assert capsys.readouterr().out.splitlines()[1].startswith("[follow] steps=4 (+3,")
+
+
+def test_follow_drops_a_deleted_file(tmp_path, monkeypatch, capsys):
+    traj_root = tmp_path / "raw"
+    traj_root.mkdir()
+    record = '{"reward":1.0,"teacher":{"model":"m1"}}\n'
+    (traj_root / "a.jsonl").write_text(record * 2, encoding="utf-8")
+    (traj_root / "b.jsonl").write_text(record, encoding="utf-8")
+
+    monkeypatch.setattr(report_teacher_metrics.time, "sleep", lambda _s: (traj_root / "b.jsonl").unlink())
+    stats = report_teacher_metrics._follow(traj_root, interval=0.0, max_polls=2)
+    assert stats["m1"].steps == 2
+    assert capsys.readouterr().out.splitlines()[1].startswith("[follow] steps=2 (+0,")
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+from src.teachers import rewards
+
+
+def _naive_distance(a: str, b: str) -> int:
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def test_edit_distance_matches_dynamic_programming():
+    rng = random.Random(0)
+    for _ in range(200):
+        a = "".join(rng.choice("abcé$ ") for _ in range(rng.randint(0, 90)))
+        b = "".join(rng.choice("abcé$ ") for _ in range(rng.randint(0, 90)))
+        assert rewards.edit_distance(a, b) == _naive_distance(a, b)
+
+
+def _groups():
+    ref_action = {"command": ["ast-grep", "run", "-p", "print($A)", "-r", "log($A)"]}
+    ref_update = {"history": ["rewrote print"], "next_focus": "run tests"}
+    long_action = {"command": ["ast-grep", "run", "-p", "x" * 80]}
+    return [
+        rewards.Group(
+            reference_action=ref_action,
+            reference_update=ref_update,
+            actions=[ref_action, {"command": ["ast-grep", "run", "-p", "print($A)"]}, None],
+            updates=[ref_update, {"history": ["rewrote print", "extra"]}, None],
+        ),
+        rewards.Group(
+            reference_action=long_action,
+            reference_update=None,
+            actions=[long_action, {"command": ["ast-grep", "run", "-p", "x" * 79 + "y"]}],
+        ),
+    ]
+
+
+def test_score_groups_components_and_normalization():
+    result = rewards.score_groups(_groups())
+    assert list(result.group_index) == [0, 0, 0, 1, 1]
+    assert result.action_f1[0] == pytest.approx(1.0)
+    assert result.action_f1[1] == pytest.approx(2 * 4 / (4 + 6))
+    assert result.action_f1[2] == pytest.approx(0.0)
+    assert list(result.edit_distance) == [0, 11, 36, 0, 1]
+    assert result.state_jaccard[1] == pytest.approx(1 / 3)
+    assert result.state_jaccard[3] == pytest.approx(1.0)  # both empty
+    assert result.total[0] == pytest.approx(1.0)
+    assert result.group_mean[0] == pytest.approx(sum(result.total[:3]) / 3)
+    assert sum(result.advantage[:3]) == pytest.approx(0.0, abs=1e-9)
+
+
+def test_numpy_and_python_paths_agree(monkeypatch):
+    pytest.importorskip("numpy")
+    vectorized = rewards.score_groups(_groups())
+    monkeypatch.setattr(rewards, "np", None)
+    plain = rewards.score_groups(_groups())
+    for name in ("action_f1", "edit_distance", "edit_similarity", "state_jaccard", "total", "advantage"):
+        assert list(getattr(plain, name)) == pytest.approx(list(getattr(vectorized, name)))
+
+
+def test_lockstep_distances_match_scalar():
+    numpy = pytest.importorskip("numpy")
+    rng = random.Random(1)
+    reference = "".join(rng.choice("ab$ é") for _ in range(64))
+    texts = ["".join(rng.choice("ab$ éz") for _ in range(rng.randint(0, 100))) for _ in range(50)]
+    references = [reference, "", "é"]
+    row_group = [i % 3 for i in range(len(texts))]
+    got = rewards._edit_distances_np(references, numpy.asarray(row_group), texts)
+    assert list(got) == [_naive_distance(references[g], t) for g, t in zip(row_group, texts)]
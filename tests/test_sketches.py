@@ -0,0 +1,61 @@
+import random
+
+from src.data.sketches import LatencyStats, LogHistogram, QuantileSketch
+
+
+def test_quantile_sketch_relative_error_and_merge():
+    rng = random.Random(0)
+    samples = [rng.lognormvariate(0, 1) for _ in range(5000)]
+
+    left, right = QuantileSketch(), QuantileSketch()
+    for i, value in enumerate(samples):
+        (left if i % 2 else right).add(value)
+    merged = QuantileSketch.from_dict(left.to_dict()).merge(right)
+
+    ordered = sorted(samples)
+    assert merged.count == len(samples)
+    assert merged.max == ordered[-1]
+    for q in (0.5, 0.9, 0.99):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        assert abs(merged.quantile(q) - exact) <= 0.02 * exact
+
+
+def test_quantile_sketch_bounds_memory():
+    sketch = QuantileSketch(max_buckets=16)
+    for exponent in range(-20, 20):
+        sketch.add(10.0 ** exponent)
+    assert len(sketch.to_dict()["buckets"]) <= 16
+    assert sketch.quantile(1.0) == 1e19
+
+
+def test_log_histogram_buckets_and_latency_stats_roundtrip():
+    hist = LogHistogram(base=10.0, min_value=0.01)
+    for value in (0.0, 0.005, 0.02, 0.5, 0.7, 3.0):
+        hist.add(value)
+    assert hist.buckets() == [
+        (0.0, 0.01, 2),
+        (0.01, 0.1, 1),
+        (0.1, 1.0, 2),
+        (1.0, 10.0, 1),
+    ]
+
+    stats = LatencyStats()
+    stats.add(1.0)
+    copy = LatencyStats.from_dict(stats.to_dict()).merge(stats)
+    assert copy.count == 2
+    assert copy.histogram.count == 2
+
+
+def test_non_finite_samples_are_counted_separately():
+    stats = LatencyStats()
+    for value in (1.0, float("inf"), float("-inf"), float("nan"), 2.0):
+        stats.add(value)
+    assert stats.count == 2
+    assert stats.sketch.non_finite == 3
+    assert stats.sketch.sum == 3.0
+    assert stats.sketch.quantile(1.0) == 2.0
+    assert stats.histogram.count == 2
+
+    copy = LatencyStats.from_dict(stats.to_dict()).merge(stats)
+    assert copy.sketch.non_finite == 6
+    assert copy.count == 4
@@ -99,3 +99,125 @@ Teacher reasoning.
     assert record["state_after"]["history"][-1] == "teacher step"
     assert record["state_after"]["next_focus"] == "teacher next"
 
+
+
+class GroupClient:
+    model = "dummy-teacher"
+
+    def __init__(self, texts: list[str]):
+        self.texts = texts
+        self.calls = 0
+
+    def generate_many(self, prompt: str, n: int, **kwargs: Any) -> list[str]:
+        self.calls += 1
+        return self.texts[:n]
+
+
+def _sample(cmd: str, note: str) -> str:
+    return (
+        f'<think>try {note}</think><action>{{"command": ["{cmd}"]}}</action>'
+        f'<state_update>{{"history": ["{note}"]}}</state_update>'
+    )
+
+
+def test_run_teacher_group_clones_workspace_and_skips_flat_groups(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.teachers.srl_teacher.repo_root", lambda: tmp_path)
+    monkeypatch.setattr("src.sandbox.runner.repo_root", lambda: tmp_path)
+    monkeypatch.setattr("src.state.manager._db_path", lambda: tmp_path / "state.sqlite3")
+
+    applied = []
+
+    def fake_apply_action(workspace: Path, action: Dict[str, Any], timeout_sec=None, baseline=None):
+        assert (workspace / "main.py").read_text() == "print('hi')"
+        assert baseline == {"main.py": "print('hi')"}
+        applied.append(workspace.name)
+        ok = action["command"][0] == "good"
+        return DummySandboxResult(cmd=action["command"], exit_code=0 if ok else 1, stdout="", stderr="", duration_sec=0.0)
+
+    monkeypatch.setattr("src.teachers.srl_teacher.sandbox_runner.apply_action", fake_apply_action)
+    task = {"task_id": "grp", "prompt": "p", "workspace_files": {"main.py": "print('hi')"}}
+
+    client = GroupClient([_sample("good", "a"), _sample("bad", "b"), "no tags", _sample("good", "c")])
+    summary = srl_teacher.run_teacher_group(task, group_size=4, client=client, max_workers=4)
+    assert summary["rewards"] == [1.0, 0.0, 0.0, 1.0]
+    assert not summary["skipped"]
+    assert sorted(applied) == ["grp.g0", "grp.g1", "grp.g3"]
+    assert not (tmp_path / ".sandbox" / "grp").exists()
+    assert not (tmp_path / ".sandbox" / "grp.g0").exists()
+
+    records = [json.loads(line) for line in (tmp_path / "trajectories" / "raw" / "grp.jsonl").read_text().splitlines()]
+    assert [r["group"]["sample"] for r in records] == [0, 1, 2, 3]
+    assert {r["step"] for r in records} == {1}
+    assert [r["group"]["selected"] for r in records] == [True, False, False, False]
+    assert records[0]["state_after"]["history"] == ["a"]
+
+    applied.clear()
+    flat = srl_teacher.run_teacher_group(task, group_size=2, min_std=0.1, client=GroupClient(["x", "y"]))
+    assert flat["skipped"] and flat["skip_reason"] == "no_runnable_actions"
+    assert applied == []
+
+    same_client = GroupClient([_sample("good", "d")] * 2)
+    same = srl_teacher.run_teacher_group(task, group_size=2, min_std=0.1, client=same_client)
+    assert same["skipped"] and same["skip_reason"] == "low_reward_std"
+    assert len((tmp_path / "trajectories" / "raw" / "grp.jsonl").read_text().splitlines()) == 4
+
+    client = GroupClient([_sample("good", "e"), _sample("bad", "f")])
+    srl_teacher.run_teacher_group(task, group_size=2, client=client)
+    last = json.loads((tmp_path / "trajectories" / "raw" / "grp.jsonl").read_text().splitlines()[-1])
+    assert last["step"] == 2
+
+    # The default min_std of 0.0 keeps zero-variance groups; the writer hook
+    # receives the records instead of the per-task file.
+    written = []
+    kept = srl_teacher.run_teacher_group(
+        task, group_size=2, client=same_client, writer=lambda tid, rec: written.append(rec), step=7
+    )
+    assert not kept["skipped"] and kept["reward_std"] == 0.0
+    assert [(r["step"], r["group"]["sample"]) for r in written] == [(7, 0), (7, 1)]
+    assert len((tmp_path / "trajectories" / "raw" / "grp.jsonl").read_text().splitlines()) == 6
+
+
+def test_main_records_the_model_that_served_each_step(tmp_path, monkeypatch):
+    import requests
+
+    cfg_path = tmp_path / "vllm_actors.yaml"
+    cfg_path.write_text(
+        "actors:\n"
+        "  - name: a0\n"
+        "    base_url: http://localhost:9990\n"
+        "    model: model-a\n"
+        "  - name: a1\n"
+        "    base_url: http://localhost:9991\n"
+        "    model: model-b\n"
+        "health_interval_sec: 0\n"
+    )
+    monkeypatch.setattr("src.actors.vllm_client._config_path", lambda: cfg_path)
+    monkeypatch.setattr("src.actors.flow_control._registry", {})
+    monkeypatch.setattr("src.actors.health._registry", {})
+    monkeypatch.setattr("src.teachers.srl_teacher.repo_root", lambda: tmp_path)
+    monkeypatch.setattr("src.sandbox.runner.repo_root", lambda: tmp_path)
+    monkeypatch.setattr("src.state.manager._db_path", lambda: tmp_path / "state.sqlite3")
+
+    class Response:
+        status_code = 200
+
+        def json(self):
+            return {"text": ["<think>t</think>"]}
+
+        def raise_for_status(self):
+            pass
+
+    def fake_post(url, json, timeout):
+        # Only a1 is up, so every request fails over to it.
+        if "9990" in url:
+            raise requests.ConnectionError("refused")
+        assert json["model"] == "model-b"
+        return Response()
+
+    monkeypatch.setattr("src.actors.vllm_client.requests.post", fake_post)
+    tasks = tmp_path / "tasks.jsonl"
+    tasks.write_text(json.dumps({"task_id": "m", "prompt": "p"}) + "\n")
+
+    srl_teacher.main([str(tasks)])
+    record = json.loads((tmp_path / "trajectories" / "raw" / "m.jsonl").read_text())
+    assert record["teacher"]["model"] == "model-b"
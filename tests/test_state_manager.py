@@ -70,3 +70,228 @@ def test_load_missing_returns_default(tmp_path, monkeypatch):
     assert loaded.goals == []
     assert loaded.history == []
 
+
+
+def test_connection_is_cached_per_thread_and_uses_wal(tmp_path, monkeypatch):
+    monkeypatch.setattr(manager, "_db_path", lambda: tmp_path / "state.sqlite3")
+    manager.close_connections()
+
+    conn = manager._get_connection()
+    assert manager._get_connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    manager.save("task1", manager.State(goals=["g"]))
+    assert manager.load("task1").goals == ["g"]
+    manager.close_connections()
+    assert manager._get_connection() is not conn
+
+
+def _contending_writer(db_path, worker: int, n: int) -> None:
+    manager._db_path = lambda: db_path
+    for i in range(n):
+        task_id = f"task-{i % 5}"
+        state = manager.load(task_id)
+        manager.save(task_id, manager.merge(state, manager.State(history=[f"w{worker}-{i}"])))
+
+
+def test_concurrent_processes_do_not_hit_locked_errors(tmp_path):
+    import multiprocessing
+
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("requires the fork start method")
+    ctx = multiprocessing.get_context("fork")
+    db_path = tmp_path / "state.sqlite3"
+    procs = [ctx.Process(target=_contending_writer, args=(db_path, w, 40)) for w in range(6)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join(timeout=60)
+    assert [proc.exitcode for proc in procs] == [0] * len(procs)
+
+
+def test_write_behind_group_commits_with_read_your_writes(tmp_path, monkeypatch):
+    db_path = tmp_path / "state.sqlite3"
+    monkeypatch.setattr(manager, "_db_path", lambda: db_path)
+    manager.enable_write_behind(interval_sec=60.0, batch_size=1000)
+    try:
+        for i in range(50):
+            manager.save(f"task{i % 10}", manager.State(history=[f"step{i}"]))
+        # Visible to this process before anything is committed.
+        assert manager.load("task3").history == ["step43"]
+
+        import sqlite3
+
+        with sqlite3.connect(db_path) as other:
+            assert other.execute("SELECT COUNT(*) FROM state").fetchone()[0] == 0
+
+        manager.flush()
+        with sqlite3.connect(db_path) as other:
+            assert other.execute("SELECT COUNT(*) FROM state").fetchone()[0] == 10
+        assert manager._write_behind.commits == 1
+    finally:
+        manager.disable_write_behind()
+
+    manager.save("task3", manager.State(history=["sync"]))
+    assert manager.load("task3").history == ["sync"]
+
+
+def test_state_cache_hits_write_through_and_invalidation(tmp_path, monkeypatch):
+    db_path = tmp_path / "state.sqlite3"
+    monkeypatch.setattr(manager, "_db_path", lambda: db_path)
+    manager.configure_cache(max_entries=2)
+    try:
+        manager.save("a", manager.State(goals=["a1"]))
+        loaded = manager.load("a")
+        loaded.goals.append("mutated")
+        assert manager.load("a").goals == ["a1"]
+        assert manager.cache_stats().hits == 2
+
+        # Another process writes behind our back; invalidation picks it up.
+        import sqlite3
+
+        with sqlite3.connect(db_path) as other:
+            other.execute("UPDATE state SET blob = ? WHERE task_id = 'a'", ('{"goals": ["external"]}',))
+        assert manager.load("a").goals == ["a1"]
+        manager.invalidate("a")
+        assert manager.load("a").goals == ["external"]
+
+        manager.save("b", manager.State())
+        manager.save("c", manager.State())
+        stats = manager.cache_stats()
+        assert stats.size == 2
+        assert stats.evictions == 1
+        assert 0 < stats.hit_rate < 1
+    finally:
+        manager.configure_cache(max_entries=0)
+
+
+def test_state_cache_is_off_by_default(tmp_path, monkeypatch):
+    db_path = tmp_path / "state.sqlite3"
+    monkeypatch.setattr(manager, "_db_path", lambda: db_path)
+    manager.save("a", manager.State(goals=["a1"]))
+    assert manager.load("a").goals == ["a1"]
+
+    import sqlite3
+
+    with sqlite3.connect(db_path) as other:
+        other.execute("UPDATE state SET blob = ? WHERE task_id = 'a'", ('{"goals": ["external"]}',))
+    assert manager.load("a").goals == ["external"]
+    assert manager.cache_stats().max_entries == 0
+
+
+def test_db_path_is_resolved_once(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_repo_root():
+        calls.append(1)
+        return tmp_path
+
+    monkeypatch.setattr(manager, "repo_root", fake_repo_root)
+    monkeypatch.setattr(manager, "_default_db_path", None)
+    for i in range(5):
+        manager.save(f"t{i}", manager.State(goals=[str(i)]))
+        assert manager.load(f"t{i}").goals == [str(i)]
+    manager.record_step("t0", 1, manager.State(goals=["x"]))
+    assert len(calls) == 1
+    assert (tmp_path / "data" / "state.sqlite3").exists()
+
+
+def test_load_many_and_save_many_roundtrip(tmp_path, monkeypatch):
+    monkeypatch.setattr(manager, "_db_path", lambda: tmp_path / "state.sqlite3")
+    monkeypatch.setattr(manager, "_IN_CHUNK_SIZE", 3)
+    manager.configure_cache(max_entries=0)
+    try:
+        states = {f"t{i}": manager.State(goals=[f"g{i}"], next_focus="x" * 300) for i in range(7)}
+        manager.save_many(states)
+
+        loaded = manager.load_many([f"t{i}" for i in range(7)] + ["missing", "t0"])
+        assert set(loaded) == {f"t{i}" for i in range(7)} | {"missing"}
+        assert loaded["t4"].goals == ["g4"]
+        assert len(loaded["t4"].next_focus) == manager._MAX_TEXT_LEN
+        assert loaded["missing"] == manager.State()
+        assert manager.load("t6").goals == ["g6"]
+    finally:
+        manager.configure_cache(max_entries=0)
+
+
+def test_state_history_reconstructs_every_step_from_deltas(tmp_path, monkeypatch):
+    db_path = tmp_path / "state.sqlite3"
+    monkeypatch.setattr(manager, "_db_path", lambda: db_path)
+    monkeypatch.setattr(manager, "_SNAPSHOT_INTERVAL", 3)
+
+    expected = {}
+    state = manager.State(goals=["refactor"])
+    for step in range(1, 9):
+        state = manager.merge(state, manager.State(history=[f"step {step}"], next_focus=f"focus {step}"))
+        manager.record_step("t1", step, state)
+        expected[step] = state
+
+    kinds = [
+        kind
+        for (kind,) in manager._get_connection().execute(
+            "SELECT kind FROM state_history WHERE task_id = 't1' ORDER BY step"
+        )
+    ]
+    assert kinds == ["full", "delta", "delta", "full", "delta", "delta", "full", "delta"]
+
+    # Drop the in-process tail so reconstruction goes through the database.
+    manager._history_tail.clear()
+    for step, want in expected.items():
+        assert manager.load_at("t1", step) == want
+    assert manager.load_at("t1", 0) == manager.State()
+    assert manager.load_at("t1", 100) == expected[8]
+    assert manager.history_steps("t1") == list(range(1, 9))
+
+    manager.record_step("t1", 8, manager.State(goals=["replaced"]))
+    assert manager.load_at("t1", 8).goals == ["replaced"]
+    with pytest.raises(ValueError):
+        manager.record_step("t1", 3, state)
+
+
+def _record_other_step(db_path, step):
+    manager._db_path = lambda: db_path
+    manager.record_step("shared", step, manager.State(history=["a", "from the other writer"]))
+
+
+def test_record_step_rebuilds_base_after_another_writer(tmp_path, monkeypatch):
+    import multiprocessing
+
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("requires the fork start method")
+    db_path = tmp_path / "state.sqlite3"
+    monkeypatch.setattr(manager, "_db_path", lambda: db_path)
+    manager.record_step("shared", 1, manager.State(history=["a"]))
+
+    # Another process records step 2 while this one still caches step 1.
+    proc = multiprocessing.get_context("fork").Process(target=_record_other_step, args=(db_path, 2))
+    proc.start()
+    proc.join(timeout=30)
+    assert proc.exitcode == 0
+
+    step3 = manager.State(history=["a", "from the other writer", "mine"])
+    manager.record_step("shared", 3, step3)
+    manager._history_tail.clear()
+    assert manager.load_at("shared", 2).history == ["a", "from the other writer"]
+    assert manager.load_at("shared", 3) == step3
+
+
+def test_render_respects_token_budget_and_caches():
+    state = manager.State(
+        goals=["ship the refactor"],
+        hypotheses=["h" * 200, "i" * 200],
+        history=["ran tests"],
+        next_focus="run ast-grep",
+    )
+    full = manager.render(state, max_tokens=None)
+    assert "Hypotheses:" in full and full.startswith("Goals:")
+
+    budget = manager.approx_tokens(full) - 10
+    trimmed = manager.render(state, max_tokens=budget)
+    assert manager.approx_tokens(trimmed) <= budget
+    assert "Hypotheses:" not in trimmed
+    assert "History:" in trimmed and "Next focus:" in trimmed
+
+    tiny = manager.render(state, max_tokens=3)
+    assert tiny.startswith("Goals:") and manager.approx_tokens(tiny) <= 3
+
+    assert manager.render(manager.State(**vars(state)), max_tokens=budget) is trimmed
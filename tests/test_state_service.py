@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+from src.state import manager, service
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(manager, "_db_path", lambda: tmp_path / "state.sqlite3")
+    srv = service.StateServer(("127.0.0.1", 0)).start()
+    try:
+        yield srv
+    finally:
+        manager.use_server(None)
+        srv.stop()
+
+
+def test_parse_address():
+    assert service.parse_address("unix:/tmp/state.sock") == "/tmp/state.sock"
+    assert service.parse_address("node3:7077") == ("node3", 7077)
+    with pytest.raises(ValueError):
+        service.parse_address("node3")
+
+
+def test_client_roundtrip_pipeline_and_errors(server):
+    client = service.StateClient(server.address)
+    assert client.ping()
+
+    client.save("t1", manager.State(goals=["g"], next_focus="x" * 300))
+    assert client.load("t1").goals == ["g"]
+    assert len(client.load("t1").next_focus) == manager._MAX_TEXT_LEN
+
+    merged = client.merge("t1", manager.State(history=["h1"]))
+    assert merged.goals == ["g"] and merged.history == ["h1"]
+
+    results = client.pipeline({"op": "load", "task_id": f"p{i}"} for i in range(50))
+    assert len(results) == 50 and results[0]["goals"] == []
+
+    with pytest.raises(service.StateServiceError, match="Unknown op"):
+        client._call("bogus")
+    assert client.load_many(["t1", "missing"])["missing"] == manager.State()
+    client.close()
+
+
+def test_concurrent_merges_are_not_lost(server):
+    def worker(n):
+        client = service.StateClient(server.address)
+        for i in range(20):
+            client.merge("shared", manager.State(decisions=[f"{n}-{i}"]))
+        client.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(service.StateClient(server.address).load("shared").decisions) == 80
+
+
+def test_manager_routes_through_server(server):
+    manager.use_server(server.address)
+    manager.save("remote", manager.State(goals=["over the wire"]))
+    manager.record_step("remote", 1, manager.State(history=["one"]))
+    assert manager.load("remote").goals == ["over the wire"]
+    assert manager.load_at("remote", 1).history == ["one"]
+    # Another host's write between our load and merge is kept.
+    service.StateClient(server.address).merge("remote", manager.State(decisions=["other host"]))
+    merged = manager.merge_update("remote", manager.State(decisions=["ours"]))
+    assert merged.decisions == ["other host", "ours"]
+    manager.use_server(None)
+
+    # The server process wrote to the same (patched) database.
+    manager.invalidate()
+    assert manager.load("remote").goals == ["over the wire"]
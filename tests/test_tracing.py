@@ -0,0 +1,78 @@
+import json
+import threading
+
+import pytest
+
+from src.data import tracing
+from src.sandbox import runner
+
+
+@pytest.fixture
+def trace_file(tmp_path):
+    path = tmp_path / "trace.json"
+    tracing.enable(chrome_trace=path)
+    yield path
+    tracing.disable()
+
+
+def test_spans_are_noops_when_disabled():
+    assert not tracing.enabled()
+    assert tracing.span("a") is tracing.span("b")
+    with tracing.step_spans() as spans:
+        with tracing.span("a"):
+            pass
+    assert spans is None
+
+
+def test_step_breakdown_and_chrome_trace(trace_file):
+    @tracing.traced("inner")
+    def inner():
+        pass
+
+    with tracing.step_spans() as spans:
+        with tracing.span("outer", k=1):
+            inner()
+            inner()
+        worker = threading.Thread(target=tracing.propagate(inner))
+        worker.start()
+        worker.join()
+        # Spans on threads that did not inherit the step are not counted.
+        other = threading.Thread(target=inner)
+        other.start()
+        other.join()
+    with tracing.span("after"):
+        pass
+    tracing.disable()
+
+    assert set(spans) == {"outer", "inner"}
+    assert spans["outer"] >= 0.0
+
+    text = trace_file.read_text()
+    events = json.loads(text.rstrip().rstrip(",") + "]")
+    assert [e["name"] for e in events].count("inner") == 4
+    outer = next(e for e in events if e["name"] == "outer")
+    assert outer["ph"] == "X" and outer["args"] == {"k": 1}
+
+
+def test_apply_action_spans(tmp_path, monkeypatch, trace_file):
+    def fake_load_config():
+        cfg = runner.SandboxConfig.defaults()
+        cfg.work_root = tmp_path / ".sandbox"
+        cfg.logs_dir = tmp_path / "logs"
+        cfg.allowed_binaries = ["python"]
+        return cfg
+
+    monkeypatch.setattr(runner, "_load_config", fake_load_config)
+    with tracing.step_spans() as spans:
+        ws = runner.prepare_workspace("task1", {"a.txt": "x"})
+        runner.apply_action(ws, {"command": ["python", "-c", "open('a.txt', 'w').write('y')"]})
+        runner.cleanup(ws)
+    assert {
+        "sandbox.prepare_workspace",
+        "sandbox.apply_action",
+        "sandbox.snapshot_before",
+        "sandbox.subprocess",
+        "sandbox.snapshot_after",
+        "sandbox.diff",
+        "sandbox.cleanup",
+    } <= set(spans)
@@ -0,0 +1,103 @@
+import json
+import sqlite3
+
+from src.trajectories.index import TrajectoryIndex
+
+
+def _record(task_id: str, reward, model: str = "m1", exit_code: int = 0) -> str:
+    return json.dumps(
+        {
+            "task_id": task_id,
+            "step": 1,
+            "reward": reward,
+            "teacher": {"model": model},
+            "sandbox_result": {"exit_code": exit_code, "duration_sec": 0.5},
+            "metrics": {"teacher_latency_sec": 1.5, "sandbox_failed": exit_code != 0},
+        }
+    )
+
+
+def test_query_seeks_matching_records(tmp_path):
+    traj_root = tmp_path / "raw"
+    traj_root.mkdir()
+    (traj_root / "a.jsonl").write_text(
+        _record("t1", 1.0) + "\n" + _record("t2", 0.0) + "\n" + _record("t3", 1.0, exit_code=1) + "\n"
+    )
+    (traj_root / "b.jsonl").write_text(_record("t4", 1.0, model="m2") + "\n")
+
+    with TrajectoryIndex(tmp_path / "index.sqlite3") as index:
+        summary = index.update(traj_root)
+        assert summary.records_added == 4
+
+        hits = list(index.query(model="m1", reward_gt=0, exit_code=0))
+        assert [r["task_id"] for r in hits] == ["t1"]
+
+        assert index.model_aggregates() == {"m1": (3, 2.0, 2), "m2": (1, 1.0, 1)}
+
+
+def test_update_is_incremental_and_handles_partial_lines(tmp_path):
+    traj_root = tmp_path / "raw"
+    traj_root.mkdir()
+    path = traj_root / "a.jsonl"
+    partial = _record("t2", 1.0)
+    path.write_text(_record("t1", 1.0) + "\n" + partial[:10])
+
+    with TrajectoryIndex(tmp_path / "index.sqlite3") as index:
+        assert index.update(traj_root).records_added == 1
+
+        with path.open("a") as fh:
+            fh.write(partial[10:] + "\n")
+        summary = index.update(traj_root)
+        assert summary.records_added == 1
+        assert [r["task_id"] for r in index.query()] == ["t1", "t2"]
+
+        # A truncated file is reindexed from scratch.
+        path.write_text(_record("t9", 0.0) + "\n")
+        index.update(traj_root)
+        assert [r["task_id"] for r in index.query()] == ["t9"]
+
+        path.unlink()
+        assert index.update(traj_root).files_removed == 1
+        assert index.locate() == []
+
+
+def test_update_keeps_files_of_a_sibling_root(tmp_path):
+    raw, raw_old = tmp_path / "raw", tmp_path / "raw_old"
+    raw.mkdir()
+    raw_old.mkdir()
+    (raw / "a.jsonl").write_text(_record("t1", 1.0) + "\n")
+    (raw_old / "b.jsonl").write_text(_record("t2", 1.0) + "\n")
+
+    with TrajectoryIndex(tmp_path / "index.sqlite3") as index:
+        index.update(raw_old)
+        assert index.update(raw).files_removed == 0
+        assert sorted(r["task_id"] for r in index.query()) == ["t1", "t2"]
+
+
+def test_update_reindexes_files_rewritten_in_place(tmp_path):
+    traj_root = tmp_path / "raw"
+    traj_root.mkdir()
+    path = traj_root / "a.jsonl"
+    path.write_text(_record("t1", 1.0) + "\n")
+
+    db_path = tmp_path / "index.sqlite3"
+    # An index created before inodes and head hashes were tracked.
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE files (path TEXT PRIMARY KEY, size INTEGER NOT NULL,"
+            " mtime REAL NOT NULL, indexed_bytes INTEGER NOT NULL)"
+        )
+    with TrajectoryIndex(db_path) as index:
+        index.update(traj_root)
+        assert [r["task_id"] for r in index.query()] == ["t1"]
+
+        # Same inode, same length plus one more record: not an append.
+        path.write_text(_record("t7", 0.0) + "\n" + _record("t8", 1.0) + "\n")
+        summary = index.update(traj_root)
+        assert summary.files_reindexed == 1
+        assert [r["task_id"] for r in index.query()] == ["t7", "t8"]
+
+        with path.open("a") as fh:
+            fh.write(_record("t9", 1.0) + "\n")
+        summary = index.update(traj_root)
+        assert (summary.files_reindexed, summary.records_added) == (0, 1)
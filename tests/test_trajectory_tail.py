@@ -0,0 +1,60 @@
+from src.trajectories.tail import TrajectoryTailer
+
+
+def test_tailer_returns_only_new_complete_lines(tmp_path):
+    root = tmp_path / "raw"
+    root.mkdir()
+    first = root / "a.jsonl"
+    first.write_bytes(b'{"n":1}\n{"n":2')
+
+    tailer = TrajectoryTailer(root)
+    assert tailer.poll() == [b'{"n":1}']
+    assert tailer.poll() == []
+
+    with first.open("ab") as fh:
+        fh.write(b'}\n{"n":3}\n')
+    (root / "b.jsonl").write_bytes(b'{"n":4}\n')
+    assert tailer.poll() == [b'{"n":2}', b'{"n":3}', b'{"n":4}']
+
+    # Truncated files are re-read from the start.
+    first.write_bytes(b'{"n":5}\n')
+    assert tailer.poll() == [b'{"n":5}']
+
+
+def test_tailer_from_end_skips_existing_records(tmp_path):
+    root = tmp_path / "raw"
+    root.mkdir()
+    path = root / "a.jsonl"
+    path.write_bytes(b'{"n":1}\n')
+
+    tailer = TrajectoryTailer(root, from_end=True)
+    assert tailer.poll() == []
+    with path.open("ab") as fh:
+        fh.write(b'{"n":2}\n')
+    assert tailer.poll() == [b'{"n":2}']
+
+
+def test_tailer_reports_resets_for_rewritten_files(tmp_path):
+    root = tmp_path / "raw"
+    root.mkdir()
+    path = root / "a.jsonl"
+    path.write_bytes(b'{"n":1}\n')
+
+    tailer = TrajectoryTailer(root)
+    assert tailer.poll_files() == [(str(path), [b'{"n":1}'], False)]
+
+    # Rewritten in place and already longer than before: same inode, bigger size.
+    path.write_bytes(b'{"n":7}\n{"n":8}\n')
+    assert tailer.poll_files() == [(str(path), [b'{"n":7}', b'{"n":8}'], True)]
+
+    # Replaced by a new file (new inode).
+    replacement = root / "a.jsonl.tmp"
+    replacement.write_bytes(b'{"n":9}\n')
+    replacement.rename(path)
+    assert tailer.poll_files() == [(str(path), [b'{"n":9}'], True)]
+    assert tailer.poll_files() == []
+
+    # Deleted: reported once as a reset with no lines, then forgotten.
+    path.unlink()
+    assert tailer.poll_files() == [(str(path), [], True)]
+    assert tailer.poll_files() == []
@@ -1,10 +1,14 @@
 from pathlib import Path
 
+import threading
+import time
 import types
 
 import pytest
+import requests
 
-from src.actors.vllm_client import VLLMClient, _config_path
+from src.actors.health import CircuitBreaker, HealthMonitor
+from src.actors.vllm_client import ActorUnavailable, MultiActorClient, VLLMClient, _config_path
 
 
 class DummyResponse:
@@ -82,3 +86,153 @@ def test_generate_uses_generate_endpoint_and_returns_text(monkeypatch, tmp_path)
     assert body["stop"] == ["\n"]
     assert body["seed"] == 123
 
+
+
+def test_generate_many_requests_n_samples_and_tops_up(monkeypatch, tmp_path):
+    monkeypatch.setattr("src.actors.vllm_client._config_path", lambda: tmp_path / "missing.yaml")
+    bodies = []
+
+    def fake_post(url, json, timeout):  # type: ignore[override]
+        bodies.append(json)
+        if json.get("n") == 3:
+            return DummyResponse(payload={"choices": [{"text": "a"}, {"message": {"content": "b"}}]})
+        return DummyResponse(payload={"text": ["c"]})
+
+    monkeypatch.setattr("src.actors.vllm_client.requests.post", fake_post)
+
+    texts = VLLMClient().generate_many("hi", 3, seed=7)
+    assert texts == ["a", "b", "c"]
+    assert bodies[0]["n"] == 3
+    assert "n" not in bodies[1] and bodies[1]["seed"] == 9
+
+
+def _two_actor_config(tmp_path, monkeypatch):
+    cfg_path = tmp_path / "vllm_actors.yaml"
+    cfg_path.write_text(
+        "actors:\n"
+        "  - name: a0\n"
+        "    base_url: http://localhost:9990\n"
+        "    model: dummy\n"
+        "  - name: a1\n"
+        "    base_url: http://localhost:9991\n"
+        "    model: dummy\n"
+    )
+    monkeypatch.setattr("src.actors.vllm_client._config_path", lambda: cfg_path)
+    monkeypatch.setattr("src.actors.flow_control._registry", {})
+    monkeypatch.setattr("src.actors.health._registry", {})
+
+
+def test_multi_actor_client_hedges_slow_requests(monkeypatch, tmp_path):
+    _two_actor_config(tmp_path, monkeypatch)
+    slow = threading.Event()
+    calls = []
+
+    def fake_post(url, json, timeout):  # type: ignore[override]
+        first_slow = slow.is_set() and not calls
+        calls.append(url)
+        time.sleep(0.5 if first_slow else 0.005)
+        return DummyResponse(payload={"text": [url]})
+
+    monkeypatch.setattr("src.actors.vllm_client.requests.post", fake_post)
+    client = MultiActorClient(hedge=True, hedge_budget=1.0, min_samples=5, health_interval_sec=0)
+    for _ in range(5):
+        client.generate("hi")
+    assert client.hedge_stats()["hedged"] == 0
+
+    calls.clear()
+    slow.set()
+    start = time.perf_counter()
+    text = client.generate("hi")
+    assert time.perf_counter() - start < 0.4
+    assert len(calls) == 2 and text == calls[1] != calls[0]
+
+    time.sleep(0.6)  # let the abandoned primary land
+    stats = client.hedge_stats()
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+    assert stats["hedge_rate"] == 1 / 6
+    assert stats["latency_saved_sec"] > 0.2
+    client.close()
+
+
+def test_multi_actor_client_respects_hedge_budget(monkeypatch, tmp_path):
+    _two_actor_config(tmp_path, monkeypatch)
+    calls = []
+
+    def fake_post(url, json, timeout):  # type: ignore[override]
+        calls.append(url)
+        time.sleep(0.05 if len(calls) > 3 else 0.001)
+        return DummyResponse(payload={"text": ["ok"]})
+
+    monkeypatch.setattr("src.actors.vllm_client.requests.post", fake_post)
+    client = MultiActorClient(hedge=True, hedge_budget=0.0, min_samples=3, health_interval_sec=0)
+    for _ in range(4):
+        assert client.generate("hi") == "ok"
+    assert len(calls) == 4
+    assert client.hedge_stats()["hedged"] == 0
+    client.close()
+
+
+def test_multi_actor_client_fails_over_and_skips_open_breakers(monkeypatch, tmp_path):
+    _two_actor_config(tmp_path, monkeypatch)
+    calls = []
+
+    def fake_post(url, json, timeout):  # type: ignore[override]
+        calls.append(url)
+        if "9990" in url:
+            raise requests.ConnectionError("refused")
+        return DummyResponse(payload={"text": ["ok"]})
+
+    monkeypatch.setattr("src.actors.vllm_client.requests.post", fake_post)
+    monkeypatch.setattr(
+        "src.actors.vllm_client.requests.get",
+        lambda url, timeout: DummyResponse(status_code=200 if "9991" in url else 503),
+    )
+    client = MultiActorClient(health_interval_sec=0)
+    for _ in range(6):
+        assert client.generate("hi") == "ok"
+    # a0 failed three times, then its breaker opened and it was skipped.
+    assert sum("9990" in url for url in calls) == 3
+    assert client.breakers()["http://localhost:9990"]["state"] == "open"
+
+    # A healthy probe ends the open period early; the next request is a trial.
+    monkeypatch.setattr(
+        "src.actors.vllm_client.requests.get",
+        lambda url, timeout: DummyResponse(payload={"status": "ok"}),
+    )
+    HealthMonitor(client.clients).probe_once()
+    assert client.breakers()["http://localhost:9990"]["state"] == "half_open"
+
+    single = VLLMClient(actor_name="a0")
+    single.breaker.record_failure()
+    with pytest.raises(ActorUnavailable):
+        single.generate("hi")
+    client.close()
+
+
+def test_circuit_breaker_half_open_allows_one_trial():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_sec=5, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] = 5.0
+    assert breaker.state == "half_open"
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    now[0] = 10.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.snapshot()["trips"] == 2
+
+
+def test_circuit_breaker_needs_consecutive_failed_probes():
+    breaker = CircuitBreaker(failure_threshold=3, probe_threshold=2)
+    breaker.record_probe(False)
+    breaker.record_probe(True)
+    breaker.record_probe(False)
+    assert breaker.state == "closed"  # one slow probe at a time does not trip it
+    breaker.record_probe(False)
+    assert breaker.state == "open"
@@ -0,0 +1,154 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from src.state.work_queue import WorkQueue
+
+
+def _tasks(count):
+    return [{"task_id": f"t{i}", "prompt": "p"} for i in range(count)]
+
+
+def test_lease_ack_and_reclaim_after_timeout(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("src.state.work_queue.time.time", lambda: clock[0])
+    queue = WorkQueue(tmp_path / "q.sqlite3", visibility_timeout=10, max_attempts=2)
+    assert queue.enqueue(_tasks(3)) == 3
+    assert queue.enqueue(_tasks(4)) == 1  # known task_ids are ignored
+
+    first = queue.lease(2)
+    assert [lease.task_id for lease in first] == ["t0", "t1"]
+    assert [lease.task_id for lease in queue.lease(5)] == ["t2", "t3"]
+    assert queue.lease(5) == []
+    assert queue.ack(first[0])
+
+    # t1's worker "crashes": after the timeout another worker gets it.
+    clock[0] += 11
+    reclaimed = queue.lease(1)
+    assert [lease.task_id for lease in reclaimed] == ["t1"]
+    assert reclaimed[0].attempt == 2
+    assert not queue.ack(first[1])  # the stale holder cannot complete it
+    assert not queue.extend(first[1])
+    assert queue.ack(reclaimed[0])
+
+    # Lapsing again exceeds max_attempts, so the next lease parks it.
+    queue.lease(5)
+    clock[0] += 11
+    queue.lease(5)
+    clock[0] += 11
+    queue.lease(5)
+    stats = queue.stats()
+    assert stats["done"] == 2 and stats["failed"] == 2
+    assert queue.retry_failed() == 2
+    assert queue.stats()["pending"] == 2
+
+
+def test_drain_releases_batch_on_error(tmp_path):
+    queue = WorkQueue(tmp_path / "q.sqlite3")
+    queue.enqueue(_tasks(4))
+    seen = []
+
+    def run(task):
+        seen.append(task["task_id"])
+        if task["task_id"] == "t1":
+            raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        queue.drain(run, batch_size=3)
+    assert queue.stats() == {"pending": 3, "leased": 0, "done": 1, "failed": 0}
+
+    batches = []
+    assert queue.drain(lambda task: seen.append(task["task_id"]), batch_size=2, on_batch=batches.append) == 3
+    assert [[t["task_id"] for t in batch] for batch in batches] == [["t1", "t2"], ["t3"]]
+
+
+def test_duplicate_task_ids_are_queued_per_line(tmp_path):
+    queue = WorkQueue(tmp_path / "q.sqlite3")
+    manifest = [{"task_id": "t0", "step": 1}, {"task_id": "t1"}, {"task_id": "t0", "step": 2}]
+    assert queue.enqueue(manifest) == 3
+    assert queue.enqueue(manifest) == 0  # enqueueing the same manifest again is a no-op
+    first = queue.lease(3)
+    # t0's second item waits until its first is done.
+    assert [lease.task.get("step") for lease in first] == [1, None]
+    assert queue.ack(first[0])
+    assert [lease.task.get("step") for lease in queue.lease(3)] == [2]
+
+
+def test_workers_never_lease_a_later_step_while_an_earlier_one_runs(tmp_path):
+    path = tmp_path / "q.sqlite3"
+    WorkQueue(path).enqueue([{"task_id": "a", "step": 1}, {"task_id": "a", "step": 2}, {"task_id": "b", "step": 1}])
+    first, second = WorkQueue(path), WorkQueue(path)
+
+    held = first.lease(1)
+    assert [(lease.task_id, lease.task["step"]) for lease in held] == [("a", 1)]
+    assert [(lease.task_id, lease.task["step"]) for lease in second.lease(5)] == [("b", 1)]
+    assert second.lease(5) == []
+    assert first.ack(held[0])
+    assert [(lease.task_id, lease.task["step"]) for lease in second.lease(5)] == [("a", 2)]
+
+
+def test_concurrent_drains_run_steps_of_a_task_in_order(tmp_path):
+    path = tmp_path / "q.sqlite3"
+    WorkQueue(path).enqueue({"task_id": f"t{i % 3}", "step": i // 3} for i in range(12))
+    lock = threading.Lock()
+    running = set()
+    ran = []
+
+    def run(task):
+        with lock:
+            assert task["task_id"] not in running
+            running.add(task["task_id"])
+        time.sleep(0.01)
+        with lock:
+            running.discard(task["task_id"])
+            ran.append((task["task_id"], task["step"]))
+
+    workers = [
+        threading.Thread(target=WorkQueue(path).drain, args=(run,), kwargs={"batch_size": 2, "poll_interval": 0.01})
+        for _ in range(2)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+    for task_id in ("t0", "t1", "t2"):
+        assert [step for tid, step in ran if tid == task_id] == [0, 1, 2, 3]
+
+
+def test_drain_heartbeat_keeps_waiting_leases(tmp_path):
+    path = tmp_path / "q.sqlite3"
+    queue = WorkQueue(path, visibility_timeout=0.3, max_attempts=1)
+    queue.enqueue(_tasks(4))
+    other = WorkQueue(path, visibility_timeout=0.3)
+    stolen = []
+
+    def run(task):
+        # Each step is slower than the visibility timeout of the whole batch.
+        time.sleep(0.2)
+        stolen.extend(lease.task_id for lease in other.lease(4))
+
+    assert queue.drain(run, batch_size=4) == 4
+    assert stolen == []
+    assert queue.stats() == {"pending": 0, "leased": 0, "done": 4, "failed": 0}
+
+
+def _worker(path, out):
+    queue = WorkQueue(path)
+    queue.drain(lambda task: out.put(task["task_id"]), batch_size=3, poll_interval=0.05)
+
+
+def test_concurrent_workers_run_each_task_once(tmp_path):
+    path = tmp_path / "q.sqlite3"
+    WorkQueue(path).enqueue(_tasks(60))
+    ctx = multiprocessing.get_context("fork")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(path, out)) for _ in range(4)]
+    for proc in procs:
+        proc.start()
+    ran = [out.get(timeout=30) for _ in range(60)]
+    for proc in procs:
+        proc.join(timeout=30)
+    assert sorted(ran) == sorted(f"t{i}" for i in range(60))
+    assert WorkQueue(path).stats()["done"] == 60